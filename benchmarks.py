@@ -0,0 +1,419 @@
+"""
+Benchmarks de rendimiento del bot.
+Uso: python benchmarks.py [nombre]   (sin nombre ejecuta todos)
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from cines import Cine
+from modelos import crear_funcion, crear_horario, crear_pelicula, crear_snapshot, pelicula_desde_dict
+from render import CONSTRUCTORES, Renderizador
+from scrapers import RE_PREFIX, parsear_filmaffinity
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+HORAS = ["16:00", "16:30", "17:15", "18:00", "19:30", "20:15", "22:00", "22:45"]
+
+
+def generar_html_filmaffinity(peliculas: int = 40, dias: int = 7, sesiones: int = 5,
+                              semilla: int = 1) -> str:
+    """HTML sintético con la misma estructura que una página de sesiones de FilmAffinity."""
+    rnd = random.Random(semilla)
+    bloques = []
+    for i in range(peliculas):
+        filas = []
+        for d in range(dias):
+            prefijo = "Hoy, " if d == 0 else ("Mañana, " if d == 1 else "")
+            botones = "".join(
+                f'<a class="btn btn-sm btn-outline-secondary" href="https://tickets.example/{i}/{d}/{h}">{h}</a>'
+                for h in sorted(rnd.sample(HORAS, sesiones))
+            )
+            filas.append(
+                f'<div class="row g-0 sess-row" data-sess-date="2025-07-{11 + d}">'
+                f'<div class="col-3"><span class="wday">{prefijo}{DIAS_SEMANA[(4 + d) % 7]}</span>'
+                f'<span class="mday">{11 + d} de julio</span></div>'
+                f'<div class="col-9 sess-btns">{botones}</div></div>'
+            )
+        # Las formas en que aparece la preventa, incluido el texto partido en varias etiquetas;
+        # el texto suelto en el contenedor (fuera de un hermano) no cuenta
+        preventa = {
+            0: '<div class="pre-sale-alert">Entradas en preventa</div>',
+            3: 'Entradas en preventa',
+            5: '<div class="notice"><p><b>¡Entradas</b> en preventa!</p></div>',
+            7: '<p>¡Entradas<!-- aviso --> en <i>pre</i>venta!</p>',
+        }.get(i % 10, "")
+        bloques.append(
+            f'<div class="movie-showtimes mb-4">'
+            f'<div class="mv-title"><span class="fs-5">Película número {i} (VOSE)</span></div>'
+            f'<div class="mv-info"><img src="p{i}.jpg"><p>Sinopsis de la película {i}. ' + "texto " * 40 + '</p></div>'
+            f'{preventa}<div class="sessions">{"".join(filas)}</div></div>'
+        )
+    return ("<html><head><title>Cartelera</title></head><body><div class=\"container\">"
+            + "".join(bloques) + "</div></body></html>")
+
+
+def parsear_filmaffinity_bs4(html: str) -> list:
+    """Implementación anterior (BeautifulSoup + html.parser), como referencia."""
+    soup = BeautifulSoup(html, "html.parser")
+    resultado = []
+
+    for titulo_tag in soup.select("span.fs-5"):
+        peli = {"titulo": titulo_tag.get_text(strip=True),
+                "preventas": False,
+                "funciones": []}
+
+        nodo = titulo_tag.parent.find_next_sibling()
+        while nodo and not nodo.find("span", class_="fs-5"):
+
+            if nodo.find(class_="pre-sale-alert") or "Entradas en preventa" in nodo.get_text():
+                peli["preventas"] = True
+
+            for fila in nodo.find_all(attrs={"data-sess-date": True}):
+                wday_raw = fila.select_one("span.wday").get_text(" ", strip=True)
+                dia_txt = RE_PREFIX.sub("", wday_raw).strip()
+                mday = fila.select_one("span.mday")
+                if mday:
+                    dia_txt = f"{dia_txt} {mday.get_text(strip=True)}"
+                horarios = [
+                    {"hora": a.get_text(strip=True), "url": a["href"]}
+                    for a in fila.select("a.btn")
+                ]
+                if horarios:
+                    peli["funciones"].append({"dia": dia_txt,
+                                              "fecha": fila["data-sess-date"],
+                                              "horarios": horarios})
+
+            nodo = nodo.find_next_sibling()
+
+        resultado.append(peli)
+
+    return resultado
+
+
+def _medir(funcion, *args, repeticiones: int = 10) -> float:
+    """Mejor tiempo (ms) de varias ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def bench_parser():
+    """Parser FilmAffinity: lxml en una pasada vs BeautifulSoup anterior."""
+    for peliculas in (10, 40, 100):
+        html = generar_html_filmaffinity(peliculas=peliculas)
+        nuevo = parsear_filmaffinity(html)
+        assert nuevo == tuple(map(pelicula_desde_dict, parsear_filmaffinity_bs4(html)))
+        assert [p.preventas for p in nuevo[:10]] == [i in (0, 5, 7) for i in range(min(10, peliculas))]
+        antes = _medir(parsear_filmaffinity_bs4, html)
+        ahora = _medir(parsear_filmaffinity, html)
+        print(f"{peliculas:>4} películas ({len(html) // 1024} KB): "
+              f"bs4 {antes:7.1f} ms | lxml {ahora:6.1f} ms | x{antes / ahora:.1f}")
+
+
+def _cartelera_dicts(cines: int, peliculas: int, dias: int, sesiones: int) -> list:
+    """Carteleras como árbol de dicts; cada cadena es un objeto nuevo, como al parsear HTML."""
+    rnd = random.Random(1)
+    return [
+        [
+            {"titulo": "".join(["Película ", str(p), " (VOSE)"]),
+             "preventas": p % 10 == 0,
+             "funciones": [
+                 {"dia": " ".join([DIAS_SEMANA[(4 + d) % 7], str(11 + d), "de julio"]),
+                  "horarios": [{"hora": "".join([h]), "url": f"https://tickets.example/{c}/{p}/{d}/{h}"}
+                               for h in sorted(rnd.sample(HORAS, sesiones))]}
+                 for d in range(dias)
+             ]}
+            for p in range(peliculas)
+        ]
+        for c in range(cines)
+    ]
+
+
+def _cartelera_modelos(carteleras: list) -> list:
+    return [
+        tuple(crear_pelicula(p["titulo"], p["preventas"],
+                             (crear_funcion(f["dia"], (crear_horario(h["hora"], h["url"]) for h in f["horarios"]))
+                              for f in p["funciones"]))
+              for p in cartelera)
+        for cartelera in carteleras
+    ]
+
+
+def _memoria(construir) -> tuple:
+    """(objeto, KB reservados) medido con tracemalloc."""
+    tracemalloc.start()
+    objeto = construir()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, actual / 1024
+
+
+def bench_memoria():
+    """Memoria de un snapshot multi-cine: árbol de dicts vs modelo con slots e interning."""
+    for cines in (3, 40):
+        # Las URLs son únicas en ambos casos: se generan fuera de la medición
+        dicts = _cartelera_dicts(cines, peliculas=25, dias=7, sesiones=6)
+        urls_kb = sum(sys.getsizeof(h["url"]) for c in dicts for p in c
+                      for f in p["funciones"] for h in f["horarios"]) / 1024
+
+        _, kb_dicts = _memoria(lambda: _cartelera_dicts(cines, peliculas=25, dias=7, sesiones=6))
+        _, kb_modelos = _memoria(lambda: _cartelera_modelos(dicts))
+        kb_dicts -= urls_kb
+        print(f"{cines:>3} cines (25 películas x 7 días x 6 sesiones, sin contar URLs): "
+              f"dicts {kb_dicts:8.0f} KB | modelos {kb_modelos:7.0f} KB | "
+              f"-{100 * (1 - kb_modelos / kb_dicts):.0f} %")
+
+
+def bench_render():
+    """Pantallas: construir en cada clic vs buscar en la tabla memo del snapshot."""
+    from datetime import datetime
+    from fechas import ZONA_HORARIA
+
+    cine = Cine("bench", "Cine de pruebas", "🎬", "filmaffinity", "")
+    # Reloj fijo antes de la primera sesión de la cartelera sintética (11 de julio)
+    ahora = datetime(2025, 7, 11, 9, 0, tzinfo=ZONA_HORARIA)
+    for peliculas in (10, 40, 100):
+        (cartelera,) = _cartelera_modelos(_cartelera_dicts(1, peliculas=peliculas, dias=7, sesiones=6))
+        snapshot = crear_snapshot(cine.id, 1, cartelera, ahora.timestamp())
+        cartelera = snapshot.peliculas
+        # Recorrido típico: opciones → días → horarios de cada día, para todas las películas
+        clics = [(n, *idx) for g, grupo in enumerate(snapshot.grupos) for p in grupo.peliculas
+                 for n, idx in [("opciones", (g, p)), ("dias", (g, p))]
+                 + [("horarios", (g, p, d)) for d in range(len(cartelera[p].funciones))]]
+
+        render = Renderizador({cine.id: cine}, reloj=lambda: ahora)
+        publicar = _medir(render.publicar, snapshot)
+        construir = _medir(lambda: [CONSTRUCTORES[n](snapshot, *idx) for n, *idx in clics])
+        memo = _medir(lambda: [render.pantalla(snapshot, n, *idx) for n, *idx in clics])
+        print(f"{peliculas:>4} películas ({len(clics)} pantallas): publicar {publicar:6.2f} ms | "
+              f"por clic: construir {1000 * construir / len(clics):5.1f} µs, "
+              f"memo {1000 * memo / len(clics):4.2f} µs")
+
+
+def bench_precarga():
+    """Precarga de TMDb: títulos uno a uno (como los toques de usuario) vs en bloque."""
+    import zlib
+    import httpx
+    import http_client
+    import tmdb_api
+    import tmdb_precarga
+    from tmdb_cache import CacheTMDb
+    from titulos import IndiceTitulos
+
+    latencia = 0.15   # segundos por petición simulada
+
+    async def responder(peticion):
+        await asyncio.sleep(latencia)
+        if "query" not in peticion.url.params:   # /movie/{id}
+            tmdb_id = int(peticion.url.path.rsplit("/", 1)[1])
+            return httpx.Response(200, json={"id": tmdb_id, "title": f"Película {tmdb_id}"})
+        titulo = peticion.url.params["query"]
+        return httpx.Response(200, json={"results": [{"id": zlib.crc32(titulo.encode()), "title": titulo}]})
+
+    async def medir(titulos: int):
+        http_client._cliente = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+        with tempfile.TemporaryDirectory() as carpeta:
+            tmdb_api.cache_tmdb = tmdb_precarga.cache_tmdb = CacheTMDb(os.path.join(carpeta, "tmdb.db"))
+            # Índice de títulos aparte: los ids falsos no deben acabar en la base de datos real
+            tmdb_api.indice_titulos = IndiceTitulos(os.path.join(carpeta, "tmdb.db"))
+            precarga = tmdb_precarga.PrecargaTMDb()
+            nombres = [f"Estreno {i}" for i in range(titulos)]
+
+            inicio = time.perf_counter()
+            for nombre in nombres:
+                await tmdb_api.cliente_tmdb.buscar_remoto(nombre)
+            secuencial = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            precarga.encolar(nombres)
+            await precarga._tarea
+            bloque = time.perf_counter() - inicio
+            tmdb_api.cache_tmdb.cerrar()
+            tmdb_api.indice_titulos.cerrar()
+        await http_client.cerrar_cliente()
+        return secuencial, bloque
+
+    for titulos in (20, 60):
+        secuencial, bloque = asyncio.run(medir(titulos))
+        print(f"{titulos:>4} títulos ({latencia * 1000:.0f} ms/petición): uno a uno {secuencial:5.2f} s | "
+              f"precarga {bloque:5.2f} s (concurrencia {tmdb_precarga.TMDB_CONCURRENCIA}, "
+              f"{tmdb_precarga.TMDB_PETICIONES_POR_SEGUNDO:.0f} pet/s)")
+
+
+def bench_updates():
+    """Updates: procesado secuencial (por defecto) vs concurrente con lock por chat."""
+    from telegram import Chat, Message, Update
+    from telegram.ext import SimpleUpdateProcessor
+    from procesador import ProcesadorPorChat
+
+    chats, toques, duracion = 20, 3, 0.05   # un handler lento (scrape o TMDb) tarda 50 ms
+
+    async def medir(procesador):
+        orden = {}
+
+        async def handler(chat, n):
+            await asyncio.sleep(duracion)
+            orden.setdefault(chat, []).append(n)
+
+        updates = [
+            (Update(i, message=Message(i, None, Chat(chat, "private"))), handler(chat, n))
+            for i, (n, chat) in enumerate((n, chat) for n in range(toques) for chat in range(chats))
+        ]
+        inicio = time.perf_counter()
+        async with procesador:
+            await asyncio.gather(*(procesador.process_update(u, c) for u, c in updates))
+        total = time.perf_counter() - inicio
+        assert all(v == list(range(toques)) for v in orden.values())
+        return total
+
+    secuencial = asyncio.run(medir(SimpleUpdateProcessor(1)))
+    procesador = ProcesadorPorChat(concurrentes=16)
+    concurrente = asyncio.run(medir(procesador))
+    esperas = procesador.esperas()
+    print(f"{chats} chats x {toques} toques ({duracion * 1000:.0f} ms/handler): secuencial {secuencial:5.2f} s | "
+          f"por chat {concurrente:5.2f} s (espera p50 {esperas['p50']:.0f} ms, p95 {esperas['p95']:.0f} ms)")
+
+
+def bench_busqueda():
+    """/buscar y /ahora: recorrer las carteleras de todos los cines vs consultar el índice."""
+    from datetime import datetime
+    from buscador import IndiceSesiones, _indexar
+    from fechas import ZONA_HORARIA
+    from titulos import normalizar_titulo
+
+    desde = datetime(2025, 7, 12, 17, 0, tzinfo=ZONA_HORARIA)
+    creado = datetime(2025, 7, 11, 9, 0, tzinfo=ZONA_HORARIA).timestamp()
+    for peliculas in (10, 40, 100):
+        carteleras = _cartelera_modelos(_cartelera_dicts(3, peliculas=peliculas, dias=7, sesiones=6))
+        snapshots = [crear_snapshot(f"cine{c}", c + 1, cartelera, creado) for c, cartelera in enumerate(carteleras)]
+        indice = IndiceSesiones([s.cine for s in snapshots])
+        publicar = _medir(lambda: [indice.publicar(s) for s in snapshots]) / len(snapshots)
+        consulta = f"pelicula {peliculas // 2}"
+
+        def recorrer():
+            # Sin índice: normalizar títulos y recorrer las sesiones de todos los cines en cada consulta
+            clave = normalizar_titulo(consulta)
+            return [(s.cine, g) for s in snapshots for g, grupo in enumerate(s.grupos)
+                    if clave in normalizar_titulo(grupo.titulo_base)], \
+                   [x for s in snapshots for x in _indexar(s).sesiones if x.inicio >= desde]
+
+        antes = _medir(recorrer)
+        buscar = _medir(indice.buscar, consulta, desde, repeticiones=200)
+        ahora = _medir(indice.proximas, desde, 3, repeticiones=200)
+        print(f"{peliculas:>4} películas x 3 cines ({len(indice)} sesiones): indexar {publicar:5.2f} ms/cine | "
+              f"recorrer {antes:6.2f} ms | /buscar {1000 * buscar:5.1f} µs | /ahora {1000 * ahora:5.1f} µs")
+
+
+def bench_difusion():
+    """Avisos de novedades: comparar snapshots y repartir a miles de suscriptores por la cola."""
+    from cines import Cine
+    from difusion import ColaDifusion
+    from limitador import LimitadorTelegram
+    from novedades import Novedades, comparar
+    from suscripciones import CINE, Suscripciones
+
+    carteleras = _cartelera_modelos(_cartelera_dicts(2, peliculas=40, dias=7, sesiones=6))
+    anterior = crear_snapshot("cine0", 1, carteleras[0], time.time())
+    # Nueva cartelera: las 10 últimas películas cambian de sesiones y llega un estreno en preventa
+    nuevo = crear_snapshot("cine0", 2, carteleras[0][:30] + carteleras[1][30:]
+                           + (crear_pelicula("Estreno en preventa", True, carteleras[1][0].funciones),), time.time())
+    diff = _medir(comparar, anterior, nuevo, repeticiones=50)
+
+    class BotFalso:
+        """Como ExtBot: cada envío pasa por el limitador de la Application."""
+
+        def __init__(self, por_segundo: float):
+            self.limitador = LimitadorTelegram(por_segundo=por_segundo)
+
+        async def send_message(self, chat_id, text, rate_limit_args=None, **kwargs):
+            async def peticion():
+                await asyncio.sleep(0.03)   # latencia de la API de Telegram
+                return True
+            return await self.limitador.process_request(peticion, (), {}, "sendMessage",
+                                                        {"chat_id": chat_id, "text": text}, rate_limit_args)
+
+    async def medir(suscripciones: Suscripciones, por_segundo: float):
+        difusion = ColaDifusion(ventana=0)
+        novedades = Novedades({"cine0": Cine("cine0", "Cine 0", "🎬", "filmaffinity", "")}, suscripciones, difusion)
+        novedades.publicar(anterior)
+        inicio = time.perf_counter()
+        novedades.publicar(nuevo)
+        encolar = time.perf_counter() - inicio
+        difusion.iniciar(BotFalso(por_segundo))
+        while difusion.stats["ultimo_lote"] is None:
+            await asyncio.sleep(0.01)
+        await difusion.cerrar()
+        return encolar, difusion.stats["ultimo_lote"][1]
+
+    # 30 msg/s: límite normal de Telegram por bot; 1000 msg/s: el tope lo pone la concurrencia
+    for chats, por_segundo in ((300, 30), (2000, 1000)):
+        with tempfile.TemporaryDirectory() as carpeta:
+            suscripciones = Suscripciones(os.path.join(carpeta, "suscripciones.db"))
+            for chat in range(chats):
+                suscripciones.alternar(chat, CINE, "cine0", "Cine 0")
+            encolar, envio = asyncio.run(medir(suscripciones, por_segundo))
+            suscripciones.cerrar()
+        print(f"{chats:>4} suscriptores, {por_segundo:>4} msg/s: comparar {diff:4.2f} ms | "
+              f"avisos encolados en {1000 * encolar:5.1f} ms | enviados en {envio:5.1f} s")
+
+
+def bench_limitador():
+    """Envíos a Telegram: respuestas interactivas durante una difusión, sin y con prioridades."""
+    from limitador import LimitadorTelegram, Prioridad
+
+    avisos, respuestas = 150, 20
+
+    async def medir(prioridad_fondo):
+        limitador = LimitadorTelegram(por_segundo=30)
+
+        async def peticion():
+            await asyncio.sleep(0.03)   # latencia de la API de Telegram
+            return True
+
+        latencias = []
+
+        async def enviar(chat, prioridad, retraso=0.0):
+            await asyncio.sleep(retraso)
+            inicio = time.perf_counter()
+            await limitador.process_request(peticion, (), {}, "sendMessage", {"chat_id": chat}, prioridad)
+            if prioridad is None:
+                latencias.append(time.perf_counter() - inicio)
+
+        # Una difusión de avisos y, mientras sale, usuarios que tocan botones
+        await asyncio.gather(*(enviar(1000 + i, prioridad_fondo) for i in range(avisos)),
+                             *(enviar(i + 1, None, retraso=0.1 * i) for i in range(respuestas)))
+        latencias.sort()
+        return 1000 * latencias[len(latencias) // 2], 1000 * latencias[int(len(latencias) * 0.95)]
+
+    for nombre, prioridad in (("misma cola", None), ("con prioridad", Prioridad.FONDO)):
+        p50, p95 = asyncio.run(medir(prioridad))
+        print(f"{avisos} avisos a 30 msg/s + {respuestas} respuestas, {nombre:>13}: "
+              f"respuesta p50 {p50:6.0f} ms | p95 {p95:6.0f} ms")
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "memoria": bench_memoria,
+    "render": bench_render,
+    "precarga": bench_precarga,
+    "updates": bench_updates,
+    "busqueda": bench_busqueda,
+    "difusion": bench_difusion,
+    "limitador": bench_limitador,
+}
+
+if __name__ == "__main__":
+    nombres = sys.argv[1:] or list(BENCHMARKS)
+    for nombre in nombres:
+        print(f"=== {nombre} ===")
+        BENCHMARKS[nombre]()
@@ -5,364 +5,527 @@ Desarrollado como proyecto educativo asistido por IA.
 """
 
 # 📦 Importaciones necesarias
+import asyncio
+import math
 import os
+import time
+from datetime import datetime
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
+from telegram.constants import InlineKeyboardMarkupLimit, InlineQueryLimit, MessageLimit
+from telegram.error import BadRequest, TelegramError
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     CallbackQueryHandler,
     ContextTypes,
+    InlineQueryHandler,
+)
+from scrapers import ESTADISTICAS_PUBLICINE, ESTADISTICAS_SCRAPING, obtener_cartelera
+from cines import cargar_cines
+from http_client import cerrar_cliente
+from browser_pool import cerrar_pool
+from tmdb_api import (
+    TMDB_IDIOMA,
+    buscar_pelicula,
+    cache_tmdb,
+    cliente_tmdb,
+    indice_titulos,
+    obtener_url_miniatura,
 )
-from scrapers import get_cinesa_showtimes, get_odeon_showtimes, get_yelmo_showtimes
-from tmdb_api import buscar_pelicula, obtener_url_cartel  # ← NUEVA LÍNEA
+from tmdb_cache import NO_CACHEADO
+from carteles import POSTERS_CHAT_ID, CacheCarteles
+from cache import CacheCarteleras
+from callbacks import Accion, Boton, codificar, decodificar, tabla_cines
+from sesiones import GestorSesiones
+from render import Renderizador
+from tmdb_precarga import PrecargaTMDb
+from prefetch import Prefetcher
+from fechas import ZONA_HORARIA
+from buscador import IndiceSesiones
+from suscripciones import CINE, PELICULA, Suscripciones
+from difusion import ColaDifusion
+from novedades import Novedades
+from titulos import normalizar_titulo
+from procesador import ProcesadorPorChat
+from limitador import LimitadorTelegram
+from persistencia import ESTADO_INTERVALO, cargar_estado, guardar_estado
 
 # 🔐 Cargar las variables de entorno desde el archivo .env
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+CARTELERA_TTL = float(os.getenv("CARTELERA_TTL", "900"))  # segundos
+BOT_MODO = os.getenv("BOT_MODO", "polling").lower()  # polling | webhook
+CINES_POR_FILA = 2
+BUSCAR_RESULTADOS = int(os.getenv("BUSCAR_RESULTADOS", "5"))   # títulos como mucho por búsqueda
+BUSCAR_DIAS = int(os.getenv("BUSCAR_DIAS", "3"))               # días con sesiones por cine
+BUSCAR_MAX_CINES = int(os.getenv("BUSCAR_MAX_CINES", "20"))     # filas película × cine como mucho
+AHORA_HORAS = float(os.getenv("AHORA_HORAS", "3"))             # ventana por defecto de /ahora
+AHORA_MAX = int(os.getenv("AHORA_MAX", "30"))                  # sesiones como mucho en /ahora
+INLINE_RESULTADOS = int(os.getenv("INLINE_RESULTADOS", "10"))  # títulos como mucho en modo inline
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))  # segundos que Telegram reutiliza la respuesta
+
+# ⏱️ Tiempo desde el arranque hasta la primera pantalla útil servida a un usuario
+ARRANQUE = {"inicio": time.monotonic(), "primera_respuesta": None, "restaurado": False}
+
+# 🏢 Registro de cines (cines.json)
+CINES = cargar_cines()
+CODIGOS_CINES = tabla_cines(CINES)   # código del callback_data → id de cine
+
+# 🗃️ Caché de carteleras compartida por todos los usuarios
+carteleras = CacheCarteleras(
+    {cine.id: (lambda cine=cine: obtener_cartelera(cine)) for cine in CINES.values()},
+    ttl=CARTELERA_TTL,
+)
+prefetcher = Prefetcher(carteleras)
+
+# 🔎 Índice de sesiones de todos los cines (/buscar, /ahora)
+indice_sesiones = IndiceSesiones(CINES)
+carteleras.al_publicar(indice_sesiones.publicar)
+
+# 🔔 Avisos de novedades: cada snapshot nuevo se compara con el anterior y los
+# cambios salen por la cola de difusión a quien sigue el cine o la película
+suscripciones = Suscripciones()
+difusion = ColaDifusion()
+difusion.al_bloquear = suscripciones.borrar_chat
+novedades = Novedades(CINES, suscripciones, difusion)
+carteleras.al_publicar(novedades.publicar)
+
+# 🖼️ Pantallas precalculadas de cada snapshot
+render = Renderizador(CINES)
+carteleras.al_publicar(render.publicar)
+
+# 🎞️ Precarga de TMDb: cada cartelera nueva deja la caché de metadatos caliente
+precarga_tmdb = PrecargaTMDb()
+carteleras.al_publicar(precarga_tmdb.al_publicar)
+
+# 🖼️ file_id de Telegram de cada cartel ya enviado
+carteles = CacheCarteles()
+
+# 🧭 Sesiones: solo el último cartel enviado a cada usuario (la navegación va en los botones)
+sesiones = GestorSesiones()
+
+# ⚙️ Updates en paralelo entre chats, en orden dentro de cada chat
+procesador_updates = ProcesadorPorChat()
+
+# 🚦 Todo lo que se envía a Telegram pasa por los límites global y por chat
+limitador = LimitadorTelegram()
+
+def _hora(ts):
+    """Formatea un timestamp como HH:MM:SS en hora de Madrid."""
+    return datetime.fromtimestamp(ts, ZONA_HORARIA).strftime("%H:%M:%S")
+
+def teclado_cines() -> InlineKeyboardMarkup:
+    """Botones de la pantalla inicial, generados desde el registro de cines."""
+    botones = [InlineKeyboardButton(cine.etiqueta, callback_data=codificar(Accion.CINE, cine.id))
+               for cine in CINES.values()]
+    keyboard = [botones[i:i + CINES_POR_FILA] for i in range(0, len(botones), CINES_POR_FILA)]
+    return InlineKeyboardMarkup(keyboard)
 
 # 🎬 Comando /start: muestra los botones con los cines
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Crear botones inline con los nombres de los cines
-    keyboard = [
-        [
-            InlineKeyboardButton("🎟️ Cinesa Parquesur", callback_data="cinesa"),
-            InlineKeyboardButton("🎥 Odeón Sambil", callback_data="odeon"),
-            InlineKeyboardButton("🍿 Yelmo Islazul", callback_data="yelmo"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     # Enviar el mensaje con los botones
     await update.message.reply_text(
         "🎬 ¡Bienvenido al Bot de Cartelera de Madrid Sur!\n\n"
-        "Selecciona un cine para ver la cartelera:",
-        reply_markup=reply_markup
+        "Selecciona un cine para ver la cartelera\n"
+        "(o busca una película en todos los cines con /buscar <título>, "
+        "o mira qué empieza pronto con /ahora; tus avisos de novedades, en /avisos):",
+        reply_markup=teclado_cines()
     )
 
-# 🎯 Función que maneja los clics en los botones inline
-async def handle_button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()  # Confirma que el clic se ha recibido
+def _dias_encontrada(encontrada) -> list:
+    """
+    Horas de los próximos días de una película en un cine, con el texto del
+    día tal y como lo da el cine (y la versión al lado de cada hora si hay varias).
+    """
+    varias = len(encontrada.snapshot.grupos[encontrada.grupo].peliculas) > 1
+    dias = {}
+    for sesion in encontrada.sesiones:
+        dia = encontrada.snapshot.peliculas[sesion.pelicula].funciones[sesion.dia].dia
+        if dia not in dias and len(dias) == BUSCAR_DIAS:
+            break
+        version = sesion.titulo.removeprefix(encontrada.titulo).strip() if varias else ""
+        dias.setdefault(dia, []).append(f"{sesion.horario.hora} {version}".strip())
+    if not dias:
+        return ["Sin sesiones próximas"]
+    return [f"📅 {dia}: {', '.join(horas)}" for dia, horas in dias.items()]
+
+# 🔎 Comando /buscar <título>: la película en todos los cines, desde el índice
+async def buscar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    texto = " ".join(context.args or [])
+    if not texto:
+        await update.message.reply_text("🔎 Uso: /buscar <título>\nPor ejemplo: /buscar dune")
+        return
 
-    cine_seleccionado = query.data  # callback_data: "cinesa", "odeon", "yelmo"
+    encontradas = indice_sesiones.buscar(texto, datetime.now(ZONA_HORARIA), limite=BUSCAR_RESULTADOS)
+    if not encontradas:
+        await update.message.reply_text(f"🔎 Ninguna película de la cartelera coincide con «{texto}».")
+        return
 
-    # Respuesta diferente según el botón pulsado
-    if cine_seleccionado == "cinesa":
-        # Obtener cartelera
-        cartelera = get_cinesa_showtimes()
-        
-        # Guardar en contexto
-        context.user_data['cartelera_actual'] = cartelera
-        context.user_data['cine_actual'] = 'cinesa'
-        
-        # Agrupar películas por título base
-        peliculas_agrupadas = {}
-        for pelicula in cartelera:
-            titulo = pelicula['titulo']
-            titulo_base = titulo.split('(')[0].strip()
-            
-            if titulo_base not in peliculas_agrupadas:
-                peliculas_agrupadas[titulo_base] = []
-            peliculas_agrupadas[titulo_base].append(pelicula)
-        
-        context.user_data['peliculas_agrupadas'] = peliculas_agrupadas
-        
-        # 🆕 CREAR LISTA DE TÍTULOS (mapeo índice → título)
-        titulos_lista = list(peliculas_agrupadas.keys())
-        context.user_data['titulos_lista'] = titulos_lista
-
-        # Crear botones con ÍNDICES en lugar de títulos
-        keyboard = []
-        for idx, titulo_base in enumerate(titulos_lista):
-            tiene_preventas = any(p['preventas'] for p in peliculas_agrupadas[titulo_base])
-            
-            texto_boton = f"🎬 {titulo_base}"
-            if tiene_preventas:
-                texto_boton += " (Preventa)"
-            
-            # 🔑 CAMBIO CRÍTICO: usar índice corto
-            keyboard.append([InlineKeyboardButton(
-                texto_boton, 
-                callback_data=f"peli_{idx}"
-            )])
-
-        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_cines")])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            text="🎟️ *Cinesa Parquesur* - Películas disponibles:",
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
+    lineas = [f"🔎 *Resultados para «{escape_markdown(texto)}»*"]
+    keyboard = []
+    clave_anterior = None
+    # Una fila por película y cine: con muchos cines hay que cortar antes de los
+    # límites de Telegram (100 botones, 4096 caracteres)
+    maximo = min(BUSCAR_MAX_CINES, InlineKeyboardMarkupLimit.TOTAL_BUTTON_NUMBER)
+    for encontrada in encontradas[:maximo]:
+        bloque = []
+        if encontrada.clave != clave_anterior:
+            # Los títulos llevan a veces caracteres de Markdown ("Thunderbolts*")
+            bloque += ["", f"🎬 *{escape_markdown(encontrada.titulo)}*"]
+        cine = CINES[encontrada.snapshot.cine]
+        bloque.append(f"{cine.emoji} {cine.nombre}")
+        bloque += [f"   {escape_markdown(linea)}" for linea in _dias_encontrada(encontrada)]
+        if len("\n".join(lineas + bloque)) > MessageLimit.MAX_TEXT_LENGTH - 100:
+            break
+        lineas += bloque
+        clave_anterior = encontrada.clave
+
+        datos = codificar(Accion.GRUPO, cine.id, encontrada.snapshot.version, encontrada.grupo)
+        keyboard.append([InlineKeyboardButton(f"{cine.emoji} {encontrada.titulo} · {cine.nombre}", callback_data=datos)])
+    if len(keyboard) < len(encontradas):
+        lineas += ["", f"… y {len(encontradas) - len(keyboard)} más: prueba con un título más concreto"]
+
+    await update.message.reply_text(
+        "\n".join(lineas),
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+
+# 🔍 Modo inline (@bot título en cualquier chat): resultados del índice, con cartel
+# (hay que activarlo una vez con /setinline en @BotFather)
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    consulta = update.inline_query.query.strip()
+    resultados = []
+    if consulta:
+        encontradas = indice_sesiones.buscar(consulta, datetime.now(ZONA_HORARIA), limite=INLINE_RESULTADOS)
+        # Hay un resultado por título y cine: con muchos cines se pasa del máximo de Telegram (50)
+        for encontrada in encontradas[:InlineQueryLimit.RESULTS]:
+            cine = CINES[encontrada.snapshot.cine]
+            dias = _dias_encontrada(encontrada)
+            # Solo lo que ya está en la caché de TMDb: aquí no se espera a la API
+            grupo = encontrada.snapshot.grupos[encontrada.grupo]
+            datos = cache_tmdb.obtener(encontrada.snapshot.titulo_tmdb(grupo), TMDB_IDIOMA, contar=False)
+            poster_path = datos.get("poster_path") if datos is not NO_CACHEADO and datos else None
+            resultados.append(InlineQueryResultArticle(
+                id=f"{cine.id}:{encontrada.snapshot.version}:{encontrada.grupo}",
+                title=encontrada.titulo,
+                description=f"{cine.emoji} {cine.nombre} · {dias[0]}",
+                thumbnail_url=obtener_url_miniatura(poster_path) or None,
+                input_message_content=InputTextMessageContent(
+                    "\n".join([f"🎬 *{escape_markdown(encontrada.titulo)}*", f"{cine.emoji} {cine.nombre}", "",
+                               *map(escape_markdown, dias)]),
+                    parse_mode="Markdown"
+                ),
+            ))
+
+    await update.inline_query.answer(resultados, cache_time=INLINE_CACHE_TIME)
+
+# 🕐 Comando /ahora [horas]: sesiones que empiezan pronto en cualquier cine
+async def ahora(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    horas = AHORA_HORAS
+    if context.args:
+        try:
+            horas = float(context.args[0].replace(",", "."))
+            if not math.isfinite(horas):   # "nan" o "inf" pasan por float()
+                raise ValueError(horas)
+            horas = min(max(horas, 0.5), 24)
+        except ValueError:
+            await update.message.reply_text("🕐 Uso: /ahora [horas]\nPor ejemplo: /ahora 2")
+            return
+
+    momento = datetime.now(ZONA_HORARIA)
+    proximas = indice_sesiones.proximas(momento, horas)
+    if not proximas:
+        await update.message.reply_text(f"🕐 No hay sesiones en las próximas {horas:g} h.")
+        return
+
+    lineas = [f"🕐 *Sesiones en las próximas {horas:g} h*", ""]
+    for sesion in proximas[:AHORA_MAX]:
+        cine = CINES[sesion.cine]
+        manana = "mañana " if sesion.inicio.date() != momento.date() else ""
+        lineas.append(f"{manana}{sesion.horario.hora} · {escape_markdown(sesion.titulo)} · {cine.emoji} {cine.nombre}")
+    if len(proximas) > AHORA_MAX:
+        lineas.append(f"… y {len(proximas) - AHORA_MAX} más")
+    await update.message.reply_text("\n".join(lineas), parse_mode="Markdown")
+
+# 🔔 Comando /avisos [borrar]: qué cines y películas sigue el chat
+async def avisos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat.id
+    if context.args and context.args[0].lower() in ("borrar", "ninguno", "off"):
+        borradas = suscripciones.borrar_chat(chat)
+        await update.message.reply_text(f"🔕 Avisos desactivados ({borradas} suscripciones borradas).")
+        return
+
+    suscritas = suscripciones.de_chat(chat)
+    if not suscritas:
+        await update.message.reply_text(
+            "🔔 No sigues ningún cine ni película.\n\n"
+            "Pulsa «🔔 Avisos de este cine» en la lista de películas de un cine, o "
+            "«🔔 Avisos de esta película» en una película, y te avisaré de estrenos, "
+            "preventas y sesiones nuevas."
         )
         return
-    
-    elif cine_seleccionado == "odeon":
-        cartelera = await get_odeon_showtimes()
-        context.user_data['cartelera_actual'] = cartelera
-        context.user_data['cine_actual'] = 'odeon'
-        
-        peliculas_agrupadas = {}
-        for pelicula in cartelera:
-            titulo = pelicula['titulo']
-            titulo_base = titulo.split('(')[0].strip()
-            
-            if titulo_base not in peliculas_agrupadas:
-                peliculas_agrupadas[titulo_base] = []
-            peliculas_agrupadas[titulo_base].append(pelicula)
-        
-        context.user_data['peliculas_agrupadas'] = peliculas_agrupadas
-        
-        # 🆕 CREAR LISTA DE TÍTULOS
-        titulos_lista = list(peliculas_agrupadas.keys())
-        context.user_data['titulos_lista'] = titulos_lista
-
-        keyboard = []
-        for idx, titulo_base in enumerate(titulos_lista):
-            tiene_preventas = any(p['preventas'] for p in peliculas_agrupadas[titulo_base])
-            texto_boton = f"🎬 {titulo_base}"
-            if tiene_preventas:
-                texto_boton += " (Preventa)"
-            
-            # 🔑 USAR ÍNDICE
-            keyboard.append([InlineKeyboardButton(
-                texto_boton, 
-                callback_data=f"peli_{idx}"
-            )])
-
-        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_cines")])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+
+    lineas = ["🔔 Te aviso de las novedades de:", ""]
+    for tipo, clave, nombre in suscritas:
+        if tipo == CINE and clave in CINES:
+            lineas.append(f"{CINES[clave].emoji} {CINES[clave].nombre} (todo el cine)")
+        elif tipo == PELICULA:
+            lineas.append(f"🎬 {nombre} (en cualquier cine)")
+    lineas += ["", "Vuelve a pulsar el botón 🔔 para dejar de seguir algo, o /avisos borrar para quitarlos todos."]
+    await update.message.reply_text("\n".join(lineas))
+
+# 📊 Comando /estado: muestra el estado de la caché de carteleras
+async def estado(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    lineas = ["📊 *Estado de la caché*", ""]
+    for info in carteleras.estado():
+        edad = "sin datos" if info['edad'] is None else f"hace {int(info['edad'])}s"
+        refresco = " 🔄" if info['refrescando'] else ""
+        lineas.append(f"- {info['cine']}: {info['peliculas']} películas, {edad}{refresco}")
+        if info['ultimo_exito']:
+            lineas.append(f"  ✅ Último refresco correcto: {_hora(info['ultimo_exito'])}")
+        if info['cine'] in prefetcher.proximo:
+            lineas.append(f"  ⏰ Próxima precarga: {_hora(prefetcher.proximo[info['cine']])}")
+
+    stats = carteleras.stats
+    lineas.append("")
+    lineas.append(
+        f"Aciertos: {stats['aciertos']} | Obsoletos: {stats['obsoletos']} | "
+        f"Fallos: {stats['fallos']} | Refrescos: {stats['refrescos']} (sin cambios: {stats['sin_cambios']}) | "
+        f"Errores: {stats['errores']}"
+    )
+    lineas.append(
+        f"Publicine: {ESTADISTICAS_PUBLICINE['estatico']} HTML estático | "
+        f"{ESTADISTICAS_PUBLICINE['navegador']} con navegador"
+    )
+    lineas.append(f"Sesiones activas: {len(sesiones)} | Expulsadas: {sesiones.expulsadas}")
+    if ARRANQUE["primera_respuesta"] is not None:
+        origen = "estado restaurado" if ARRANQUE["restaurado"] else "arranque en frío"
+        lineas.append(f"Primera respuesta útil: {ARRANQUE['primera_respuesta']:.1f}s tras el arranque ({origen})")
+    stats_updates = procesador_updates.stats
+    esperas = procesador_updates.esperas()
+    lineas.append(
+        f"Updates: {stats_updates['procesados']} procesados | {stats_updates['activos']} activos | "
+        f"{stats_updates['esperando']} en cola (máx. {stats_updates['max_esperando']})"
+        + (f" | espera p50 {esperas['p50']:.0f} ms, p95 {esperas['p95']:.0f} ms" if esperas else "")
+    )
+    stats_envios = limitador.stats
+    lineas.append(
+        f"Envíos a Telegram: {stats_envios['peticiones']} | {stats_envios['frenadas']} frenados por los límites | "
+        f"{stats_envios['ediciones_omitidas']} ediciones sin cambios omitidas | "
+        f"{stats_envios['retry_after']} RetryAfter ({stats_envios['segundos_pausa']:.0f}s en pausa)"
+    )
+    for prioridad, espera in limitador.esperas().items():
+        lineas.append(
+            f"  Espera {prioridad}: p50 {espera['p50']:.0f} ms | p95 {espera['p95']:.0f} ms | máx. {espera['max']:.0f} ms"
+        )
+    lineas.append(
+        f"TMDb: {100 * cache_tmdb.ratio_aciertos():.0f} % aciertos | "
+        f"{cache_tmdb.stats['negativos']} no encontrados | {cache_tmdb.stats['fallos']} consultas a la API"
+    )
+    lineas.append(
+        f"Índice de títulos: {len(indice_titulos)} | {indice_titulos.stats['exactos']} exactos | "
+        f"{indice_titulos.stats['aproximados']} aproximados | {indice_titulos.stats['desconocidos']} nuevos"
+    )
+    for endpoint, lat in cliente_tmdb.latencias().items():
+        stats_endpoint = cliente_tmdb.stats[endpoint]
+        lineas.append(
+            f"TMDb {endpoint}: {stats_endpoint['peticiones']} peticiones ({stats_endpoint['agrupadas']} agrupadas, "
+            f"{stats_endpoint['errores']} errores) | p50 {lat['p50']:.0f} ms | p95 {lat['p95']:.0f} ms"
+        )
+    duracion = precarga_tmdb.stats['ultima_duracion']
+    lineas.append(
+        f"Precarga TMDb: {precarga_tmdb.stats['resueltos']} resueltos | "
+        f"{precarga_tmdb.stats['no_encontrados']} no encontrados | {precarga_tmdb.stats['errores']} errores"
+        + (f" | última en {duracion:.1f}s" if duracion is not None else "")
+    )
+    latencias = carteles.latencias()
+    lineas.append(
+        f"Carteles: {carteles.stats['file_id']} por file_id"
+        + (f" ({latencias['file_id']:.0f} ms)" if "file_id" in latencias else "")
+        + f" | {carteles.stats['url']} por URL"
+        + (f" ({latencias['url']:.0f} ms)" if "url" in latencias else "")
+        + f" | {carteles.stats['subidos']} subidos por adelantado"
+    )
+    indexacion = indice_sesiones.stats['ultima_indexacion']
+    lineas.append(
+        f"Índice de sesiones: {len(indice_sesiones)} sesiones | {indice_sesiones.titulos()} títulos | "
+        f"{indice_sesiones.sin_fecha()} días sin fecha | {indice_sesiones.stats['busquedas']} búsquedas | "
+        f"{indice_sesiones.stats['ahora']} /ahora"
+        + (f" | última indexación {1000 * indexacion:.1f} ms" if indexacion is not None else "")
+    )
+    lineas.append(
+        f"Avisos: {len(suscripciones)} suscripciones de {suscripciones.chats()} chats | "
+        f"{novedades.stats['con_cambios']}/{novedades.stats['comparaciones']} carteleras con cambios | "
+        f"{difusion.stats['enviados']} enviados ({difusion.stats['agrupados']} agrupados, "
+        f"{len(difusion)} chats en cola) | "
+        f"{difusion.stats['bloqueados']} bloqueados | {difusion.stats['errores']} errores"
+    )
+    lineas.append(
+        f"Pantallas memo: {render.stats['aciertos']} aciertos | {render.stats['fallos']} fallos | "
+        f"{render.stats['cortes']} renovaciones por sesiones empezadas"
+    )
+    lineas.append(
+        f"Parseos: {ESTADISTICAS_SCRAPING['parseos']} | Omitidos por 304: "
+        f"{ESTADISTICAS_SCRAPING['omitidos_304']} | Omitidos sin cambios: {ESTADISTICAS_SCRAPING['omitidos_hash']}"
+    )
+    await update.message.reply_text("\n".join(lineas), parse_mode="Markdown")
+
+# 🧭 Navegación: cada botón lleva su propio estado (callbacks.py) y se resuelve
+# directamente contra el snapshot compartido, sin estado por usuario
+AVISO_ACTUALIZADA = "🔄 La cartelera se ha actualizado"
+
+async def _editar(query, pantalla, aviso: str = ""):
+    """Muestra una pantalla precalculada (texto + teclado) en el mensaje."""
+    texto, reply_markup = pantalla
+    try:
         await query.edit_message_text(
-            text="🎥 *Odeón Sambil* - Películas disponibles:",
+            text=f"{aviso}{texto}",
             reply_markup=reply_markup,
             parse_mode="Markdown"
         )
-        return
-    
-    elif cine_seleccionado == "yelmo":
-        cartelera = get_yelmo_showtimes()
-        context.user_data['cartelera_actual'] = cartelera
-        context.user_data['cine_actual'] = 'yelmo'
-        
-        peliculas_agrupadas = {}
-        for pelicula in cartelera:
-            titulo = pelicula['titulo']
-            titulo_base = titulo.split('(')[0].strip()
-            
-            if titulo_base not in peliculas_agrupadas:
-                peliculas_agrupadas[titulo_base] = []
-            peliculas_agrupadas[titulo_base].append(pelicula)
-        
-        context.user_data['peliculas_agrupadas'] = peliculas_agrupadas
-        
-        # 🆕 CREAR LISTA DE TÍTULOS
-        titulos_lista = list(peliculas_agrupadas.keys())
-        context.user_data['titulos_lista'] = titulos_lista
-
-        keyboard = []
-        for idx, titulo_base in enumerate(titulos_lista):
-            tiene_preventas = any(p['preventas'] for p in peliculas_agrupadas[titulo_base])
-            texto_boton = f"🎬 {titulo_base}"
-            if tiene_preventas:
-                texto_boton += " (Preventa)"
-            
-            # 🔑 USAR ÍNDICE
-            keyboard.append([InlineKeyboardButton(
-                texto_boton, 
-                callback_data=f"peli_{idx}"
-            )])
-
-        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_cines")])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    except BadRequest as e:
+        # Doble toque en el mismo botón: el mensaje ya muestra esa pantalla
+        if "not modified" not in e.message.lower():
+            raise
+    if ARRANQUE["primera_respuesta"] is None:
+        ARRANQUE["primera_respuesta"] = time.monotonic() - ARRANQUE["inicio"]
+        origen = "estado restaurado" if ARRANQUE["restaurado"] else "arranque en frío"
+        print(f"⏱️ Primera respuesta útil {ARRANQUE['primera_respuesta']:.2f}s tras el arranque ({origen})")
+
+def _indices_validos(snapshot, boton: Boton) -> bool:
+    """Comprueba que los índices del botón existen en el snapshot y encajan entre sí."""
+    if boton.accion in (Accion.INICIO, Accion.CINE, Accion.AVISOS_CINE):
+        return True
+    if boton.grupo is None or boton.grupo >= len(snapshot.grupos):
+        return False
+    if boton.accion in (Accion.GRUPO, Accion.AVISOS_PELICULA):
+        return True
+    if boton.pelicula not in snapshot.grupos[boton.grupo].peliculas:
+        return False
+    if boton.accion is Accion.HORARIOS:
+        return boton.dia is not None and boton.dia < len(snapshot.peliculas[boton.pelicula].funciones)
+    return True
+
+async def _cartelera_actualizada(query, cine: str):
+    """El botón apunta a una cartelera ya descartada: avisar y mostrar la actual."""
+    await query.answer(AVISO_ACTUALIZADA)
+    snapshot = await carteleras.obtener(cine)
+    if snapshot is None:
         await query.edit_message_text(
-            text="🍿 *Yelmo Islazul* - Películas disponibles:",
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
+            text="❌ Error: No hay datos de películas. Selecciona un cine:",
+            reply_markup=teclado_cines()
         )
         return
-    else:
-        mensaje = "❓ Cine no reconocido."
+    await _editar(query, render.pantalla(snapshot, "peliculas"), aviso=f"{AVISO_ACTUALIZADA}.\n\n")
 
-    # Enviar respuesta
-    await query.edit_message_text(text=mensaje, parse_mode="Markdown")
-
-# 🎬 Función que maneja la selección de una película
-async def handle_movie_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# 🎯 Punto de entrada único de los botones: decodifica y despacha por acción
+async def handle_button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-    
-    # 🆕 EXTRAER ÍNDICE en lugar de título
-    idx = int(query.data.replace("peli_", ""))
-    
-    # 🆕 OBTENER TÍTULO desde el mapeo guardado
-    titulos_lista = context.user_data.get('titulos_lista', [])
-    if idx >= len(titulos_lista):
-        await query.edit_message_text("❌ Error: película no encontrada")
-        return
-    
-    titulo_base = titulos_lista[idx]
-
-    # Resto del código IGUAL (obtener versiones, etc.)
-    peliculas_agrupadas = context.user_data.get('peliculas_agrupadas', {})
-    versiones = peliculas_agrupadas.get(titulo_base, [])
-    
-    if len(versiones) == 1:
-        pelicula = versiones[0]
-        context.user_data['pelicula_seleccionada'] = pelicula
-        
-        keyboard = [
-            [InlineKeyboardButton("📅 Ver horarios", callback_data="ver_horarios")],
-            [InlineKeyboardButton("📖 Ver información", callback_data="ver_info")],
-            [InlineKeyboardButton("🔙 Volver", callback_data="volver_peliculas")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+    boton = decodificar(query.data, CODIGOS_CINES)
+    if boton is None:
+        # Botón de un formato anterior (mensajes antiguos) o dañado
+        await query.answer(AVISO_ACTUALIZADA)
         await query.edit_message_text(
-            text=f"🎬 *{pelicula['titulo']}*\n\n¿Qué quieres hacer?",
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
+            text=f"{AVISO_ACTUALIZADA}. Selecciona un cine para ver la cartelera:",
+            reply_markup=teclado_cines()
         )
-    else:
-        context.user_data['versiones_actuales'] = versiones
+        return
 
-        keyboard = []
-        for i, pelicula in enumerate(versiones):
-            titulo_completo = pelicula['titulo']
-            keyboard.append([InlineKeyboardButton(f"🎭 {titulo_completo}", callback_data=f"version_{i}")])
+    snapshot = carteleras.snapshot(boton.cine, boton.version) if boton.version is not None else None
+    necesita_snapshot = boton.version is not None or boton.accion not in (Accion.INICIO, Accion.CINE)
+    if necesita_snapshot and (snapshot is None or not _indices_validos(snapshot, boton)):
+        await _cartelera_actualizada(query, boton.cine)
+        return
 
-        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_peliculas")])
+    if boton.accion not in ACCIONES_AVISOS:   # estas confirman el clic con su propio mensaje
+        await query.answer()  # Confirma que el clic se ha recibido
+    await MANEJADORES[boton.accion](update, context, boton, snapshot)
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
+# 🏠 Volver a la pantalla inicial de cines
+async def handle_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
+    await update.callback_query.edit_message_text(
+        text="🎬 ¡Bienvenido al Bot de Cartelera de Madrid Sur!\n\n"
+             "Selecciona un cine para ver la cartelera:",
+        reply_markup=teclado_cines()
+    )
+
+# 🏢 Películas de un cine (la cartelera del botón, o la actual si no lleva versión)
+async def handle_cine(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
+    query = update.callback_query
+    if snapshot is None:
+        snapshot = await carteleras.obtener(boton.cine)
+    if snapshot is None:
+        cine = CINES[boton.cine]
         await query.edit_message_text(
-            text=f"🎬 *{titulo_base}*\n\nSelecciona la versión:",
-            reply_markup=reply_markup,
+            text=f"{cine.emoji} *{cine.nombre}*\n\n❌ No se pudo cargar la cartelera. Inténtalo más tarde.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data=codificar(Accion.INICIO))]]),
             parse_mode="Markdown"
         )
+        return
 
-# 📅 Función que maneja la selección de una versión específica        
-async def handle_version_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    # Extraer índice de la versión del callback_data
-    version_index = int(query.data.replace("version_", ""))
-    
-    # Obtener la versión específica
-    versiones_actuales = context.user_data.get('versiones_actuales', [])
-    pelicula = versiones_actuales[version_index]
-    
-    # Guardar la película seleccionada
-    context.user_data['pelicula_seleccionada'] = pelicula
-    
-    # Mostrar opciones (horarios/info)
-    keyboard = [
-        [InlineKeyboardButton("📅 Ver horarios", callback_data="ver_horarios")],
-        [InlineKeyboardButton("📖 Ver información", callback_data="ver_info")],
-        [InlineKeyboardButton("🔙 Volver", callback_data="volver_versiones")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        text=f"🎬 *{pelicula['titulo']}*\n\n¿Qué quieres hacer?",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
+    await _editar(query, render.pantalla(snapshot, "peliculas"))
+
+# 🎬 Película (título base): sus versiones, o directamente las opciones si solo hay una
+async def handle_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
+    grupo = snapshot.grupos[boton.grupo]
+    if len(grupo.peliculas) == 1:
+        pantalla = render.pantalla(snapshot, "opciones", boton.grupo, grupo.peliculas[0])
+    else:
+        pantalla = render.pantalla(snapshot, "versiones", boton.grupo)
+    await _editar(update.callback_query, pantalla)
+
+# 🎭 Opciones (horarios/info) de una versión concreta
+async def handle_pelicula(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
+    await _editar(update.callback_query, render.pantalla(snapshot, "opciones", boton.grupo, boton.pelicula))
 
-# 📅 Función que maneja la selección de horarios
-async def handle_ver_horarios(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# 📅 Días con sesiones de una película
+async def handle_dias(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
     query = update.callback_query
-    await query.answer()
-    
-    # Obtener la película seleccionada
-    pelicula = context.user_data.get('pelicula_seleccionada')
-    if not pelicula:
-        await query.edit_message_text(text="❌ Error: No hay película seleccionada")
-        return
-    
-    # Extraer días disponibles
-    funciones = pelicula.get('funciones', [])
-    if not funciones:
+    if not snapshot.peliculas[boton.pelicula].funciones:
         await query.edit_message_text(text="❌ No hay horarios disponibles para esta película")
         return
-    
-    # Crear botones con los días
-    keyboard = []
-    for i, funcion in enumerate(funciones):
-        dia = funcion['dia']
-        keyboard.append([InlineKeyboardButton(f"📅 {dia}", callback_data=f"dia_{i}")])
-
-    # Añadir botón volver
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_opciones")])
 
-    # Guardar funciones para uso posterior
-    context.user_data['funciones_actuales'] = funciones
+    await _editar(query, render.pantalla(snapshot, "dias", boton.grupo, boton.pelicula))
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        text=f"🎬 *{pelicula['titulo']}*\n\n📅 Selecciona el día:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-
-# 📅 Función que maneja la selección de un día específico
-async def handle_dia_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# 🕐 Horarios de un día
+async def handle_horarios(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
     query = update.callback_query
-    await query.answer()
-    
-    # Extraer índice del día del callback_data
-    dia_index = int(query.data.replace("dia_", ""))
-    
-    # Obtener la función específica del día
-    funciones_actuales = context.user_data.get('funciones_actuales', [])
-    funcion = funciones_actuales[dia_index]
-    
-    # Extraer horarios de ese día
-    horarios = funcion.get('horarios', [])
-    if not horarios:
+    if not snapshot.peliculas[boton.pelicula].funciones[boton.dia].horarios:
         await query.edit_message_text(text="❌ No hay horarios disponibles para este día")
         return
-    
-    # Crear botones con los horarios (cada uno abre el link de compra)
-    keyboard = []
-    for horario in horarios:
-        hora = horario['hora']
-        url = horario['url']
-        keyboard.append([InlineKeyboardButton(f"🕐 {hora}", url=url)])
 
-    # Añadir botón volver
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_dias")])
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        text=f"🎬 *{context.user_data['pelicula_seleccionada']['titulo']}*\n📅 *{funcion['dia']}*\n\n🕐 Selecciona horario:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
+    await _editar(query, render.pantalla(snapshot, "horarios", boton.grupo, boton.pelicula, boton.dia))
 
 # 📖 Función que maneja la solicitud de información de la película
-async def handle_ver_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_ver_info(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
     query = update.callback_query
-    await query.answer()
-    
-    # Obtener la película seleccionada
-    pelicula = context.user_data.get('pelicula_seleccionada')
-    if not pelicula:
-        await query.edit_message_text(text="❌ Error: No hay película seleccionada")
-        return
+    pelicula = snapshot.peliculas[boton.pelicula]
+    # El último cartel enviado es lo único que se recuerda por usuario
+    usuario = update.effective_user.id
+    estado_nav = sesiones.obtener(usuario) or sesiones.iniciar(usuario)
     
     # Obtener información básica
-    titulo = pelicula['titulo']
-    tiene_preventas = "✅ Sí" if pelicula['preventas'] else "❌ No"
-    num_dias = len(pelicula.get('funciones', []))
+    titulo = pelicula.titulo
+    tiene_preventas = "✅ Sí" if pelicula.preventas else "❌ No"
+    num_dias = len(pelicula.funciones)
 
     # Buscar información en TMDb
-    pelicula_tmdb = buscar_pelicula(titulo)
+    pelicula_tmdb = await buscar_pelicula(titulo)
+    poster_path = ""
 
     # Crear botón de volver
+    volver = codificar(Accion.PELICULA, boton.cine, boton.version, boton.grupo, boton.pelicula)
     keyboard = [
-        [InlineKeyboardButton("🔙 Volver", callback_data="volver_opciones")]
+        [InlineKeyboardButton("🔙 Volver", callback_data=volver)]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -371,9 +534,9 @@ async def handle_ver_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         sinopsis = pelicula_tmdb.get('overview', 'No disponible')
         año = pelicula_tmdb.get('release_date', '')[:4] if pelicula_tmdb.get('release_date') else 'N/A'
         puntuacion = pelicula_tmdb.get('vote_average', 0)
-        cartel_url = obtener_url_cartel(pelicula_tmdb.get('poster_path', ''))
+        poster_path = pelicula_tmdb.get('poster_path') or ""
         
-        mensaje = f"""🎬 *{titulo}*
+        mensaje = f"""🎬 *{escape_markdown(titulo)}*
 
     📋 **Información:**
     - Año: {año}
@@ -382,40 +545,43 @@ async def handle_ver_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     - Días disponibles: {num_dias}
 
     📝 **Sinopsis:**
-    {sinopsis}"""
+    {escape_markdown(sinopsis)}"""
+
+    else:
+        # No se encontró en TMDb
+        mensaje = f"""🎬 *{escape_markdown(titulo)}*
+
+    📋 **Información disponible:**
+    - En preventa: {tiene_preventas}
+    - Días disponibles: {num_dias}
+
+    ❌ **No se encontró información adicional en TMDb**"""
 
-    # Si hay cartel, enviar como foto separada PRIMERO
-    if cartel_url:
+    # Si hay cartel, enviar como foto separada PRIMERO (salvo que ya sea la última enviada)
+    ya_enviado = estado_nav.imagen_info_id and estado_nav.imagen_cartel == (poster_path, titulo)
+    if poster_path and not ya_enviado:
         # Eliminar imagen anterior si existe
-        imagen_anterior_id = context.user_data.get('imagen_info_id')
-        if imagen_anterior_id:
+        if estado_nav.imagen_info_id:
             try:
                 await context.bot.delete_message(
                     chat_id=query.message.chat_id,
-                    message_id=imagen_anterior_id
+                    message_id=estado_nav.imagen_info_id
                 )
-            except:
-                pass  # Ignorar si no se puede eliminar
+            except TelegramError as e:
+                # Ya borrada por el usuario o demasiado antigua (más de 48 h)
+                print(f"⚠️ No se pudo borrar el cartel anterior del chat {query.message.chat_id}: {e}")
         
-        # Enviar nueva imagen
-        mensaje_imagen = await query.message.reply_photo(
-            photo=cartel_url,
-            caption=f"🎬 *{titulo}*",
+        # Enviar nueva imagen (por file_id si Telegram ya la tiene)
+        mensaje_imagen = await carteles.enviar(
+            query.message,
+            poster_path,
+            caption=f"🎬 *{escape_markdown(titulo)}*",
             parse_mode="Markdown"
         )
         
         # Guardar ID de la nueva imagen
-        context.user_data['imagen_info_id'] = mensaje_imagen.message_id
-
-    else:
-        # No se encontró en TMDb
-        mensaje = f"""🎬 *{titulo}*
-
-    📋 **Información disponible:**
-    - En preventa: {tiene_preventas}
-    - Días disponibles: {num_dias}
-
-    ❌ **No se encontró información adicional en TMDb**"""
+        estado_nav.imagen_info_id = mensaje_imagen.message_id
+        estado_nav.imagen_cartel = (poster_path, titulo)
     
     # DESPUÉS editar mensaje original con info y botón volver funcional
     await query.edit_message_text(
@@ -424,188 +590,122 @@ async def handle_ver_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
-# 🔙 Función que maneja el botón de volver a las opciones
-async def handle_volver_opciones(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    # Obtener la película seleccionada
-    pelicula = context.user_data.get('pelicula_seleccionada')
-    if not pelicula:
-        await query.edit_message_text(text="❌ Error: No hay película seleccionada")
-        return
-    
-    # Mostrar las opciones (horarios/info) con botón volver
-    keyboard = [
-        [InlineKeyboardButton("📅 Ver horarios", callback_data="ver_horarios")],
-        [InlineKeyboardButton("📖 Ver información", callback_data="ver_info")]
-    ]
-    
-    # Determinar a dónde volver según el contexto
-    versiones_actuales = context.user_data.get('versiones_actuales', [])
-    if versiones_actuales and len(versiones_actuales) > 1:
-        # Si hay múltiples versiones, volver a versiones
-        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_versiones")])
+# 🔔 Seguir / dejar de seguir un cine o una película (la pantalla no cambia)
+async def _alternar_aviso(query, tipo: str, clave: str, nombre: str):
+    suscrito = suscripciones.alternar(query.message.chat_id, tipo, clave, nombre)
+    if suscrito is None:
+        texto = f"⚠️ Ya sigues {suscripciones.maximo} cines o películas: quita alguno en /avisos"
+    elif suscrito:
+        texto = f"🔔 Te avisaré de las novedades de {nombre}"
     else:
-        # Si hay una sola versión, volver a películas
-        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_peliculas")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        text=f"🎬 *{pelicula['titulo']}*\n\n¿Qué quieres hacer?",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-
-# 🔙 Función que maneja el botón de volver a la selección de días
-async def handle_volver_dias(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    # Obtener la película seleccionada
-    pelicula = context.user_data.get('pelicula_seleccionada')
-    if not pelicula:
-        await query.edit_message_text(text="❌ Error: No hay película seleccionada")
-        return
-    
-    # Obtener funciones (ya están guardadas en el contexto)
-    funciones = context.user_data.get('funciones_actuales', [])
-    if not funciones:
-        await query.edit_message_text(text="❌ No hay horarios disponibles")
-        return
-    
-    # Recrear botones con los días
-    keyboard = []
-    for i, funcion in enumerate(funciones):
-        dia = funcion['dia']
-        keyboard.append([InlineKeyboardButton(f"📅 {dia}", callback_data=f"dia_{i}")])
-    
-    # Añadir botón volver
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_opciones")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        text=f"🎬 *{pelicula['titulo']}*\n\n📅 Selecciona el día:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-
-# 🔙 Función que maneja el botón de volver a la selección de películas
-async def handle_volver_peliculas(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    peliculas_agrupadas = context.user_data.get('peliculas_agrupadas', {})
-    if not peliculas_agrupadas:
-        await query.edit_message_text(text="❌ Error: No hay datos de películas")
-        return
-    
-    # 🆕 OBTENER LISTA DE TÍTULOS guardada
-    titulos_lista = context.user_data.get('titulos_lista', [])
-    
-    # Recrear botones con ÍNDICES
-    keyboard = []
-    for idx, titulo_base in enumerate(titulos_lista):
-        tiene_preventas = any(p['preventas'] for p in peliculas_agrupadas[titulo_base])
-        texto_boton = f"🎬 {titulo_base}"
-        if tiene_preventas:
-            texto_boton += " (Preventa)"
-        
-        # 🔑 USAR ÍNDICE
-        keyboard.append([InlineKeyboardButton(
-            texto_boton, 
-            callback_data=f"peli_{idx}"
-        )])
-    
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_cines")])
-    
-    cine_actual = context.user_data.get('cine_actual', 'cinesa')
-    textos_cine = {
-        'cinesa': "🎟️ *Cinesa Parquesur* - Películas disponibles:",
-        'yelmo': "🍿 *Yelmo Islazul* - Películas disponibles:",
-        'odeon': "🎥 *Odeón Sambil* - Películas disponibles:"
-    }
-    texto_mensaje = textos_cine.get(cine_actual, "Películas disponibles:")
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        text=texto_mensaje,
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-
-# 🔙 Función que maneja el botón de volver a la pantalla inicial de cines
-async def handle_volver_cines(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    # Recrear pantalla inicial con botones de cines (igual que en start)
-    keyboard = [
-        [
-            InlineKeyboardButton("🎟️ Cinesa Parquesur", callback_data="cinesa"),
-            InlineKeyboardButton("🎥 Odeón Sambil", callback_data="odeon"),
-            InlineKeyboardButton("🍿 Yelmo Islazul", callback_data="yelmo"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        text="🎬 ¡Bienvenido al Bot de Cartelera de Madrid Sur!\n\n"
-             "Selecciona un cine para ver la cartelera:",
-        reply_markup=reply_markup
-    )
-
-# 🔙 Función que maneja el botón de volver a la selección de versiones
-async def handle_volver_versiones(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    # Obtener datos del contexto
-    versiones_actuales = context.user_data.get('versiones_actuales', [])
-    if not versiones_actuales:
-        await query.edit_message_text(text="❌ Error: No hay datos de versiones")
-        return
-    
-    # Obtener título base para el mensaje
-    titulo_base = versiones_actuales[0]['titulo'].split('(')[0].strip()
-    
-    # Recrear botones de versiones
-    keyboard = []
-    for i, pelicula in enumerate(versiones_actuales):
-        titulo_completo = pelicula['titulo']
-        keyboard.append([InlineKeyboardButton(f"🎭 {titulo_completo}", callback_data=f"version_{i}")])
-    
-    # Añadir botón volver
-    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="volver_peliculas")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        text=f"🎬 *{titulo_base}*\n\nSelecciona la versión:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
+        texto = f"🔕 Ya no te avisaré de {nombre}"
+    await query.answer(texto, show_alert=suscrito is None)
+
+async def handle_avisos_cine(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
+    await _alternar_aviso(update.callback_query, CINE, boton.cine, CINES[boton.cine].nombre)
+
+async def handle_avisos_pelicula(update: Update, context: ContextTypes.DEFAULT_TYPE, boton: Boton, snapshot):
+    titulo = snapshot.grupos[boton.grupo].titulo_base
+    await _alternar_aviso(update.callback_query, PELICULA, normalizar_titulo(titulo), titulo)
+
+ACCIONES_AVISOS = (Accion.AVISOS_CINE, Accion.AVISOS_PELICULA)
+
+# 🧭 Acción del botón → manejador
+MANEJADORES = {
+    Accion.INICIO: handle_inicio,
+    Accion.CINE: handle_cine,
+    Accion.GRUPO: handle_grupo,
+    Accion.PELICULA: handle_pelicula,
+    Accion.DIAS: handle_dias,
+    Accion.HORARIOS: handle_horarios,
+    Accion.INFO: handle_ver_info,
+    Accion.AVISOS_CINE: handle_avisos_cine,
+    Accion.AVISOS_PELICULA: handle_avisos_pelicula,
+}
+
+# 🧹 Purga periódica de sesiones inactivas
+async def purgar_sesiones(context: ContextTypes.DEFAULT_TYPE):
+    eliminadas = sesiones.purgar()
+    if eliminadas:
+        print(f"🧹 {eliminadas} sesiones inactivas eliminadas ({len(sesiones)} activas)")
+
+# 🧹 Limpieza diaria de la caché de TMDb en disco
+async def purgar_tmdb(context: ContextTypes.DEFAULT_TYPE):
+    eliminadas = cache_tmdb.purgar()
+    if eliminadas:
+        print(f"🧹 {eliminadas} entradas caducadas eliminadas de la caché de TMDb")
+
+# 🖼️ Subida anticipada de los carteles de la cartelera actual al chat de servicio
+async def subir_carteles(context: ContextTypes.DEFAULT_TYPE):
+    poster_paths = []
+    for cine in CINES:
+        snapshot = carteleras.actual(cine)
+        for grupo in snapshot.grupos if snapshot else ():
+            datos = cache_tmdb.obtener(snapshot.titulo_tmdb(grupo), TMDB_IDIOMA, contar=False)
+            if datos is not NO_CACHEADO and datos and datos.get("poster_path"):
+                poster_paths.append(datos["poster_path"])
+
+    subidos = await carteles.subir(context.bot, POSTERS_CHAT_ID, poster_paths)
+    if subidos:
+        print(f"🖼️ {subidos} carteles subidos a Telegram por adelantado")
+
+# 💾 Guardado periódico de carteleras y sesiones (para reinicios en caliente)
+async def guardar_estado_periodico(context: ContextTypes.DEFAULT_TYPE):
+    await guardar_estado(carteleras, sesiones)
+
+# ♻️ Restaurar el último estado guardado antes de empezar a recibir updates
+async def post_init(app):
+    ARRANQUE["restaurado"] = await cargar_estado(carteleras, sesiones)
+    difusion.iniciar(app.bot)
+
+# 🧹 Liberar recursos compartidos al apagar el bot
+async def post_shutdown(app):
+    await difusion.cerrar()
+    await guardar_estado(carteleras, sesiones)
+    await cerrar_cliente()
+    await cerrar_pool()
+    cache_tmdb.cerrar()
+    carteles.cerrar()
+    indice_titulos.cerrar()
+    suscripciones.cerrar()
 
 # 🚀 Arranque del bot
 def main():
-    app = ApplicationBuilder().token(TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .concurrent_updates(procesador_updates)
+        .rate_limiter(limitador)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Handlers de comandos y callbacks
     app.add_handler(CommandHandler("start", start))
-    app.add_handler(CallbackQueryHandler(handle_movie_selection, pattern="^peli_"))
-    app.add_handler(CallbackQueryHandler(handle_version_selection, pattern="^version_"))
-    app.add_handler(CallbackQueryHandler(handle_ver_horarios, pattern="^ver_horarios$"))
-    app.add_handler(CallbackQueryHandler(handle_ver_info, pattern="^ver_info$"))
-    app.add_handler(CallbackQueryHandler(handle_volver_opciones, pattern="^volver_opciones$"))
-    app.add_handler(CallbackQueryHandler(handle_volver_dias, pattern="^volver_dias$"))
-    app.add_handler(CallbackQueryHandler(handle_volver_peliculas, pattern="^volver_peliculas$"))
-    app.add_handler(CallbackQueryHandler(handle_volver_cines, pattern="^volver_cines$"))
-    app.add_handler(CallbackQueryHandler(handle_volver_versiones, pattern="^volver_versiones$"))  
-    app.add_handler(CallbackQueryHandler(handle_dia_selection, pattern="^dia_"))
+    app.add_handler(CommandHandler("estado", estado))
+    app.add_handler(CommandHandler("buscar", buscar))
+    app.add_handler(CommandHandler("ahora", ahora))
+    app.add_handler(CommandHandler("avisos", avisos))
+    app.add_handler(InlineQueryHandler(inline_query))
+    # Un solo handler para todos los botones: la acción va en el callback_data
     app.add_handler(CallbackQueryHandler(handle_button_click))
-    
-    print("🤖 Bot ejecutándose... Esperando interacciones")
-    app.run_polling()
+
+    # ⏰ Precarga periódica de carteleras en segundo plano
+    prefetcher.programar(app, carteleras.cargadores)
+    if app.job_queue is not None:
+        app.job_queue.run_repeating(purgar_sesiones, interval=600, first=600)
+        app.job_queue.run_repeating(purgar_tmdb, interval=86400, first=3600)
+        app.job_queue.run_repeating(guardar_estado_periodico, interval=ESTADO_INTERVALO, first=ESTADO_INTERVALO)
+        if POSTERS_CHAT_ID:
+            app.job_queue.run_repeating(subir_carteles, interval=600, first=120)
+
+    if BOT_MODO == "webhook":
+        from webhook import ejecutar_webhook
+        asyncio.run(ejecutar_webhook(app))
+    else:
+        print("🤖 Bot ejecutándose... Esperando interacciones")
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
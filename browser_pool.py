@@ -0,0 +1,127 @@
+"""
+Pool de navegador Playwright persistente para los scrapers dinámicos.
+Un único Chromium por proceso, con un número acotado de páginas reutilizables,
+bloqueo de recursos innecesarios y reinicio automático si el navegador cae.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+# Configuración
+NAVEGADOR_MAX_PAGINAS = int(os.getenv("NAVEGADOR_MAX_PAGINAS", "2"))
+
+# Recursos que no hacen falta para leer la cartelera
+TIPOS_BLOQUEADOS = {"image", "font", "stylesheet", "media"}
+DOMINIOS_BLOQUEADOS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "googlesyndication.com", "adservice.google", "facebook.net",
+    "facebook.com/tr", "hotjar.com", "criteo", "taboola", "outbrain",
+)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+
+
+async def _filtrar_peticion(route):
+    peticion = route.request
+    if peticion.resource_type in TIPOS_BLOQUEADOS or any(d in peticion.url for d in DOMINIOS_BLOQUEADOS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class PoolNavegador:
+    """
+    Chromium compartido con como máximo `max_paginas` páginas a la vez.
+    Las páginas libres se guardan para reutilizarlas en la siguiente petición.
+    """
+
+    def __init__(self, max_paginas: int = NAVEGADOR_MAX_PAGINAS):
+        self.max_paginas = max_paginas
+        self._semaforo = asyncio.Semaphore(max_paginas)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._navegador = None
+        self._libres: List = []
+        self.reinicios = 0
+
+    async def _asegurar_navegador(self):
+        """Arranca Chromium la primera vez o si se ha caído."""
+        async with self._lock:
+            if self._navegador is not None and self._navegador.is_connected():
+                return self._navegador
+
+            from playwright.async_api import async_playwright
+
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._navegador is not None:
+                self.reinicios += 1
+                print(f"⚠️ Chromium desconectado, reiniciando (reinicio nº {self.reinicios})")
+
+            self._libres.clear()  # las páginas del navegador anterior ya no sirven
+            self._navegador = await self._playwright.chromium.launch(
+                headless=True,
+                args=["--disable-dev-shm-usage", "--disable-gpu"],
+            )
+            print("✅ Chromium iniciado")
+            return self._navegador
+
+    async def _nueva_pagina(self, navegador):
+        contexto = await navegador.new_context(user_agent=USER_AGENT, locale="es-ES")
+        await contexto.route("**/*", _filtrar_peticion)
+        return await contexto.new_page()
+
+    @asynccontextmanager
+    async def pagina(self):
+        """Presta una página del pool; se devuelve al salir si sigue sana."""
+        async with self._semaforo:
+            navegador = await self._asegurar_navegador()
+            pagina = self._libres.pop() if self._libres else await self._nueva_pagina(navegador)
+            sana = False
+            try:
+                yield pagina
+                sana = True
+            finally:
+                if sana and navegador.is_connected() and not pagina.is_closed():
+                    self._libres.append(pagina)
+                else:
+                    await _cerrar_contexto(pagina)
+
+    async def cerrar(self):
+        """Cierra el navegador y Playwright (al apagar el bot)."""
+        async with self._lock:
+            self._libres.clear()
+            if self._navegador is not None:
+                try:
+                    await self._navegador.close()
+                except Exception:
+                    pass
+                self._navegador = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+async def _cerrar_contexto(pagina):
+    try:
+        await pagina.context.close()
+    except Exception:
+        pass  # el navegador puede estar ya caído
+
+
+_pool: Optional[PoolNavegador] = None
+
+
+def obtener_pool() -> PoolNavegador:
+    """Devuelve el pool del proceso, creándolo la primera vez."""
+    global _pool
+    if _pool is None:
+        _pool = PoolNavegador()
+    return _pool
+
+
+async def cerrar_pool():
+    if _pool is not None:
+        await _pool.cerrar()
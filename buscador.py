@@ -0,0 +1,216 @@
+"""
+Índice de sesiones de todos los cines, para /buscar, /ahora y el modo inline.
+Se rehace para un cine cada vez que se publica su snapshot (nunca en una
+consulta): título normalizado → grupos de cada cine con sus sesiones, y
+sesiones de cada cine ordenadas por hora de inicio. Los títulos se indexan
+además por prefijos de palabra y por trigramas, para buscar mientras se
+escribe (con o sin tildes, con palabras a medias o alguna errata). Las
+consultas son solo búsquedas en memoria, sin tocar los scrapers.
+"""
+
+import bisect
+import heapq
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+from modelos import Horario, Snapshot
+from titulos import normalizar_titulo
+
+PREFIJO_MAX = 8            # prefijos de palabra indexados (los más largos se comprueban aparte)
+TRIGRAMAS_MINIMO = 0.4     # parte de los trigramas de la consulta que debe tener un título
+
+
+def trigramas(texto: str) -> Set[str]:
+    """Trigramas de un texto normalizado, con bordes de palabra ("dune" → " du", "dun", "une", "ne ")."""
+    texto = f" {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+@dataclass(frozen=True, slots=True)
+class Sesion:
+    inicio: datetime     # hora de Madrid
+    cine: str
+    version: int         # versión del snapshot del que sale
+    grupo: int           # índice en snapshot.grupos
+    pelicula: int        # índice en snapshot.peliculas
+    dia: int             # índice en pelicula.funciones
+    titulo: str          # título completo de la versión
+    horario: Horario
+
+
+@dataclass(frozen=True, slots=True)
+class Encontrada:
+    """Una película buscada en un cine, con sus próximas sesiones."""
+    clave: str           # título normalizado (el mismo en todos los cines)
+    titulo: str
+    snapshot: Snapshot
+    grupo: int
+    sesiones: Tuple[Sesion, ...]
+
+
+@dataclass(slots=True)
+class _IndiceCine:
+    snapshot: Snapshot
+    sesiones: List[Sesion]                    # todas, por hora de inicio
+    inicios: List[datetime]                   # inicio de cada sesión (para bisect)
+    por_grupo: Dict[int, Tuple[Sesion, ...]]  # sesiones de cada grupo, por hora
+    sin_fecha: int                            # días que no se pudieron interpretar
+
+
+def _indexar(snapshot: Snapshot) -> _IndiceCine:
+    # Fechas y horas ya vienen interpretadas en el snapshot (modelos.crear_snapshot)
+    sesiones: List[Sesion] = []
+    sin_fecha = 0
+    for idx_grupo, grupo in enumerate(snapshot.grupos):
+        for idx_pelicula in grupo.peliculas:
+            pelicula = snapshot.peliculas[idx_pelicula]
+            for idx_dia, funcion in enumerate(pelicula.funciones):
+                if funcion.fecha is None:
+                    sin_fecha += 1
+                    continue
+                for horario in funcion.horarios:
+                    if horario.inicio is not None:
+                        sesiones.append(Sesion(horario.inicio, snapshot.cine, snapshot.version,
+                                               idx_grupo, idx_pelicula, idx_dia, pelicula.titulo, horario))
+
+    sesiones.sort(key=lambda s: s.inicio)
+    por_grupo: Dict[int, List[Sesion]] = {}
+    for sesion in sesiones:
+        por_grupo.setdefault(sesion.grupo, []).append(sesion)
+    return _IndiceCine(snapshot, sesiones, [s.inicio for s in sesiones],
+                       {g: tuple(lista) for g, lista in por_grupo.items()}, sin_fecha)
+
+
+class IndiceSesiones:
+    """Índice cruzado de las carteleras actuales de todos los cines."""
+
+    def __init__(self, cines: List[str]):
+        self.cines = list(cines)   # orden de presentación de los resultados
+        self._cines: Dict[str, _IndiceCine] = {}
+        self._titulos: Dict[str, Dict[str, int]] = {}   # clave → {cine: índice de grupo}
+        self._prefijos: Dict[str, Set[str]] = {}          # prefijo de palabra → claves
+        self._trigramas: Dict[str, Set[str]] = {}         # trigrama → claves
+        self.stats = {"busquedas": 0, "ahora": 0, "ultima_indexacion": None}
+
+    def __len__(self) -> int:
+        return sum(len(indice.sesiones) for indice in self._cines.values())
+
+    def titulos(self) -> int:
+        return len(self._titulos)
+
+    def sin_fecha(self) -> int:
+        return sum(indice.sin_fecha for indice in self._cines.values())
+
+    def publicar(self, snapshot: Snapshot):
+        """Suscriptor de CacheCarteleras.al_publicar: reindexa el cine del snapshot."""
+        anterior = self._cines.get(snapshot.cine)
+        if anterior is not None and anterior.snapshot.version > snapshot.version:
+            return
+        inicio = time.perf_counter()
+        indice = _indexar(snapshot)
+
+        if anterior is not None:
+            for grupo in anterior.snapshot.grupos:
+                clave = normalizar_titulo(grupo.titulo_base)
+                cines = self._titulos.get(clave)
+                if cines is not None:
+                    cines.pop(snapshot.cine, None)
+                    if not cines:
+                        del self._titulos[clave]
+                        self._desindexar_clave(clave)
+        for idx_grupo, grupo in enumerate(snapshot.grupos):
+            clave = normalizar_titulo(grupo.titulo_base)
+            if clave not in self._titulos:
+                self._titulos[clave] = {}
+                self._indexar_clave(clave)
+            self._titulos[clave][snapshot.cine] = idx_grupo
+        self._cines[snapshot.cine] = indice
+        self.stats["ultima_indexacion"] = time.perf_counter() - inicio
+
+    def _indexar_clave(self, clave: str):
+        for palabra in clave.split():
+            for largo in range(1, min(len(palabra), PREFIJO_MAX) + 1):
+                self._prefijos.setdefault(palabra[:largo], set()).add(clave)
+        for trigrama in trigramas(clave):
+            self._trigramas.setdefault(trigrama, set()).add(clave)
+
+    def _desindexar_clave(self, clave: str):
+        for palabra in clave.split():
+            for largo in range(1, min(len(palabra), PREFIJO_MAX) + 1):
+                self._descartar(self._prefijos, palabra[:largo], clave)
+        for trigrama in trigramas(clave):
+            self._descartar(self._trigramas, trigrama, clave)
+
+    @staticmethod
+    def _descartar(indice: Dict[str, Set[str]], entrada: str, clave: str):
+        claves = indice.get(entrada)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del indice[entrada]
+
+    def claves(self, texto: str, limite: int) -> List[str]:
+        """
+        Títulos normalizados que encajan con el texto, del mejor al peor: el
+        mismo título, los que empiezan igual, los que tienen palabras que
+        empiezan por cada palabra escrita ("senor ani") y, si faltan, los más
+        parecidos por trigramas (palabras sueltas del medio o erratas).
+        """
+        consulta = normalizar_titulo(texto)
+        if not consulta:
+            return []
+        palabras = consulta.split()
+
+        # Prefijos: intersección de las claves de cada palabra (la más rara primero)
+        conjuntos = sorted((self._prefijos.get(p[:PREFIJO_MAX], set()) for p in palabras), key=len)
+        por_prefijo = set(conjuntos[0]).intersection(*conjuntos[1:])
+        largas = [p for p in palabras if len(p) > PREFIJO_MAX]
+        if largas:
+            por_prefijo = {c for c in por_prefijo
+                           if all(any(t.startswith(p) for t in c.split()) for p in largas)}
+        candidatas = sorted(por_prefijo, key=lambda c: (c != consulta, not c.startswith(consulta), len(c), c))
+
+        if len(candidatas) < limite:
+            buscados = trigramas(consulta)
+            comunes = Counter()
+            for trigrama in buscados:
+                comunes.update(self._trigramas.get(trigrama, ()))
+            minimo = TRIGRAMAS_MINIMO * len(buscados)
+            parecidas = sorted((c for c, n in comunes.items() if n >= minimo and c not in por_prefijo),
+                               key=lambda c: (-comunes[c], len(c), c))
+            candidatas += parecidas
+        return candidatas[:limite]
+
+    def buscar(self, texto: str, desde: datetime, limite: int = 5) -> List[Encontrada]:
+        """
+        Películas cuyo título encaja con el texto (ver claves()), en cada cine
+        que las tenga, con sus sesiones desde `desde`. Como mucho `limite` títulos.
+        """
+        self.stats["busquedas"] += 1
+        resultado = []
+        for clave in self.claves(texto, limite):
+            cines = self._titulos[clave]
+            for cine in self.cines:
+                if cine not in cines:
+                    continue
+                indice = self._cines[cine]
+                grupo = cines[cine]
+                sesiones = indice.por_grupo.get(grupo, ())
+                primera = bisect.bisect_left(sesiones, desde, key=lambda s: s.inicio)
+                resultado.append(Encontrada(clave, indice.snapshot.grupos[grupo].titulo_base, indice.snapshot,
+                                            grupo, sesiones[primera:]))
+        return resultado
+
+    def proximas(self, desde: datetime, horas: float) -> List[Sesion]:
+        """Sesiones de todos los cines que empiezan entre `desde` y `desde + horas`, por hora."""
+        self.stats["ahora"] += 1
+        hasta = desde + timedelta(hours=horas)
+        tramos = []
+        for indice in self._cines.values():
+            primera = bisect.bisect_left(indice.inicios, desde)
+            ultima = bisect.bisect_left(indice.inicios, hasta, lo=primera)
+            tramos.append(indice.sesiones[primera:ultima])
+        return list(heapq.merge(*tramos, key=lambda s: s.inicio))
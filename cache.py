@@ -0,0 +1,203 @@
+"""
+Caché compartida de carteleras para todos los usuarios del bot.
+Sirve al instante la última cartelera buena de cada cine y la refresca
+en segundo plano cuando caduca (stale-while-revalidate).
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from fechas import fecha_de
+from modelos import Pelicula, Snapshot, crear_snapshot
+
+# Snapshots anteriores que se conservan por cine para las sesiones en curso
+SNAPSHOTS_ANTERIORES = int(os.getenv("SNAPSHOTS_ANTERIORES", "2"))
+
+# Un cargador es una corrutina sin argumentos que devuelve la cartelera
+Cargador = Callable[[], Awaitable[Tuple[Pelicula, ...]]]
+
+
+@dataclass
+class EntradaCache:
+    snapshot: Snapshot
+    actualizado: float      # time.monotonic() del último refresco correcto
+    datos: Optional[Tuple[Pelicula, ...]] = None   # lo que devolvió el cargador (None si se restauró)
+
+
+class CacheCarteleras:
+    """
+    Caché de carteleras por cine, compartida por todo el proceso.
+    Los refrescos concurrentes de un mismo cine se agrupan en uno solo.
+    """
+
+    def __init__(self, cargadores: Dict[str, Cargador], ttl: float = 900):
+        self.cargadores = cargadores
+        self.ttl = ttl
+        self._entradas: Dict[str, EntradaCache] = {}
+        self._refrescos: Dict[str, asyncio.Task] = {}
+        self._versiones = itertools.count(1)
+        self._historial: Dict[str, Deque[Snapshot]] = {}
+        self._suscriptores: List[Callable[[Snapshot], None]] = []
+        self.stats = {"aciertos": 0, "obsoletos": 0, "fallos": 0,
+                      "refrescos": 0, "sin_cambios": 0, "errores": 0}
+
+    def al_publicar(self, funcion: Callable[[Snapshot], None]):
+        """Registra una función que recibe cada snapshot nuevo al publicarse."""
+        self._suscriptores.append(funcion)
+
+    def edad(self, cine: str) -> Optional[float]:
+        """Segundos desde el último refresco correcto (None si nunca)."""
+        entrada = self._entradas.get(cine)
+        if entrada is None:
+            return None
+        return time.monotonic() - entrada.actualizado
+
+    async def obtener(self, cine: str) -> Optional[Snapshot]:
+        """
+        Devuelve el snapshot de la cartelera de un cine (None si no se pudo cargar).
+        - Acierto: se devuelve tal cual.
+        - Obsoleta (TTL vencido): se devuelve y se refresca en segundo plano.
+        - Fallo (nunca cargada): se espera al refresco en curso.
+        """
+        entrada = self._entradas.get(cine)
+        if entrada is None:
+            self.stats["fallos"] += 1
+            await self.refrescar(cine)
+            entrada = self._entradas.get(cine)
+            return entrada.snapshot if entrada else None
+
+        if self.edad(cine) > self.ttl:
+            self.stats["obsoletos"] += 1
+            self._lanzar_refresco(cine)
+        else:
+            self.stats["aciertos"] += 1
+        return entrada.snapshot
+
+    def snapshot(self, cine: str, version: int) -> Optional[Snapshot]:
+        """
+        Busca una versión concreta de la cartelera (la actual o una reciente).
+        None si ya se ha descartado.
+        """
+        entrada = self._entradas.get(cine)
+        if entrada is not None and entrada.snapshot.version == version:
+            return entrada.snapshot
+        for anterior in self._historial.get(cine, ()):
+            if anterior.version == version:
+                return anterior
+        return None
+
+    def actual(self, cine: str) -> Optional[Snapshot]:
+        """Snapshot actual sin contar estadísticas ni lanzar refrescos."""
+        entrada = self._entradas.get(cine)
+        return entrada.snapshot if entrada else None
+
+    async def refrescar(self, cine: str) -> bool:
+        """
+        Refresca un cine reutilizando el refresco en curso si lo hay.
+        Retorna True si se obtuvo una cartelera nueva válida.
+        """
+        # shield: si el handler que espera se cancela, el refresco compartido sigue
+        return await asyncio.shield(self._lanzar_refresco(cine))
+
+    def _lanzar_refresco(self, cine: str) -> asyncio.Task:
+        tarea = self._refrescos.get(cine)
+        if tarea is None or tarea.done():
+            tarea = asyncio.create_task(self._refrescar(cine))
+            self._refrescos[cine] = tarea
+            tarea.add_done_callback(lambda t: self._refrescos.pop(cine, None)
+                                    if self._refrescos.get(cine) is t else None)
+        return tarea
+
+    async def _refrescar(self, cine: str) -> bool:
+        self.stats["refrescos"] += 1
+        inicio = time.monotonic()
+        try:
+            datos = await self.cargadores[cine]()
+        except Exception as e:
+            self.stats["errores"] += 1
+            print(f"❌ Error refrescando {cine}: {e}")
+            return False
+
+        anterior = self._entradas.get(cine)
+        if not datos and anterior is not None:
+            # Los scrapers devuelven [] al fallar: conservar la última cartelera buena
+            self.stats["errores"] += 1
+            print(f"⚠️ {cine}: cartelera vacía, se mantiene la anterior")
+            return False
+
+        datos = tuple(datos)
+        ahora = time.time()
+        if (anterior is not None and anterior.datos is not None
+                and (datos is anterior.datos or datos == anterior.datos)
+                and fecha_de(anterior.snapshot.creado) == fecha_de(ahora)):
+            # 304 o misma zona de sesiones: el snapshot (y los botones con su versión) sigue valiendo.
+            # Solo el mismo día, porque "Hoy" y "Mañana" se interpretan respecto a su fecha.
+            anterior.actualizado = time.monotonic()
+            self.stats["sin_cambios"] += 1
+            print(f"🔄 {cine}: sin cambios en {time.monotonic() - inicio:.2f}s")
+            return True
+
+        snapshot = crear_snapshot(cine, next(self._versiones), datos, ahora)
+        if anterior is not None:
+            self._historial.setdefault(cine, deque(maxlen=SNAPSHOTS_ANTERIORES)).appendleft(anterior.snapshot)
+        self._entradas[cine] = EntradaCache(snapshot, time.monotonic(), datos)
+        self._publicar(snapshot)
+        print(f"🔄 {cine}: {len(datos)} películas en {time.monotonic() - inicio:.2f}s")
+        return bool(datos)
+
+    def _publicar(self, snapshot: Snapshot):
+        for funcion in self._suscriptores:
+            try:
+                funcion(snapshot)
+            except Exception as e:
+                print(f"❌ Error procesando el snapshot de {snapshot.cine}: {e}")
+
+    def exportar(self) -> Dict[str, List[Snapshot]]:
+        """Snapshots de cada cine (el actual primero y luego los anteriores) para guardarlos."""
+        return {
+            cine: [entrada.snapshot, *self._historial.get(cine, ())]
+            for cine, entrada in self._entradas.items()
+        }
+
+    def restaurar(self, snapshots: Dict[str, List[Snapshot]]) -> int:
+        """
+        Carga snapshots guardados (formato de exportar()) en los cines que aún
+        no tienen datos. Conservan su antigüedad real, así que se sirven al
+        instante y se refrescan en segundo plano en cuanto han caducado.
+        """
+        restaurados = 0
+        ultima_version = 0
+        for cine, lista in snapshots.items():
+            if cine not in self.cargadores or cine in self._entradas or not lista:
+                continue
+            actual, anteriores = lista[0], lista[1:]
+            edad = max(0.0, time.time() - actual.creado)
+            self._entradas[cine] = EntradaCache(actual, time.monotonic() - edad)
+            self._historial[cine] = deque(anteriores, maxlen=SNAPSHOTS_ANTERIORES)
+            ultima_version = max([ultima_version] + [s.version for s in lista])
+            self._publicar(actual)
+            restaurados += 1
+
+        # Las versiones nuevas siempre por encima de las restauradas
+        siguiente = next(self._versiones)
+        self._versiones = itertools.count(max(siguiente, ultima_version + 1))
+        return restaurados
+
+    def estado(self) -> List[dict]:
+        """Resumen por cine: nº de películas, antigüedad y último refresco correcto."""
+        resumen = []
+        for cine in self.cargadores:
+            entrada = self._entradas.get(cine)
+            resumen.append({
+                "cine": cine,
+                "peliculas": len(entrada.snapshot.peliculas) if entrada else 0,
+                "edad": self.edad(cine),
+                "ultimo_exito": time.time() - self.edad(cine) if entrada else None,
+                "refrescando": cine in self._refrescos,
+            })
+        return resumen
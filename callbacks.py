@@ -0,0 +1,108 @@
+"""
+callback_data compacto y autocontenido para los botones de navegación.
+Cada botón lleva la acción, el cine, la versión del snapshot y los índices de
+película/versión/día empaquetados en binario (13 bytes → 18 caracteres
+base64url, muy por debajo del límite de 64 bytes de Telegram). Así cualquier
+pulsación se resuelve directamente contra el snapshot compartido, sin guardar
+ni consultar estado por usuario.
+
+Formato v1 (big-endian):
+    formato u8 | acción u8 | cine u16 | snapshot u32 | grupo u16 | película u16 | día u8
+"""
+
+import base64
+import binascii
+import struct
+import zlib
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, Iterable, Optional
+
+FORMATO = 1   # cambiarlo si cambia el empaquetado; los botones de otro formato se tratan como caducados
+_EMPAQUETADO = struct.Struct(">BBHIHHB")
+_SIN_INDICE = 0xFFFF
+_SIN_DIA = 0xFF
+_SIN_VERSION = 0xFFFFFFFF
+LARGO = len(base64.urlsafe_b64encode(bytes(_EMPAQUETADO.size)).rstrip(b"="))
+
+
+class Accion(IntEnum):
+    INICIO = 1      # pantalla de cines
+    CINE = 2        # películas de un cine
+    GRUPO = 3       # película (título base): versiones u opciones
+    PELICULA = 4    # opciones de una versión concreta
+    DIAS = 5
+    HORARIOS = 6
+    INFO = 7
+    AVISOS_CINE = 8       # suscribirse / darse de baja de las novedades de un cine
+    AVISOS_PELICULA = 9   # ídem de una película (en cualquier cine)
+
+
+@dataclass(frozen=True, slots=True)
+class Boton:
+    accion: Accion
+    cine: Optional[str] = None
+    version: Optional[int] = None     # versión del snapshot (None: la actual)
+    grupo: Optional[int] = None       # índice en snapshot.grupos
+    pelicula: Optional[int] = None    # índice en snapshot.peliculas
+    dia: Optional[int] = None         # índice en pelicula.funciones
+
+
+def codigo_cine(cine: str) -> int:
+    """Código de 16 bits estable entre reinicios (no depende del orden de cines.json)."""
+    return zlib.crc32(cine.encode("utf-8")) & 0xFFFF
+
+
+def tabla_cines(cines: Iterable[str]) -> Dict[int, str]:
+    """Código → id de cine; falla al arrancar si dos ids comparten código."""
+    tabla: Dict[int, str] = {}
+    for cine in cines:
+        codigo = codigo_cine(cine)
+        if codigo == 0:   # reservado para los botones sin cine
+            raise ValueError(f"El id de cine {cine!r} tiene un código de callback_data reservado")
+        if codigo in tabla:
+            raise ValueError(f"Los cines {tabla[codigo]!r} y {cine!r} comparten código de callback_data")
+        tabla[codigo] = cine
+    return tabla
+
+
+def _o(valor: Optional[int], sentinela: int) -> int:
+    return sentinela if valor is None else valor
+
+
+def codificar(accion: Accion, cine: Optional[str] = None, version: Optional[int] = None,
+              grupo: Optional[int] = None, pelicula: Optional[int] = None, dia: Optional[int] = None) -> str:
+    """callback_data de un botón."""
+    datos = _EMPAQUETADO.pack(
+        FORMATO, accion, codigo_cine(cine) if cine else 0, _o(version, _SIN_VERSION),
+        _o(grupo, _SIN_INDICE), _o(pelicula, _SIN_INDICE), _o(dia, _SIN_DIA),
+    )
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def decodificar(data: Optional[str], cines: Dict[int, str]) -> Optional[Boton]:
+    """
+    Botón a partir de su callback_data. None si no es válido o es de un formato
+    anterior (p. ej. los "peli_3" de mensajes antiguos).
+    """
+    if not data or len(data) != LARGO:
+        return None
+    try:
+        datos = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        formato, accion, codigo, version, grupo, pelicula, dia = _EMPAQUETADO.unpack(datos)
+        accion = Accion(accion)
+    except (binascii.Error, struct.error, ValueError):
+        return None
+    if formato != FORMATO:
+        return None
+
+    cine = cines.get(codigo)
+    if accion is not Accion.INICIO and cine is None:
+        return None
+    return Boton(
+        accion, cine,
+        None if version == _SIN_VERSION else version,
+        None if grupo == _SIN_INDICE else grupo,
+        None if pelicula == _SIN_INDICE else pelicula,
+        None if dia == _SIN_DIA else dia,
+    )
@@ -0,0 +1,132 @@
+"""
+Caché de carteles ya subidos a Telegram.
+Guarda el file_id que devuelve Telegram para cada poster_path de TMDb, de
+modo que los envíos siguientes no obligan a Telegram a descargar la imagen
+de image.tmdb.org otra vez. Opcionalmente sube por adelantado los carteles
+de la cartelera actual a un chat de servicio (POSTERS_CHAT_ID).
+"""
+
+import os
+import sqlite3
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+from telegram.error import BadRequest
+
+from limitador import Prioridad
+from tmdb_api import obtener_url_cartel
+from tmdb_cache import TMDB_CACHE_DB
+
+POSTERS_CHAT_ID = os.getenv("POSTERS_CHAT_ID")   # chat o canal privado del bot
+CARTELES_POR_LOTE = int(os.getenv("CARTELES_POR_LOTE", "20"))
+MUESTRAS_LATENCIA = 200
+
+
+class CacheCarteles:
+    """Mapa persistente poster_path → file_id de Telegram."""
+
+    def __init__(self, ruta: str = TMDB_CACHE_DB):
+        self.ruta = ruta
+        self._db: Optional[sqlite3.Connection] = None
+        self._file_ids: Dict[str, str] = {}
+        self._latencias: Dict[str, Deque[float]] = {
+            "file_id": deque(maxlen=MUESTRAS_LATENCIA),
+            "url": deque(maxlen=MUESTRAS_LATENCIA),
+        }
+        self.stats = {"file_id": 0, "url": 0, "invalidos": 0, "subidos": 0}
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Abre la base de datos (y carga el mapa en memoria) la primera vez."""
+        if self._db is None:
+            self._db = sqlite3.connect(self.ruta)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS carteles ("
+                " poster_path TEXT PRIMARY KEY,"
+                " file_id TEXT NOT NULL,"
+                " guardado REAL NOT NULL)"
+            )
+            self._file_ids = dict(self._db.execute("SELECT poster_path, file_id FROM carteles"))
+        return self._db
+
+    def obtener(self, poster_path: str) -> Optional[str]:
+        self._conexion()
+        return self._file_ids.get(poster_path)
+
+    def guardar(self, poster_path: str, file_id: str):
+        db = self._conexion()
+        db.execute(
+            "INSERT OR REPLACE INTO carteles (poster_path, file_id, guardado) VALUES (?, ?, ?)",
+            (poster_path, file_id, time.time()),
+        )
+        db.commit()
+        self._file_ids[poster_path] = file_id
+
+    def olvidar(self, poster_path: str):
+        db = self._conexion()
+        db.execute("DELETE FROM carteles WHERE poster_path = ?", (poster_path,))
+        db.commit()
+        self._file_ids.pop(poster_path, None)
+
+    async def enviar(self, mensaje, poster_path: str, **kwargs):
+        """
+        Responde a `mensaje` con el cartel: por file_id si ya se subió,
+        si no por URL (y se guarda el file_id que devuelve Telegram).
+        """
+        file_id = self.obtener(poster_path)
+        if file_id:
+            inicio = time.perf_counter()
+            try:
+                enviado = await mensaje.reply_photo(photo=file_id, **kwargs)
+            except BadRequest as e:
+                # file_id de otro bot o caducado: volver a subir por URL
+                print(f"⚠️ file_id no válido para {poster_path}: {e}")
+                self.olvidar(poster_path)
+                self.stats["invalidos"] += 1
+            else:
+                self._latencias["file_id"].append(time.perf_counter() - inicio)
+                self.stats["file_id"] += 1
+                return enviado
+
+        inicio = time.perf_counter()
+        enviado = await mensaje.reply_photo(photo=obtener_url_cartel(poster_path), **kwargs)
+        self._latencias["url"].append(time.perf_counter() - inicio)
+        self.stats["url"] += 1
+        if enviado.photo:
+            self.guardar(poster_path, enviado.photo[-1].file_id)
+        return enviado
+
+    async def subir(self, bot, chat_id, poster_paths: Iterable[str]) -> int:
+        """
+        Sube al chat de servicio los carteles que aún no tienen file_id (como
+        envío de fondo: el limitador los espacia según el límite del chat).
+        """
+        subidos = 0
+        for poster_path in dict.fromkeys(poster_paths):
+            if subidos >= CARTELES_POR_LOTE:
+                break
+            if not poster_path or self.obtener(poster_path):
+                continue
+            try:
+                enviado = await bot.send_photo(chat_id=chat_id, photo=obtener_url_cartel(poster_path),
+                                               disable_notification=True, rate_limit_args=Prioridad.FONDO)
+            except Exception as e:
+                print(f"❌ Error subiendo el cartel {poster_path}: {e}")
+                continue
+            self.guardar(poster_path, enviado.photo[-1].file_id)
+            subidos += 1
+        self.stats["subidos"] += subidos
+        return subidos
+
+    def latencias(self) -> Dict[str, float]:
+        """Mediana (ms) de reply_photo por file_id y por URL."""
+        return {
+            modo: 1000 * sorted(muestras)[len(muestras) // 2]
+            for modo, muestras in self._latencias.items() if muestras
+        }
+
+    def cerrar(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
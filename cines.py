@@ -0,0 +1,48 @@
+"""
+Registro de cines configurable.
+Los cines se definen en un fichero JSON (cines.json por defecto) con su id,
+nombre, emoji, tipo de fuente y URL.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict
+
+CINES_CONFIG = os.getenv("CINES_CONFIG", os.path.join(os.path.dirname(__file__), "cines.json"))
+TIPOS_FUENTE = {"filmaffinity", "publicine"}
+
+# Ids cortos y estables: se guardan en el estado persistido y su código va en el callback_data
+RE_ID = re.compile(r"^[a-z0-9-]{1,32}$")
+
+
+@dataclass(frozen=True)
+class Cine:
+    id: str
+    nombre: str
+    emoji: str
+    tipo: str
+    url: str
+
+    @property
+    def etiqueta(self) -> str:
+        return f"{self.emoji} {self.nombre}"
+
+
+def cargar_cines(ruta: str = CINES_CONFIG) -> Dict[str, Cine]:
+    """Lee el registro de cines (en el orden del fichero) y lo valida."""
+    with open(ruta, encoding="utf-8") as f:
+        entradas = json.load(f)
+
+    cines: Dict[str, Cine] = {}
+    for entrada in entradas:
+        cine = Cine(**entrada)
+        if not RE_ID.match(cine.id):
+            raise ValueError(f"Id de cine no válido: {cine.id!r}")
+        if cine.tipo not in TIPOS_FUENTE:
+            raise ValueError(f"Tipo de fuente no válido para {cine.id}: {cine.tipo!r}")
+        if cine.id in cines:
+            raise ValueError(f"Id de cine duplicado: {cine.id!r}")
+        cines[cine.id] = cine
+    return cines
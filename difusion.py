@@ -0,0 +1,132 @@
+"""
+Cola de difusión de avisos (novedades de cartelera) a muchos chats.
+Los avisos se acumulan unos segundos y se juntan en un solo mensaje por
+chat, que se trocea si no cabe. El ritmo no se controla aquí: cada envío
+sale como prioridad de fondo del limitador de la Application (limitador.py),
+que aplica el presupuesto global y el de cada chat, deja sitio a las
+respuestas interactivas y, ante un RetryAfter, pausa todo lo que sale y
+repite el envío. Esta cola solo decide qué se envía y a quién, y da de baja
+a los chats que ya no admiten mensajes.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from limitador import Prioridad
+
+DIFUSION_CONCURRENCIA = int(os.getenv("DIFUSION_CONCURRENCIA", "10"))   # envíos en vuelo a la vez
+DIFUSION_VENTANA = float(os.getenv("DIFUSION_VENTANA", "5"))            # segundos que se esperan avisos para juntarlos
+
+
+def trocear(texto: str, largo: int = MessageLimit.MAX_TEXT_LENGTH) -> List[str]:
+    """Parte un texto en mensajes que caben en Telegram, por párrafos o líneas si se puede."""
+    trozos = []
+    while len(texto) > largo:
+        corte = texto.rfind("\n\n", 0, largo)
+        if corte <= 0:
+            corte = texto.rfind("\n", 0, largo)
+        if corte <= 0:
+            corte = largo
+        trozos.append(texto[:corte])
+        texto = texto[corte:].lstrip("\n")
+    return trozos + [texto] if texto else trozos
+
+
+class ColaDifusion:
+    """Avisos pendientes por chat y el worker que los reparte."""
+
+    def __init__(self, concurrencia: int = DIFUSION_CONCURRENCIA, ventana: float = DIFUSION_VENTANA):
+        self.ventana = ventana
+        self._concurrencia = concurrencia
+        self._pendientes: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._hay_avisos: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._bot = None
+        self.al_bloquear: Optional[Callable[[int], object]] = None   # chat que ha bloqueado al bot
+        self.stats = {"encolados": 0, "agrupados": 0, "enviados": 0,
+                      "bloqueados": 0, "errores": 0, "ultimo_lote": None}
+
+    def __len__(self) -> int:
+        return len(self._pendientes)
+
+    def encolar(self, chat: int, texto: str):
+        """Añade un aviso para un chat (se junta con los que ya tenga pendientes)."""
+        if chat in self._pendientes:
+            self.stats["agrupados"] += 1
+        self._pendientes.setdefault(chat, []).append(texto)
+        self.stats["encolados"] += 1
+        if self._hay_avisos is not None:
+            self._hay_avisos.set()
+
+    def iniciar(self, bot):
+        """Arranca el worker (dentro del event loop de la Application)."""
+        self._bot = bot
+        self._hay_avisos = asyncio.Event()
+        if self._pendientes:
+            self._hay_avisos.set()
+        self._tarea = asyncio.create_task(self._trabajar())
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        if self._pendientes:
+            print(f"⚠️ {len(self._pendientes)} chats con avisos sin enviar al apagar")
+
+    async def _trabajar(self):
+        while True:
+            await self._hay_avisos.wait()
+            # Los snapshots de varios cines suelen publicarse seguidos: se juntan en un mensaje por chat
+            await asyncio.sleep(self.ventana)
+            self._hay_avisos.clear()
+            lote, self._pendientes = self._pendientes, OrderedDict()
+
+            inicio = time.perf_counter()
+            semaforo = asyncio.Semaphore(self._concurrencia)
+
+            async def enviar_chat(chat: int, avisos: List[str]):
+                async with semaforo:
+                    for texto in trocear("\n\n".join(avisos)):
+                        if not await self._enviar(chat, texto):
+                            return
+
+            try:
+                await asyncio.gather(*(enviar_chat(chat, avisos) for chat, avisos in lote.items()))
+            except Exception as e:
+                print(f"❌ Error en la difusión de avisos: {e}")
+            self.stats["ultimo_lote"] = (len(lote), time.perf_counter() - inicio)
+            print(f"📣 Avisos enviados a {len(lote)} chats en {time.perf_counter() - inicio:.1f}s")
+
+    async def _enviar(self, chat: int, texto: str) -> bool:
+        """Envía un mensaje (el limitador decide cuándo sale). False si el chat ya no admite más."""
+        try:
+            await self._bot.send_message(chat_id=chat, text=texto, disable_web_page_preview=True,
+                                         rate_limit_args=Prioridad.FONDO)
+        except (Forbidden, BadRequest) as e:
+            if isinstance(e, BadRequest) and "chat not found" not in e.message.lower():
+                print(f"❌ Aviso rechazado para el chat {chat}: {e}")
+                self.stats["errores"] += 1
+                return False
+            # Ha bloqueado al bot o el chat ya no existe: no se le vuelve a avisar
+            print(f"🔕 Chat {chat} dado de baja de los avisos: {e}")
+            self.stats["bloqueados"] += 1
+            if self.al_bloquear is not None:
+                self.al_bloquear(chat)
+            return False
+        except TelegramError as e:
+            # También un RetryAfter que sigue tras los reintentos del limitador
+            print(f"❌ Error enviando un aviso al chat {chat}: {e}")
+            self.stats["errores"] += 1
+            return False
+        self.stats["enviados"] += 1
+        return True
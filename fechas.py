@@ -0,0 +1,102 @@
+"""
+Interpretación de los días y horas de la cartelera.
+Los cines dan los días como texto ("Viernes 11 de julio", "Hoy", "Sáb 12/07"...)
+y las horas como "16:00"; aquí se convierten en fechas y datetimes reales
+(hora de Madrid) para poder ordenar y filtrar sesiones.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from titulos import sin_tildes
+
+ZONA_HORARIA = ZoneInfo("Europe/Madrid")
+
+MESES = {
+    "ene": 1, "feb": 2, "mar": 3, "abr": 4, "may": 5, "jun": 6,
+    "jul": 7, "ago": 8, "sep": 9, "set": 9, "oct": 10, "nov": 11, "dic": 12,
+}
+DIAS_SEMANA = {"lun": 0, "mar": 1, "mie": 2, "jue": 3, "vie": 4, "sab": 5, "dom": 6}
+# Las sesiones de madrugada (00:30) se listan en el día anterior
+HORA_CAMBIO_DIA = 6
+
+RE_NUMERICA = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2,4}))?\b")
+RE_DIA_MES = re.compile(r"\b(\d{1,2})\s+(?:de\s+)?([a-z]{3,})\b")
+RE_HORA = re.compile(r"\b(\d{1,2})[:.h](\d{2})\b")
+
+
+def _anio_cercano(dia: int, mes: int, referencia: date) -> Optional[date]:
+    """La fecha con ese día y mes más cercana a la referencia (las carteleras cruzan el año)."""
+    candidatas = []
+    for anio in (referencia.year - 1, referencia.year, referencia.year + 1):
+        try:
+            candidatas.append(date(anio, mes, dia))
+        except ValueError:
+            pass
+    return min(candidatas, key=lambda f: abs(f - referencia), default=None)
+
+
+def parsear_dia(texto: str, referencia: date) -> Optional[date]:
+    """
+    Fecha de un día de cartelera: "Viernes 11 de julio", "11/07", "Hoy",
+    "Mañana" o solo "Viernes" (el próximo a partir de la referencia).
+    None si no se reconoce.
+    """
+    texto = sin_tildes(texto).lower()
+
+    numerica = RE_NUMERICA.search(texto)
+    if numerica:
+        dia, mes, anio = numerica.groups()
+        if anio:
+            try:
+                return date(int(anio) + (2000 if len(anio) == 2 else 0), int(mes), int(dia))
+            except ValueError:
+                return None
+        return _anio_cercano(int(dia), int(mes), referencia)
+
+    for dia, mes in RE_DIA_MES.findall(texto):
+        if mes[:3] in MESES:
+            return _anio_cercano(int(dia), MESES[mes[:3]], referencia)
+
+    if "hoy" in texto:
+        return referencia
+    if "manana" in texto:
+        return referencia + timedelta(days=1)
+    for palabra in texto.split():
+        dia_semana = DIAS_SEMANA.get(palabra[:3])
+        if dia_semana is not None:
+            return referencia + timedelta(days=(dia_semana - referencia.weekday()) % 7)
+    return None
+
+
+def parsear_iso(texto: Optional[str]) -> Optional[date]:
+    """Fecha en formato ISO ("2025-07-11"), como la da data-sess-date de FilmAffinity."""
+    try:
+        return date.fromisoformat(texto) if texto else None
+    except ValueError:
+        return None
+
+
+def parsear_hora(texto: str) -> Optional[time]:
+    """Hora de una sesión ("16:00", "22.45", "18h30")."""
+    encontrada = RE_HORA.search(texto)
+    if not encontrada:
+        return None
+    horas, minutos = int(encontrada.group(1)), int(encontrada.group(2))
+    if horas > 23 or minutos > 59:
+        return None
+    return time(horas, minutos)
+
+
+def inicio_sesion(dia: date, hora: time) -> datetime:
+    """Momento (hora de Madrid) en que empieza una sesión listada en `dia`."""
+    if hora.hour < HORA_CAMBIO_DIA:
+        dia += timedelta(days=1)
+    return datetime.combine(dia, hora, ZONA_HORARIA)
+
+
+def fecha_de(ts: float) -> date:
+    """Día (en Madrid) de un timestamp."""
+    return datetime.fromtimestamp(ts, ZONA_HORARIA).date()
@@ -0,0 +1,101 @@
+"""
+Cliente HTTP asíncrono compartido para los scrapers.
+Un único pool de conexiones keep-alive (HTTP/2 si está disponible, gzip)
+con límite de peticiones simultáneas por host.
+"""
+
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+# Configuración
+HTTP_MAX_CONEXIONES = int(os.getenv("HTTP_MAX_CONEXIONES", "20"))
+HTTP_MAX_POR_HOST = int(os.getenv("HTTP_MAX_POR_HOST", "4"))
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Accept-Encoding": "gzip, deflate",
+    "DNT": "1",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+_cliente: Optional[httpx.AsyncClient] = None
+_semaforos: Dict[str, asyncio.Semaphore] = {}
+# Último ETag / Last-Modified (y su HTML) por URL, para peticiones condicionales
+_validadores: Dict[str, dict] = {}
+
+
+def obtener_cliente() -> httpx.AsyncClient:
+    """Devuelve el cliente compartido, creándolo la primera vez."""
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONEXIONES,
+                                max_keepalive_connections=HTTP_MAX_CONEXIONES,
+                                keepalive_expiry=60),
+            http2=HTTP2_DISPONIBLE,
+            follow_redirects=True,
+        )
+    return _cliente
+
+
+def _semaforo(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in _semaforos:
+        _semaforos[host] = asyncio.Semaphore(HTTP_MAX_POR_HOST)
+    return _semaforos[host]
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """GET limitado por host sobre el pool compartido."""
+    async with _semaforo(url):
+        return await obtener_cliente().get(url, **kwargs)
+
+
+async def obtener_html_condicional(url: str) -> Tuple[str, bool]:
+    """
+    Descarga una página con If-None-Match / If-Modified-Since si ya la vimos.
+    Retorna (html, modificado); con un 304 devuelve el HTML anterior y False.
+    """
+    previo = _validadores.get(url)
+    cabeceras = {}
+    if previo:
+        if previo["etag"]:
+            cabeceras["If-None-Match"] = previo["etag"]
+        if previo["last_modified"]:
+            cabeceras["If-Modified-Since"] = previo["last_modified"]
+
+    respuesta = await get(url, headers=cabeceras)
+    if respuesta.status_code == 304 and previo:
+        return previo["html"], False
+    respuesta.raise_for_status()
+
+    etag = respuesta.headers.get("ETag")
+    last_modified = respuesta.headers.get("Last-Modified")
+    if etag or last_modified:
+        _validadores[url] = {"etag": etag, "last_modified": last_modified, "html": respuesta.text}
+    else:
+        _validadores.pop(url, None)
+    return respuesta.text, True
+
+
+async def cerrar_cliente():
+    """Cierra el pool de conexiones (al apagar el bot)."""
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
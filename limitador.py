@@ -0,0 +1,215 @@
+"""
+Capa de envío a Telegram con límites de tasa (rate limiter de la Application).
+Todas las peticiones del bot pasan por aquí: un presupuesto global (~30
+mensajes/s por bot) y otro por chat (1 mensaje/s con ráfagas cortas en
+privados, 20/min en grupos). Las respuestas interactivas van antes que los
+envíos de fondo (avisos, subida de carteles), que además dejan una reserva
+libre. Un RetryAfter pausa los envíos el tiempo que pide Telegram y la
+petición se repite sola. Las ediciones que no cambian nada (mismo texto y
+teclado que el mensaje ya tiene) no llegan a enviarse.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metricas import percentiles_ms
+
+TELEGRAM_MENSAJES_POR_SEGUNDO = float(os.getenv("TELEGRAM_MENSAJES_POR_SEGUNDO", "30"))
+TELEGRAM_RAFAGA_CHAT = float(os.getenv("TELEGRAM_RAFAGA_CHAT", "4"))   # mensajes seguidos a un chat privado
+TELEGRAM_REINTENTOS = int(os.getenv("TELEGRAM_REINTENTOS", "2"))      # reintentos tras un RetryAfter
+RESERVA_INTERACTIVA = 5        # mensajes del presupuesto global que los envíos de fondo no tocan
+MENSAJES_GRUPO_POR_MINUTO = 20
+CHATS_RECORDADOS = 10000       # presupuestos por chat y contenido de mensajes recordados (LRU)
+MUESTRAS_ESPERA = 500
+
+# Endpoints que cuentan como mensaje en el chat (sendChatAction, deleteMessage... no)
+ENVIOS = ("send", "edit", "copy", "forward")
+EDICIONES_TEXTO = "editMessageText"
+
+Resultado = Union[bool, Dict[str, Any], List[Dict[str, Any]]]
+
+
+class Prioridad(IntEnum):
+    INTERACTIVA = 0   # respuesta a un usuario (por defecto)
+    FONDO = 1         # se pasa como rate_limit_args=Prioridad.FONDO
+
+
+class _Cubo:
+    """Token bucket sin esperas propias: el limitador decide cuándo tomar."""
+
+    __slots__ = ("tasa", "capacidad", "tokens", "ultimo")
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.ultimo = time.monotonic()
+
+    def falta(self, minimo: float = 1.0) -> float:
+        """Segundos hasta que haya `minimo` tokens (0 si ya los hay)."""
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+        return max(0.0, (minimo - self.tokens) / self.tasa)
+
+    def tomar(self):
+        self.tokens -= 1
+
+
+def _segundos(retry_after) -> float:
+    # int en python-telegram-bot 20.x, timedelta en versiones posteriores
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+def _clave_mensaje(data: Dict[str, Any]) -> Optional[Tuple]:
+    if data.get("inline_message_id"):
+        return ("inline", data["inline_message_id"])
+    if data.get("message_id") is not None and data.get("chat_id") is not None:
+        return (str(data["chat_id"]), data["message_id"])
+    return None
+
+
+def _huella(data: Dict[str, Any]) -> int:
+    """Contenido visible de un mensaje de texto: texto, formato y teclado."""
+    teclado = data.get("reply_markup")
+    return hash((data.get("text"), data.get("parse_mode"),
+                 teclado.to_json() if hasattr(teclado, "to_json") else teclado))
+
+
+class LimitadorTelegram(BaseRateLimiter):
+    """BaseRateLimiter con presupuesto global y por chat, prioridades y reintento tras RetryAfter."""
+
+    def __init__(self, por_segundo: float = TELEGRAM_MENSAJES_POR_SEGUNDO,
+                 rafaga_chat: float = TELEGRAM_RAFAGA_CHAT, reintentos: int = TELEGRAM_REINTENTOS):
+        if por_segundo <= 0:
+            raise ValueError(f"TELEGRAM_MENSAJES_POR_SEGUNDO debe ser positivo (es {por_segundo})")
+        self.rafaga_chat = rafaga_chat
+        self.reintentos = reintentos
+        self._global = _Cubo(por_segundo, max(por_segundo, 1.0))
+        # La reserva tiene que caber en el cubo: si no, lo de fondo no saldría nunca
+        self.reserva = min(RESERVA_INTERACTIVA, self._global.capacidad - 1)
+        self._chats: "OrderedDict[str, _Cubo]" = OrderedDict()
+        self._contenidos: "OrderedDict[Tuple, int]" = OrderedDict()   # mensaje → huella de lo que muestra
+        self._interactivas_sin_cupo = 0   # respuestas esperando por el presupuesto global (no el de su chat)
+        self._pausa_hasta = 0.0
+        self._esperas: Dict[Prioridad, Deque[float]] = {
+            prioridad: deque(maxlen=MUESTRAS_ESPERA) for prioridad in Prioridad
+        }
+        self.stats = {"peticiones": 0, "frenadas": 0, "ediciones_omitidas": 0,
+                      "retry_after": 0, "segundos_pausa": 0.0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _cubo_chat(self, chat_id) -> _Cubo:
+        clave = str(chat_id)
+        cubo = self._chats.get(clave)
+        if cubo is None:
+            # Grupos y canales tienen id negativo (o @nombre): 20 mensajes por minuto
+            if isinstance(chat_id, int) and chat_id > 0:
+                cubo = _Cubo(1.0, self.rafaga_chat)
+            else:
+                cubo = _Cubo(MENSAJES_GRUPO_POR_MINUTO / 60, MENSAJES_GRUPO_POR_MINUTO)
+            self._chats[clave] = cubo
+            if len(self._chats) > CHATS_RECORDADOS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(clave)
+        return cubo
+
+    async def _turno(self, prioridad: Prioridad, cubo_chat: Optional[_Cubo]) -> float:
+        """Espera a que haya presupuesto (global y del chat) y lo consume. Retorna la espera en segundos."""
+        inicio = time.monotonic()
+        interactiva = prioridad is Prioridad.INTERACTIVA
+        minimo = 1.0 if interactiva else 1.0 + self.reserva
+        sin_cupo = False
+        try:
+            while True:
+                espera_global = max(self._pausa_hasta - time.monotonic(), self._global.falta(minimo))
+                espera = max(espera_global, cubo_chat.falta() if cubo_chat is not None else 0.0)
+                if interactiva and sin_cupo != (espera_global > 0):
+                    # Solo cuenta quien compite por el presupuesto global, no quien espera a su chat
+                    sin_cupo = espera_global > 0
+                    self._interactivas_sin_cupo += 1 if sin_cupo else -1
+                # Lo de fondo cede el turno mientras haya respuestas sin cupo global
+                cede = not interactiva and self._interactivas_sin_cupo > 0
+                if espera <= 0 and not cede:
+                    self._global.tomar()
+                    if cubo_chat is not None:
+                        cubo_chat.tomar()
+                    return time.monotonic() - inicio
+                await asyncio.sleep(max(espera, 0.01))
+        finally:
+            if sin_cupo:
+                self._interactivas_sin_cupo -= 1
+
+    def _recordar(self, clave: Tuple, huella: int):
+        self._contenidos[clave] = huella
+        self._contenidos.move_to_end(clave)
+        if len(self._contenidos) > CHATS_RECORDADOS:
+            self._contenidos.popitem(last=False)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Resultado]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Prioridad],
+    ) -> Resultado:
+        prioridad = rate_limit_args if rate_limit_args is not None else Prioridad.INTERACTIVA
+        self.stats["peticiones"] += 1
+
+        # Edición que dejaría el mensaje igual: Telegram respondería "message is not modified"
+        clave = _clave_mensaje(data)
+        huella = _huella(data) if endpoint in (EDICIONES_TEXTO, "sendMessage") else None
+        if clave is not None:
+            if endpoint == EDICIONES_TEXTO and self._contenidos.get(clave) == huella:
+                self.stats["ediciones_omitidas"] += 1
+                return True
+            self._contenidos.pop(clave, None)   # cualquier otro cambio: ya no se sabe qué muestra
+
+        limitado = endpoint.startswith(ENVIOS) and data.get("chat_id") is not None
+        cubo_chat = self._cubo_chat(data["chat_id"]) if limitado else None
+        espera = 0.0
+        for intento in range(self.reintentos + 1):
+            espera += await self._turno(prioridad, cubo_chat)
+            try:
+                resultado = await callback(*args, **kwargs)
+                break
+            except RetryAfter as e:
+                # El límite es del bot entero: se pausa todo lo que sale, no solo esta petición
+                segundos = _segundos(e.retry_after)
+                self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+                self.stats["retry_after"] += 1
+                self.stats["segundos_pausa"] += segundos
+                print(f"⏳ Telegram pide esperar {segundos:.0f}s ({endpoint}, intento {intento + 1})")
+                if intento == self.reintentos:
+                    raise
+
+        self._esperas[prioridad].append(espera)
+        if espera > 0.001:
+            self.stats["frenadas"] += 1
+
+        if huella is not None:
+            if clave is None and isinstance(resultado, dict) and "chat" in resultado:
+                clave = (str(resultado["chat"]["id"]), resultado["message_id"])
+            if clave is not None:
+                self._recordar(clave, huella)
+        return resultado
+
+    def esperas(self) -> Dict[str, Dict[str, float]]:
+        """p50 / p95 / máximo (ms) de lo que esperan las peticiones por los límites, por prioridad."""
+        return {prioridad.name.lower(): percentiles_ms(muestras)
+                for prioridad, muestras in self._esperas.items() if muestras}
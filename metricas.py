@@ -0,0 +1,18 @@
+"""
+Resúmenes de latencias y esperas para /estado: p50, p95 y máximo en
+milisegundos a partir de las últimas muestras (en segundos).
+"""
+
+from typing import Dict, Iterable
+
+
+def percentiles_ms(muestras: Iterable[float]) -> Dict[str, float]:
+    """p50 / p95 / máximo (ms) de unas muestras en segundos ({} si no hay ninguna)."""
+    ordenadas = sorted(muestras)
+    if not ordenadas:
+        return {}
+    return {
+        "p50": 1000 * ordenadas[len(ordenadas) // 2],
+        "p95": 1000 * ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))],
+        "max": 1000 * ordenadas[-1],
+    }
@@ -0,0 +1,154 @@
+"""
+Modelo de datos de la cartelera.
+Tipos inmutables con __slots__ para películas, funciones (días) y horarios.
+Los textos que se repiten mucho (días, horas, títulos) se internan para que
+todas las carteleras compartan la misma cadena en memoria.
+Al crear cada snapshot, días y horas se convierten una sola vez en fechas y
+datetimes con zona horaria (el texto se conserva para mostrarlo), y se
+guarda un índice ordenado de inicios para ocultar las sesiones ya pasadas.
+"""
+
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fechas import fecha_de, inicio_sesion, parsear_dia, parsear_hora, parsear_iso
+from titulos import normalizar_titulo, titulo_base
+
+
+@dataclass(frozen=True, slots=True)
+class Horario:
+    hora: str
+    url: str
+    inicio: Optional[datetime] = None   # hora de Madrid; None si no se pudo interpretar
+
+    def vigente(self, desde: Optional[datetime]) -> bool:
+        """Si la sesión no ha empezado antes de `desde` (sin hora conocida se muestra siempre)."""
+        return desde is None or self.inicio is None or self.inicio >= desde
+
+
+@dataclass(frozen=True, slots=True)
+class Funcion:
+    dia: str                        # texto para mostrar ("Viernes 11 de julio")
+    horarios: Tuple[Horario, ...]
+    fecha: Optional[date] = None
+
+
+@dataclass(frozen=True, slots=True)
+class Pelicula:
+    titulo: str
+    preventas: bool
+    funciones: Tuple[Funcion, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Grupo:
+    """Versiones de una misma película (mismo título base) dentro de un snapshot."""
+    titulo_base: str
+    peliculas: Tuple[int, ...]   # índices en Snapshot.peliculas
+    preventas: bool
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """Cartelera completa de un cine en un momento dado (compartida por todos)."""
+    cine: str
+    version: int
+    peliculas: Tuple[Pelicula, ...]
+    creado: float   # time.time()
+    grupos: Tuple[Grupo, ...] = ()
+    inicios: Tuple[datetime, ...] = ()   # inicio de todas las sesiones, ordenados
+
+    def titulo_tmdb(self, grupo: Grupo) -> str:
+        """
+        Título con el que buscar un grupo en TMDb: el de su primera versión,
+        que conserva el año entre paréntesis que titulo_base quita.
+        """
+        return self.peliculas[grupo.peliculas[0]].titulo
+
+
+def crear_horario(hora: str, url: str, inicio: Optional[datetime] = None) -> Horario:
+    return Horario(sys.intern(hora), url, inicio)
+
+
+def crear_funcion(dia: str, horarios: Iterable[Horario], fecha: Optional[date] = None) -> Funcion:
+    return Funcion(sys.intern(dia), tuple(horarios), fecha)
+
+
+def crear_pelicula(titulo: str, preventas: bool, funciones: Iterable[Funcion]) -> Pelicula:
+    return Pelicula(sys.intern(titulo), preventas, tuple(funciones))
+
+
+def _fechar(peliculas: Tuple[Pelicula, ...], referencia: date) -> Tuple[Pelicula, ...]:
+    """
+    Completa la fecha de cada día (si el scraper no la dio, se interpreta el
+    texto respecto al día del snapshot) y el inicio de cada sesión.
+    """
+    fechas: Dict[str, Optional[date]] = {}   # el mismo texto de día se repite en todas las películas
+    inicios: Dict[Tuple[date, str], Optional[datetime]] = {}
+
+    def inicio(fecha: date, hora: str) -> Optional[datetime]:
+        if (fecha, hora) not in inicios:
+            parseada = parsear_hora(hora)
+            inicios[fecha, hora] = inicio_sesion(fecha, parseada) if parseada else None
+        return inicios[fecha, hora]
+
+    resultado = []
+    for pelicula in peliculas:
+        funciones = []
+        for funcion in pelicula.funciones:
+            fecha = funcion.fecha
+            if fecha is None:
+                if funcion.dia not in fechas:
+                    fechas[funcion.dia] = parsear_dia(funcion.dia, referencia)
+                fecha = fechas[funcion.dia]
+            if fecha is None:
+                funciones.append(funcion)
+                continue
+            horarios = tuple(h if h.inicio else Horario(h.hora, h.url, inicio(fecha, h.hora))
+                             for h in funcion.horarios)
+            funciones.append(Funcion(funcion.dia, horarios, fecha))
+        resultado.append(Pelicula(pelicula.titulo, pelicula.preventas, tuple(funciones)))
+    return tuple(resultado)
+
+
+def crear_snapshot(cine: str, version: int, peliculas: Iterable[Pelicula], creado: float) -> Snapshot:
+    """Crea el snapshot con las películas ya agrupadas (versiones de la misma película) y fechadas."""
+    peliculas = _fechar(tuple(peliculas), fecha_de(creado))
+    indices: Dict[str, List[int]] = {}
+    for i, pelicula in enumerate(peliculas):
+        indices.setdefault(normalizar_titulo(pelicula.titulo), []).append(i)
+
+    # El grupo se muestra con el título base de su primera versión
+    grupos = tuple(
+        Grupo(sys.intern(titulo_base(peliculas[idx[0]].titulo)), tuple(idx),
+              any(peliculas[i].preventas for i in idx))
+        for idx in indices.values()
+    )
+    inicios = sorted(h.inicio for p in peliculas for f in p.funciones for h in f.horarios if h.inicio)
+    return Snapshot(sys.intern(cine), version, peliculas, creado, grupos, tuple(inicios))
+
+
+def pelicula_desde_dict(datos: dict) -> Pelicula:
+    """Convierte el formato dict de los scrapers ({"titulo", "preventas", "funciones"})."""
+    return crear_pelicula(
+        datos["titulo"],
+        datos["preventas"],
+        (crear_funcion(f["dia"], (crear_horario(h["hora"], h["url"]) for h in f["horarios"]),
+                       parsear_iso(f.get("fecha")))
+         for f in datos["funciones"]),
+    )
+
+
+def pelicula_a_dict(pelicula: Pelicula) -> dict:
+    """Inverso de pelicula_desde_dict (útil para serializar o depurar)."""
+    return {
+        "titulo": pelicula.titulo,
+        "preventas": pelicula.preventas,
+        "funciones": [
+            {"dia": f.dia, "fecha": f.fecha.isoformat() if f.fecha else None,
+             "horarios": [{"hora": h.hora, "url": h.url} for h in f.horarios]}
+            for f in pelicula.funciones
+        ],
+    }
@@ -0,0 +1,153 @@
+"""
+Novedades de cartelera: cada snapshot nuevo de un cine se compara con el
+anterior (películas que llegan o se van, días y sesiones nuevas, preventas
+que se abren) y los cambios se reparten como avisos a quien sigue ese cine
+o esa película, a través de la cola de difusión.
+El primer snapshot de cada cine (arranque en frío) solo sirve de referencia;
+uno restaurado de disco también, así que lo que cambió mientras el bot
+estaba parado se avisa con el primer refresco.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from difusion import ColaDifusion
+from modelos import Snapshot
+from suscripciones import CINE, PELICULA, Suscripciones
+from titulos import normalizar_titulo
+
+AVISO_MAX_ELEMENTOS = 8   # días u horas como mucho por línea de aviso
+
+Titulo = Tuple[str, str]   # (clave normalizada, título base para mostrar)
+
+
+@dataclass(frozen=True, slots=True)
+class Cambios:
+    """Diferencias entre dos snapshots de un mismo cine."""
+    cine: str
+    nuevas: Tuple[Titulo, ...] = ()                           # películas que no estaban
+    retiradas: Tuple[Titulo, ...] = ()                        # películas que ya no están
+    preventas: Tuple[Titulo, ...] = ()                        # abren preventa (o llegan ya en preventa)
+    nuevos_dias: Tuple[Tuple[Titulo, Tuple[str, ...]], ...] = ()        # días que no tenía
+    nuevas_sesiones: Tuple[Tuple[Titulo, Tuple[str, ...]], ...] = ()    # "día hora" en días que ya tenía
+
+    def __bool__(self) -> bool:
+        return bool(self.nuevas or self.retiradas or self.preventas or self.nuevos_dias or self.nuevas_sesiones)
+
+
+def _resumen(snapshot: Snapshot) -> Dict[str, Tuple[str, bool, Dict[object, Tuple[str, Set[str]]]]]:
+    """clave → (título base, preventa, {día: (texto del día, horas)}) de todas sus versiones."""
+    resumen = {}
+    for grupo in snapshot.grupos:
+        dias: Dict[object, Tuple[str, Set[str]]] = {}
+        for idx in grupo.peliculas:
+            for funcion in snapshot.peliculas[idx].funciones:
+                # La fecha si se conoce: el texto ("Hoy", "Mañana") cambia de un día a otro
+                _, horas = dias.setdefault(funcion.fecha or funcion.dia, (funcion.dia, set()))
+                horas.update(h.hora for h in funcion.horarios)
+        resumen[normalizar_titulo(grupo.titulo_base)] = (grupo.titulo_base, grupo.preventas, dias)
+    return resumen
+
+
+def comparar(anterior: Snapshot, nuevo: Snapshot) -> Cambios:
+    """Cambios de `anterior` a `nuevo`. Los días que desaparecen (ya pasados) no cuentan."""
+    antes, despues = _resumen(anterior), _resumen(nuevo)
+    nuevas, preventas, nuevos_dias, nuevas_sesiones = [], [], [], []
+    for clave, (titulo, preventa, dias) in despues.items():
+        if clave not in antes:
+            nuevas.append((clave, titulo))
+            if preventa:
+                preventas.append((clave, titulo))
+            continue
+
+        _, preventa_antes, dias_antes = antes[clave]
+        if preventa and not preventa_antes:
+            preventas.append((clave, titulo))
+        dias_nuevos, sesiones = [], []
+        for dia, (texto, horas) in dias.items():
+            if dia not in dias_antes:
+                dias_nuevos.append(texto)
+            else:
+                sesiones += [f"{texto} {hora}" for hora in sorted(horas - dias_antes[dia][1])]
+        if dias_nuevos:
+            nuevos_dias.append(((clave, titulo), tuple(dias_nuevos)))
+        if sesiones:
+            nuevas_sesiones.append(((clave, titulo), tuple(sesiones)))
+
+    retiradas = [(clave, titulo) for clave, (titulo, _, _) in antes.items() if clave not in despues]
+    return Cambios(nuevo.cine, tuple(nuevas), tuple(retiradas), tuple(preventas),
+                   tuple(nuevos_dias), tuple(nuevas_sesiones))
+
+
+def _lista(elementos) -> str:
+    elementos = list(elementos)
+    texto = ", ".join(elementos[:AVISO_MAX_ELEMENTOS])
+    if len(elementos) > AVISO_MAX_ELEMENTOS:
+        texto += f" y {len(elementos) - AVISO_MAX_ELEMENTOS} más"
+    return texto
+
+
+def avisos(cambios: Cambios, cine, suscripciones: Suscripciones) -> Dict[int, str]:
+    """
+    Texto del aviso de cada chat interesado: a quien sigue el cine, las
+    películas que llegan, se van o abren preventa; a quien sigue una
+    película, además sus días y sesiones nuevas en este cine.
+    """
+    lineas: Dict[int, List[str]] = {}
+
+    def anadir(chats, linea: str):
+        for chat in chats:
+            destino = lineas.setdefault(chat, [])
+            if linea not in destino:
+                destino.append(linea)
+
+    del_cine = suscripciones.seguidores(CINE, cambios.cine)
+    if cambios.nuevas:
+        anadir(del_cine, f"🆕 Nuevas: {_lista(t for _, t in cambios.nuevas)}")
+    if cambios.preventas:
+        anadir(del_cine, f"🎟️ Preventa abierta: {_lista(t for _, t in cambios.preventas)}")
+    if cambios.retiradas:
+        anadir(del_cine, f"👋 Ya no están: {_lista(t for _, t in cambios.retiradas)}")
+
+    for clave, titulo in cambios.nuevas:
+        anadir(suscripciones.seguidores(PELICULA, clave), f"🆕 {titulo} llega a la cartelera")
+    for clave, titulo in cambios.preventas:
+        anadir(suscripciones.seguidores(PELICULA, clave), f"🎟️ {titulo}: preventa abierta")
+    for (clave, titulo), dias in cambios.nuevos_dias:
+        anadir(suscripciones.seguidores(PELICULA, clave), f"📅 {titulo}: nuevos días {_lista(dias)}")
+    for (clave, titulo), sesiones in cambios.nuevas_sesiones:
+        anadir(suscripciones.seguidores(PELICULA, clave), f"🕐 {titulo}: nuevas sesiones {_lista(sesiones)}")
+
+    cabecera = f"🔔 Novedades en {cine.emoji} {cine.nombre}"
+    return {chat: "\n".join([cabecera, *texto]) for chat, texto in lineas.items()}
+
+
+class Novedades:
+    """Suscriptor de CacheCarteleras: compara cada snapshot con el anterior y encola los avisos."""
+
+    def __init__(self, cines: dict, suscripciones: Suscripciones, difusion: ColaDifusion):
+        self.cines = cines
+        self.suscripciones = suscripciones
+        self.difusion = difusion
+        self._ultimos: Dict[str, Snapshot] = {}
+        self.stats = {"comparaciones": 0, "con_cambios": 0, "avisos": 0}
+
+    def publicar(self, snapshot: Snapshot):
+        anterior = self._ultimos.get(snapshot.cine)
+        if anterior is not None and anterior.version >= snapshot.version:
+            return
+        self._ultimos[snapshot.cine] = snapshot
+        if anterior is None or not anterior.peliculas:
+            return
+
+        self.stats["comparaciones"] += 1
+        cambios = comparar(anterior, snapshot)
+        if not cambios:
+            return
+        self.stats["con_cambios"] += 1
+        por_chat = avisos(cambios, self.cines[snapshot.cine], self.suscripciones)
+        for chat, texto in por_chat.items():
+            self.difusion.encolar(chat, texto)
+        self.stats["avisos"] += len(por_chat)
+        print(f"🔔 {snapshot.cine}: {len(cambios.nuevas)} nuevas, {len(cambios.retiradas)} retiradas, "
+              f"{len(cambios.preventas)} preventas → {len(por_chat)} avisos")
@@ -0,0 +1,108 @@
+"""
+Persistencia del estado entre reinicios (despliegues, reinicios de Railway).
+Guarda en disco los snapshots de cartelera de cada cine y las sesiones de
+navegación en un JSON comprimido con versión de formato, y los restaura al
+arrancar para responder desde el primer momento sin esperar a los scrapers.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import Optional
+
+from cache import CacheCarteleras
+from modelos import crear_snapshot, pelicula_a_dict, pelicula_desde_dict
+from sesiones import GestorSesiones
+
+ESTADO_ARCHIVO = os.getenv("ESTADO_ARCHIVO", "estado_bot.json.gz")
+ESTADO_INTERVALO = float(os.getenv("ESTADO_INTERVALO", "300"))   # segundos entre guardados
+FORMATO = 2   # cambiarlo si cambia la estructura; los archivos de otro formato se ignoran
+
+
+def _serializar(carteleras: CacheCarteleras, sesiones: GestorSesiones) -> dict:
+    return {
+        "formato": FORMATO,
+        "guardado": time.time(),
+        "snapshots": {
+            cine: [
+                {"version": s.version, "creado": s.creado,
+                 "peliculas": [pelicula_a_dict(p) for p in s.peliculas]}
+                for s in lista
+            ]
+            for cine, lista in carteleras.exportar().items()
+        },
+        "sesiones": sesiones.exportar(),
+    }
+
+
+def _escribir(ruta: str, estado: dict):
+    # Escritura atómica: un apagado a mitad no deja un archivo corrupto
+    temporal = f"{ruta}.tmp"
+    with gzip.open(temporal, "wt", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporal, ruta)
+
+
+async def guardar_estado(carteleras: CacheCarteleras, sesiones: GestorSesiones,
+                         ruta: str = ESTADO_ARCHIVO):
+    """Guarda snapshots y sesiones (la escritura a disco va en un hilo aparte)."""
+    inicio = time.perf_counter()
+    estado = _serializar(carteleras, sesiones)
+    try:
+        await asyncio.to_thread(_escribir, ruta, estado)
+    except Exception as e:
+        print(f"❌ Error guardando el estado en {ruta}: {e}")
+        return
+    print(f"💾 Estado guardado: {len(estado['snapshots'])} carteleras, {len(estado['sesiones'])} sesiones "
+          f"en {time.perf_counter() - inicio:.2f}s")
+
+
+def _leer(ruta: str) -> Optional[dict]:
+    if not os.path.exists(ruta):
+        return None
+    with gzip.open(ruta, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def cargar_estado(carteleras: CacheCarteleras, sesiones: GestorSesiones,
+                        ruta: str = ESTADO_ARCHIVO) -> bool:
+    """Restaura el último estado guardado. Retorna True si se restauró alguna cartelera."""
+    inicio = time.perf_counter()
+    try:
+        estado = await asyncio.to_thread(_leer, ruta)
+    except Exception as e:
+        print(f"❌ Error leyendo el estado de {ruta}: {e}")
+        return False
+    if estado is None:
+        print("ℹ️ Sin estado guardado: arranque en frío")
+        return False
+    if not isinstance(estado, dict) or estado.get("formato") != FORMATO:
+        formato = estado.get("formato") if isinstance(estado, dict) else None
+        print(f"⚠️ Estado guardado con formato {formato} (se esperaba {FORMATO}): se ignora")
+        return False
+
+    # Un archivo truncado o editado a mano nunca debe impedir el arranque en frío:
+    # primero se reconstruye todo y solo si está completo se restaura
+    try:
+        snapshots = {
+            cine: [
+                crear_snapshot(cine, s["version"], (pelicula_desde_dict(p) for p in s["peliculas"]), s["creado"])
+                for s in lista
+            ]
+            for cine, lista in estado["snapshots"].items()
+        }
+        pausa = max(0.0, time.time() - estado["guardado"])
+    except Exception as e:
+        print(f"❌ Estado guardado en {ruta} no válido ({type(e).__name__}: {e}): arranque en frío")
+        return False
+    carteleras_restauradas = carteleras.restaurar(snapshots)
+    try:
+        sesiones_restauradas = sesiones.restaurar(estado.get("sesiones", []), pausa=pausa)
+    except Exception as e:
+        print(f"⚠️ Sesiones guardadas no válidas ({type(e).__name__}: {e}): se descartan")
+        sesiones_restauradas = 0
+    print(f"♻️ Estado restaurado: {carteleras_restauradas} carteleras, {sesiones_restauradas} sesiones "
+          f"(guardado hace {int(pausa)}s) en {time.perf_counter() - inicio:.2f}s")
+    return carteleras_restauradas > 0
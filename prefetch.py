@@ -0,0 +1,66 @@
+"""
+Precarga programada de carteleras con la JobQueue de python-telegram-bot.
+Refresca cada cine periódicamente para que los handlers lean siempre de la caché.
+"""
+
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from telegram.ext import Application, ContextTypes
+
+from cache import CacheCarteleras
+from fechas import ZONA_HORARIA
+
+# Configuración (segundos)
+PREFETCH_INTERVALO = float(os.getenv("PREFETCH_INTERVALO", "900"))
+PREFETCH_INTERVALO_ESTRENOS = float(os.getenv("PREFETCH_INTERVALO_ESTRENOS", "300"))
+PREFETCH_BACKOFF_MAX = float(os.getenv("PREFETCH_BACKOFF_MAX", "3600"))
+PREFETCH_JITTER = float(os.getenv("PREFETCH_JITTER", "0.1"))  # ±10 %
+# Días con cadencia más alta (0 = lunes). Los estrenos en España salen en viernes
+# y los cines publican la nueva programación el jueves.
+DIAS_ESTRENO = {int(d) for d in os.getenv("PREFETCH_DIAS_ESTRENO", "3,4").split(",") if d.strip()}
+
+
+class Prefetcher:
+    """Programa un refresco por cine y reprograma el siguiente tras cada ejecución."""
+
+    def __init__(self, cache: CacheCarteleras):
+        self.cache = cache
+        self.fallos: Dict[str, int] = {}
+        self.proximo: Dict[str, float] = {}   # time.time() del siguiente refresco
+
+    def calcular_retraso(self, cine: str, ahora: Optional[datetime] = None) -> float:
+        """Intervalo base según el día, con backoff exponencial y jitter."""
+        ahora = ahora or datetime.now(ZONA_HORARIA)
+        base = PREFETCH_INTERVALO_ESTRENOS if ahora.weekday() in DIAS_ESTRENO else PREFETCH_INTERVALO
+
+        fallos = self.fallos.get(cine, 0)
+        if fallos:
+            base = min(base * 2 ** fallos, PREFETCH_BACKOFF_MAX)
+
+        return base * random.uniform(1 - PREFETCH_JITTER, 1 + PREFETCH_JITTER)
+
+    def programar(self, app: Application, cines: Iterable[str]):
+        """Lanza la primera precarga de cada cine nada más arrancar (escalonada)."""
+        if app.job_queue is None:
+            print("⚠️ JobQueue no disponible: instala python-telegram-bot[job-queue]")
+            return
+        for cine in cines:
+            self._programar_siguiente(app, cine, random.uniform(0, 5))
+
+    def _programar_siguiente(self, app: Application, cine: str, retraso: float):
+        self.proximo[cine] = time.time() + retraso
+        app.job_queue.run_once(self._ejecutar, when=retraso, data=cine, name=f"prefetch_{cine}")
+
+    async def _ejecutar(self, context: ContextTypes.DEFAULT_TYPE):
+        cine = context.job.data
+        if await self.cache.refrescar(cine):
+            self.fallos[cine] = 0
+        else:
+            self.fallos[cine] = self.fallos.get(cine, 0) + 1
+            print(f"⚠️ Prefetch {cine}: fallo nº {self.fallos[cine]}")
+
+        self._programar_siguiente(context.application, cine, self.calcular_retraso(cine))
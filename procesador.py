@@ -0,0 +1,96 @@
+"""
+Procesado concurrente de updates con orden por chat.
+Los updates de chats distintos se atienden en paralelo (hasta
+MAX_UPDATES_CONCURRENTES a la vez), pero los de un mismo chat se procesan
+de uno en uno y en orden de llegada, para que los toques rápidos de un
+usuario no se pisen la sesión de navegación.
+"""
+
+import asyncio
+import contextlib
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metricas import percentiles_ms
+
+MAX_UPDATES_CONCURRENTES = int(os.getenv("MAX_UPDATES_CONCURRENTES", "16"))
+# Updates aceptados a la vez (en proceso + esperando su turno) antes de frenar la lectura
+MAX_UPDATES_EN_VUELO = int(os.getenv("MAX_UPDATES_EN_VUELO", "256"))
+MUESTRAS_ESPERA = 500
+_SIN_LOCK = contextlib.nullcontext()   # updates sin chat (p. ej. encuestas)
+
+
+def _clave_chat(update: object) -> Optional[int]:
+    """Chat (o usuario, p. ej. en inline queries) por el que se serializa el update."""
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+    return None
+
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """
+    BaseUpdateProcessor con un lock por chat y un límite propio de trabajadores.
+    El semáforo de la clase base solo acota los updates en vuelo; el de
+    trabajadores se toma después del lock del chat, así los updates que esperan
+    a su chat no ocupan hueco de proceso.
+    """
+
+    def __init__(self, concurrentes: int = MAX_UPDATES_CONCURRENTES,
+                 en_vuelo: int = MAX_UPDATES_EN_VUELO):
+        super().__init__(max(en_vuelo, concurrentes))
+        self.concurrentes = concurrentes
+        self._trabajadores = asyncio.Semaphore(concurrentes)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._usos: Dict[int, int] = {}
+        self._esperas: Deque[float] = deque(maxlen=MUESTRAS_ESPERA)
+        self.stats = {"procesados": 0, "esperando": 0, "activos": 0, "max_esperando": 0}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        llegada = time.perf_counter()
+        chat = _clave_chat(update)
+        lock = None
+        if chat is not None:
+            lock = self._locks.setdefault(chat, asyncio.Lock())
+            self._usos[chat] = self._usos.get(chat, 0) + 1
+
+        self.stats["esperando"] += 1
+        self.stats["max_esperando"] = max(self.stats["max_esperando"], self.stats["esperando"])
+        empezado = False
+        try:
+            async with lock or _SIN_LOCK, self._trabajadores:
+                empezado = True
+                self.stats["esperando"] -= 1
+                self.stats["activos"] += 1
+                self._esperas.append(time.perf_counter() - llegada)
+                try:
+                    await coroutine
+                finally:
+                    self.stats["activos"] -= 1
+                    self.stats["procesados"] += 1
+        finally:
+            if not empezado:
+                self.stats["esperando"] -= 1
+            if chat is not None:
+                # Sin más updates de ese chat en cola: liberar su lock
+                self._usos[chat] -= 1
+                if not self._usos[chat]:
+                    del self._usos[chat]
+                    del self._locks[chat]
+
+    def esperas(self) -> Dict[str, float]:
+        """p50 / p95 / máximo (ms) del tiempo que esperan los updates antes de procesarse."""
+        return percentiles_ms(self._esperas)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,219 @@
+"""
+Capa de presentación: textos y teclados de cada pantalla del bot.
+Todas las pantallas de un snapshot se construyen una vez al publicarse y se
+sirven desde una tabla memo indexada por (versión, pantalla, índices), así
+que navegar (y los botones "Volver") es solo una búsqueda.
+Las sesiones que ya han empezado no se muestran: el corte es la posición de
+"ahora" en los inicios ordenados del snapshot (un bisect), y la tabla memo
+solo se rehace cuando ese corte avanza.
+"""
+
+import bisect
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+
+from cache import SNAPSHOTS_ANTERIORES
+from callbacks import Accion, codificar
+from fechas import ZONA_HORARIA
+from modelos import Pelicula, Snapshot
+
+# (texto, teclado) listo para edit_message_text
+Pantalla = Tuple[str, InlineKeyboardMarkup]
+
+
+# 🧱 Constructores de pantallas (sin memo)
+# `desde`: se omiten las sesiones que empiezan antes (None: se muestran todas).
+# Los índices de los botones son siempre los del snapshot completo.
+# Los textos van en Markdown: títulos y días se escapan ("Thunderbolts*"), o
+# Telegram rechazaría la pantalla memo para todos los usuarios.
+def _pelicula_vigente(pelicula: Pelicula, desde: Optional[datetime]) -> bool:
+    if desde is None or not pelicula.funciones:
+        return True
+    return any(h.vigente(desde) for f in pelicula.funciones for h in f.horarios)
+
+
+def construir_peliculas(cine, snapshot: Snapshot, desde: Optional[datetime] = None) -> Pantalla:
+    """Lista de películas (agrupadas por título base) de un cine."""
+    # Cada botón lleva el snapshot y el índice de grupo (ver callbacks.py)
+    keyboard = []
+    for idx, grupo in enumerate(snapshot.grupos):
+        if not any(_pelicula_vigente(snapshot.peliculas[p], desde) for p in grupo.peliculas):
+            continue
+        texto_boton = f"🎬 {grupo.titulo_base}"
+        if grupo.preventas:
+            texto_boton += " (Preventa)"
+
+        datos = codificar(Accion.GRUPO, snapshot.cine, snapshot.version, grupo=idx)
+        keyboard.append([InlineKeyboardButton(texto_boton, callback_data=datos)])
+
+    texto = f"{cine.emoji} *{cine.nombre}* - Películas disponibles:"
+    if not keyboard:
+        texto += "\n\nYa no quedan sesiones por empezar en esta cartelera."
+    avisos = codificar(Accion.AVISOS_CINE, snapshot.cine, snapshot.version)
+    keyboard.append([InlineKeyboardButton("🔔 Avisos de este cine", callback_data=avisos)])
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=codificar(Accion.INICIO))])
+    return texto, InlineKeyboardMarkup(keyboard)
+
+
+def construir_versiones(snapshot: Snapshot, idx_grupo: int, desde: Optional[datetime] = None) -> Pantalla:
+    grupo = snapshot.grupos[idx_grupo]
+    keyboard = []
+    for idx_pelicula in grupo.peliculas:
+        if not _pelicula_vigente(snapshot.peliculas[idx_pelicula], desde):
+            continue
+        titulo_completo = snapshot.peliculas[idx_pelicula].titulo
+        datos = codificar(Accion.PELICULA, snapshot.cine, snapshot.version, idx_grupo, idx_pelicula)
+        keyboard.append([InlineKeyboardButton(f"🎭 {titulo_completo}", callback_data=datos)])
+
+    volver = codificar(Accion.CINE, snapshot.cine, snapshot.version)
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=volver)])
+    return f"🎬 *{escape_markdown(grupo.titulo_base)}*\n\nSelecciona la versión:", InlineKeyboardMarkup(keyboard)
+
+
+def construir_opciones(snapshot: Snapshot, idx_grupo: int, idx_pelicula: int,
+                       desde: Optional[datetime] = None) -> Pantalla:
+    cine, version = snapshot.cine, snapshot.version
+    # Volver a las versiones si el grupo tiene varias; si no, a la lista de películas
+    if len(snapshot.grupos[idx_grupo].peliculas) > 1:
+        volver = codificar(Accion.GRUPO, cine, version, idx_grupo)
+    else:
+        volver = codificar(Accion.CINE, cine, version)
+    keyboard = [
+        [InlineKeyboardButton("📅 Ver horarios",
+                              callback_data=codificar(Accion.DIAS, cine, version, idx_grupo, idx_pelicula))],
+        [InlineKeyboardButton("📖 Ver información",
+                              callback_data=codificar(Accion.INFO, cine, version, idx_grupo, idx_pelicula))],
+        [InlineKeyboardButton("🔔 Avisos de esta película",
+                              callback_data=codificar(Accion.AVISOS_PELICULA, cine, version, idx_grupo))],
+        [InlineKeyboardButton("🔙 Volver", callback_data=volver)]
+    ]
+    titulo = snapshot.peliculas[idx_pelicula].titulo
+    return f"🎬 *{escape_markdown(titulo)}*\n\n¿Qué quieres hacer?", InlineKeyboardMarkup(keyboard)
+
+
+def construir_dias(snapshot: Snapshot, idx_grupo: int, idx_pelicula: int,
+                   desde: Optional[datetime] = None) -> Pantalla:
+    pelicula = snapshot.peliculas[idx_pelicula]
+    # Crear botones con los días (que aún tengan sesiones por empezar)
+    keyboard = []
+    for i, funcion in enumerate(pelicula.funciones):
+        if not any(h.vigente(desde) for h in funcion.horarios):
+            continue
+        datos = codificar(Accion.HORARIOS, snapshot.cine, snapshot.version, idx_grupo, idx_pelicula, i)
+        keyboard.append([InlineKeyboardButton(f"📅 {funcion.dia}", callback_data=datos)])
+
+    # Añadir botón volver
+    volver = codificar(Accion.PELICULA, snapshot.cine, snapshot.version, idx_grupo, idx_pelicula)
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=volver)])
+    return f"🎬 *{escape_markdown(pelicula.titulo)}*\n\n📅 Selecciona el día:", InlineKeyboardMarkup(keyboard)
+
+
+def construir_horarios(snapshot: Snapshot, idx_grupo: int, idx_pelicula: int, idx_dia: int,
+                       desde: Optional[datetime] = None) -> Pantalla:
+    pelicula = snapshot.peliculas[idx_pelicula]
+    funcion = pelicula.funciones[idx_dia]
+    # Crear botones con los horarios (cada uno abre el link de compra)
+    keyboard = []
+    for horario in funcion.horarios:
+        if not horario.vigente(desde):
+            continue
+        keyboard.append([InlineKeyboardButton(f"🕐 {horario.hora}", url=horario.url)])
+
+    # Añadir botón volver
+    volver = codificar(Accion.DIAS, snapshot.cine, snapshot.version, idx_grupo, idx_pelicula)
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=volver)])
+    texto = f"🎬 *{escape_markdown(pelicula.titulo)}*\n📅 *{escape_markdown(funcion.dia)}*\n\n🕐 Selecciona horario:"
+    return texto, InlineKeyboardMarkup(keyboard)
+
+
+def construir_todas(cine, snapshot: Snapshot, desde: Optional[datetime] = None) -> Dict[tuple, Pantalla]:
+    """Todas las pantallas navegables de un snapshot."""
+    pantallas = {("peliculas",): construir_peliculas(cine, snapshot, desde)}
+    for idx_grupo, grupo in enumerate(snapshot.grupos):
+        if len(grupo.peliculas) > 1:
+            pantallas[("versiones", idx_grupo)] = construir_versiones(snapshot, idx_grupo, desde)
+        for idx_pelicula in grupo.peliculas:
+            pantallas[("opciones", idx_grupo, idx_pelicula)] = \
+                construir_opciones(snapshot, idx_grupo, idx_pelicula, desde)
+            pantallas[("dias", idx_grupo, idx_pelicula)] = construir_dias(snapshot, idx_grupo, idx_pelicula, desde)
+            for idx_dia in range(len(snapshot.peliculas[idx_pelicula].funciones)):
+                pantallas[("horarios", idx_grupo, idx_pelicula, idx_dia)] = \
+                    construir_horarios(snapshot, idx_grupo, idx_pelicula, idx_dia, desde)
+    return pantallas
+
+
+CONSTRUCTORES = {
+    "versiones": construir_versiones,
+    "opciones": construir_opciones,
+    "dias": construir_dias,
+    "horarios": construir_horarios,
+}
+
+
+class Renderizador:
+    """Memo de pantallas por versión de snapshot (las versiones viejas se descartan)."""
+
+    def __init__(self, cines: dict, reloj: Callable[[], datetime] = lambda: datetime.now(ZONA_HORARIA)):
+        self.cines = cines
+        self.reloj = reloj
+        self._memo: Dict[int, Dict[tuple, Pantalla]] = {}
+        self._cortes: Dict[int, int] = {}   # versión → corte con el que se construyó su memo
+        self._versiones: Dict[str, Deque[int]] = {}
+        self.stats = {"aciertos": 0, "fallos": 0, "cortes": 0}
+
+    def _corte(self, snapshot: Snapshot) -> Tuple[int, Optional[datetime]]:
+        """
+        Cuántas sesiones del snapshot han empezado ya y el `desde` equivalente
+        (el inicio de la primera que no ha empezado), para que dos momentos
+        con el mismo corte den exactamente las mismas pantallas.
+        """
+        if not snapshot.inicios:
+            return 0, None
+        corte = bisect.bisect_left(snapshot.inicios, self.reloj())
+        if corte < len(snapshot.inicios):
+            return corte, snapshot.inicios[corte]
+        return corte, snapshot.inicios[-1] + timedelta(microseconds=1)
+
+    def publicar(self, snapshot: Snapshot):
+        """Precalcula todas las pantallas de un snapshot recién publicado."""
+        corte, desde = self._corte(snapshot)
+        self._memo[snapshot.version] = construir_todas(self.cines[snapshot.cine], snapshot, desde)
+        self._cortes[snapshot.version] = corte
+
+        versiones = self._versiones.setdefault(snapshot.cine, deque())
+        if snapshot.version not in versiones:
+            versiones.append(snapshot.version)
+        while len(versiones) > SNAPSHOTS_ANTERIORES + 1:
+            version = versiones.popleft()
+            self._memo.pop(version, None)
+            self._cortes.pop(version, None)
+
+    def pantalla(self, snapshot: Snapshot, nombre: str, *indices) -> Pantalla:
+        """Pantalla memoizada; si no está (snapshot no publicado aquí), se construye y guarda."""
+        corte, desde = self._corte(snapshot)
+        memo = self._memo.get(snapshot.version)
+        if memo is not None and corte != self._cortes[snapshot.version]:
+            if corte > self._cortes[snapshot.version]:
+                # Han empezado más sesiones: las pantallas guardadas se rehacen según se pidan
+                memo.clear()
+                self._cortes[snapshot.version] = corte
+                self.stats["cortes"] += 1
+            else:
+                memo = None   # reloj hacia atrás: no mezclar cortes en la tabla
+        clave = (nombre, *indices)
+        if memo is not None and clave in memo:
+            self.stats["aciertos"] += 1
+            return memo[clave]
+
+        self.stats["fallos"] += 1
+        if nombre == "peliculas":
+            resultado = construir_peliculas(self.cines[snapshot.cine], snapshot, desde)
+        else:
+            resultado = CONSTRUCTORES[nombre](snapshot, *indices, desde=desde)
+        if memo is not None:
+            memo[clave] = resultado
+        return resultado
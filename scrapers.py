@@ -3,28 +3,20 @@ Scrapers de carteleras para los cines del sur de Madrid.
 Este archivo contiene funciones que extraen datos de sitios web públicos.
 """
 
-import requests
+import asyncio
+import hashlib
 import re
-import subprocess
-import os
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+from typing import Tuple
 from urllib.parse import urljoin
 
-# URLs de los cines
-URL_CINESA = "https://www.filmaffinity.com/es/theater-showtimes.php?id=264"
-URL_YELMO = "https://www.filmaffinity.com/es/theater-showtimes.php?id=475"
-URL_ODEON = "https://www.publicine.net/cartelera-cine/leganes/odeon-sambil"
-
-# Configuración común
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-    "Accept-Language": "es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3",
-    "Accept-Encoding": "gzip, deflate",
-    "DNT": "1",
-    "Connection": "keep-alive",
-    "Upgrade-Insecure-Requests": "1",
-}
+import http_client
+from modelos import Pelicula, pelicula_desde_dict
+from titulos import quitar_formato
+
+# URL de sesiones de FilmAffinity (los cines concretos están en cines.json)
+URL_FILMAFFINITY = "https://www.filmaffinity.com/es/theater-showtimes.php?id={}"
 
 # Regex para limpiar fechas
 RE_PREFIX = re.compile(
@@ -32,182 +24,323 @@ RE_PREFIX = re.compile(
     re.IGNORECASE
 )
 
-def dia_normalizado(fila: Tag) -> str:
+def dia_normalizado(wday_raw: str, fecha_completa: str = "") -> str:
     # ▸ día de la semana (con o sin prefijo)
-    wday_raw = fila.select_one("span.wday").get_text(" ", strip=True)
     wday_clean = RE_PREFIX.sub("", wday_raw).strip()   # quita Hoy/Mañana/...
 
-    # ▸ si hay mday cogemos el texto completo (número + mes)
-    mday = fila.select_one("span.mday")
-    if mday:
-        fecha_completa = mday.get_text(strip=True)  # "11 de julio"
+    # ▸ si hay mday añadimos el texto completo (número + mes)
+    if fecha_completa:
         return f"{wday_clean} {fecha_completa}"     # "Viernes 11 de julio"
     return wday_clean                               # "Viernes"
 
-def get_cinesa_showtimes():
-    soup = BeautifulSoup(requests.get(URL_CINESA, headers=HEADERS, timeout=10).text,
-                         "html.parser")
-    resultado = []
+# ── Evitar parseos repetidos ─────────────────────────────────────────
+# Si el servidor responde 304 o la zona de sesiones no ha cambiado,
+# se reutiliza la cartelera parseada la vez anterior.
+ESTADISTICAS_SCRAPING = {"parseos": 0, "omitidos_304": 0, "omitidos_hash": 0}
+MARCADOR_FILMAFFINITY = "fs-5"
+MARCADOR_PUBLICINE = 'class="sessions'
+RE_RUIDO = re.compile(r"<script\b.*?</script>|<!--.*?-->", re.DOTALL | re.IGNORECASE)
 
-    for titulo_tag in soup.select("span.fs-5"):
-        peli = {"titulo": titulo_tag.get_text(strip=True),
-                "preventas": False,
-                "funciones": []}
+# (url, camino) → (huella, cartelera)
+_ultimos_parseos = {}
 
-        nodo = titulo_tag.parent.find_next_sibling()
-        while nodo and not nodo.find("span", class_="fs-5"):
+def huella_html(html: str, marcador: str) -> str:
+    """Hash de la zona relevante: desde el marcador, sin scripts ni comentarios."""
+    inicio = html.find(marcador)
+    region = html[inicio:] if inicio >= 0 else html
+    return hashlib.blake2b(RE_RUIDO.sub("", region).encode(), digest_size=16).hexdigest()
 
-            if nodo.find(class_="pre-sale-alert") or "Entradas en preventa" in nodo.get_text():
-                peli["preventas"] = True
+def _sin_cambios(clave: tuple, html: str, modificado: bool, marcador: str):
+    """Retorna (cartelera anterior si no hay cambios o None, huella actual)."""
+    anterior = _ultimos_parseos.get(clave)
+    if anterior and not modificado:
+        ESTADISTICAS_SCRAPING["omitidos_304"] += 1
+        return anterior[1], anterior[0]
 
-            # ▼ cada fila con data-sess-date es un día
-            for fila in nodo.find_all(attrs={"data-sess-date": True}):
-                dia_txt = dia_normalizado(fila)
-                horarios = [
-                    {"hora": a.get_text(strip=True), "url": a["href"]}
-                    for a in fila.select("a.btn")
-                ]
-                if horarios:
-                    peli["funciones"].append({"dia": dia_txt,
-                                              "horarios": horarios})
+    huella = huella_html(html, marcador)
+    if anterior and anterior[0] == huella:
+        ESTADISTICAS_SCRAPING["omitidos_hash"] += 1
+        return anterior[1], huella
+    return None, huella
 
-            nodo = nodo.find_next_sibling()
+def _registrar_parseo(clave: tuple, huella: str, cartelera: tuple) -> tuple:
+    ESTADISTICAS_SCRAPING["parseos"] += 1
+    _ultimos_parseos[clave] = (huella, cartelera)
+    return cartelera
 
-        resultado.append(peli)
+# ── FilmAffinity (Cinesa, Yelmo y cualquier cine por id) ─────────────
+def _texto(el, separador: str = "") -> str:
+    """Equivalente a get_text(separador, strip=True) de BeautifulSoup."""
+    return separador.join(t.strip() for t in el.itertext() if t.strip())
 
-    return resultado
+def _funcion_filmaffinity(fila) -> dict:
+    """Convierte una fila con data-sess-date en {"dia", "fecha", "horarios"}."""
+    wday = mday = None
+    horarios = []
+    for el in fila.iter():
+        clases = el.get("class") if isinstance(el.tag, str) else None
+        if not clases:
+            continue
+        clases = clases.split()
+        if el.tag == "span":
+            if wday is None and "wday" in clases:
+                wday = el
+            elif mday is None and "mday" in clases:
+                mday = el
+        elif el.tag == "a" and "btn" in clases:
+            horarios.append({"hora": _texto(el), "url": el.get("href", "")})
 
-def get_yelmo_showtimes():
-    soup = BeautifulSoup(requests.get(URL_YELMO, headers=HEADERS, timeout=10).text,
-                         "html.parser")
+    dia = dia_normalizado(_texto(wday, " ") if wday is not None else "",
+                          _texto(mday) if mday is not None else "")
+    # data-sess-date ("2025-07-11") da la fecha exacta; el texto queda para mostrar
+    return {"dia": dia, "fecha": fila.get("data-sess-date"), "horarios": horarios}
+
+def parsear_filmaffinity(html: str) -> Tuple[Pelicula, ...]:
+    """
+    Extrae la cartelera (tupla de Pelicula) de una página de sesiones de
+    FilmAffinity en una sola pasada (lxml). Cada título (span.fs-5) se queda con las filas de días que
+    hay en los hermanos siguientes de su contenedor, hasta el próximo título.
+    El aviso de preventa se busca en el texto completo de cada hermano, como
+    get_text(): puede venir partido en varias etiquetas ("<b>¡Entradas</b> en preventa").
+    """
+    raiz = lxml_html.fromstring(html)
     resultado = []
+    peli = padre = contenedor = None
+    activo = False   # True mientras recorremos los hermanos del título actual
+    hermano = None   # hermano del título que se está recorriendo y su texto hasta ahora
+    textos = []
 
-    for titulo_tag in soup.select("span.fs-5"):
-        peli = {"titulo": titulo_tag.get_text(strip=True),
-                "preventas": False,
-                "funciones": []}
+    for evento, el in etree.iterwalk(raiz, events=("start", "end", "comment")):
+        if evento == "comment":
+            if hermano is not None and el.tail:
+                textos.append(el.tail)   # el comentario no cuenta, el texto que le sigue sí
+            continue
+        if not isinstance(el.tag, str):
+            continue  # instrucciones de proceso, etc.
 
-        nodo = titulo_tag.parent.find_next_sibling()
-        while nodo and not nodo.find("span", class_="fs-5"):
+        if evento == "end":
+            if el is padre:
+                activo = True
+            elif el is contenedor:
+                activo = False
+            elif el is hermano:
+                if "Entradas en preventa" in "".join(textos):
+                    peli["preventas"] = True
+                hermano = None
+            elif hermano is not None and el.tail:
+                textos.append(el.tail)
+            continue
 
-            if nodo.find(class_="pre-sale-alert") or "Entradas en preventa" in nodo.get_text():
-                peli["preventas"] = True
+        clases = el.get("class", "").split()
+        if el.tag == "span" and "fs-5" in clases:
+            peli = {"titulo": _texto(el), "preventas": False, "funciones": []}
+            resultado.append(peli)
+            padre = el.getparent()
+            contenedor = padre.getparent()
+            activo = False
+            hermano = None   # el hermano que contiene el título nuevo ya no es del anterior
+            continue
 
-            # ▼ cada fila con data-sess-date es un día
-            for fila in nodo.find_all(attrs={"data-sess-date": True}):
-                dia_txt = dia_normalizado(fila)
-                horarios = [
-                    {"hora": a.get_text(strip=True), "url": a["href"]}
-                    for a in fila.select("a.btn")
-                ]
-                if horarios:
-                    peli["funciones"].append({"dia": dia_txt,
-                                              "horarios": horarios})
+        if not activo:
+            continue
+        if el.getparent() is contenedor:
+            hermano, textos = el, []
+        if hermano is not None and el.text:
+            textos.append(el.text)
+        if "pre-sale-alert" in clases:
+            peli["preventas"] = True
 
-            nodo = nodo.find_next_sibling()
+        # ▼ cada fila con data-sess-date es un día
+        if el.get("data-sess-date") is not None:
+            funcion = _funcion_filmaffinity(el)
+            if funcion["horarios"]:
+                peli["funciones"].append(funcion)
 
-        resultado.append(peli)
+    return tuple(pelicula_desde_dict(p) for p in resultado)
 
-    return resultado
+async def get_filmaffinity_showtimes(url: str) -> Tuple[Pelicula, ...]:
+    """Cartelera de un cine de FilmAffinity (URL_FILMAFFINITY con su id)."""
+    html, modificado = await http_client.obtener_html_condicional(url)
+    clave = (url, "estatico")
+    anterior, huella = _sin_cambios(clave, html, modificado, MARCADOR_FILMAFFINITY)
+    if anterior is not None:
+        return anterior
+    return _registrar_parseo(clave, huella, parsear_filmaffinity(html))
 
+# ── Publicine (Odeón y demás cines por slug) ─────────────────────────
+# Contador de qué camino se usó para obtener el HTML de Publicine
+ESTADISTICAS_PUBLICINE = {"estatico": 0, "navegador": 0}
 
-async def get_odeon_showtimes():
-    """Scraper ASÍNCRONO para Odeón Sambil usando Playwright"""
-    try:
-        from playwright.async_api import async_playwright
-        from urllib.parse import urljoin
+def publicine_html_completo(soup: BeautifulSoup) -> bool:
+    """True si el HTML ya trae las sesiones (no hace falta renderizar JS)."""
+    return bool(soup.select_one("div.sessions div.box_dia")
+                and soup.select_one("div.sessions div.box_projeccions a[data-href]"))
+
+def parsear_publicine(soup: BeautifulSoup, url_base: str) -> Tuple[Pelicula, ...]:
+    """Extrae la cartelera del HTML de Publicine (estático o renderizado)."""
+    resultado = []
+    
+    for pelicula_session in soup.select("div.sessions"):
+        # Extraer título
+        titulo_h2 = pelicula_session.select_one("h2")
+        if not titulo_h2:
+            continue
+        titulo = titulo_h2.get_text(strip=True)
         
-        async with async_playwright() as p:
-            # Lanzar Chromium
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            
-            # Cargar la página y esperar que renderice
-            print("Cargando página de Odeón...")
-            await page.goto(URL_ODEON, timeout=30000)
-            
-            # Esperar a que aparezcan los elementos importantes
-            await page.wait_for_selector("div.sessions", timeout=10000)
-            
-            # Esperar un poco más para asegurar que JS termine
-            await page.wait_for_timeout(2000)
-            
-            # Obtener HTML ya renderizado
-            html = await page.content()
-            await browser.close()
-            print("✅ HTML renderizado obtenido")
+        peli = {
+            "titulo": titulo,
+            "preventas": False,
+            "funciones": []
+        }
         
-        # Procesar con BeautifulSoup
-        soup = BeautifulSoup(html, "html.parser")
-        resultado = []
+        # Buscar div.box
+        box = pelicula_session.select_one("div.box")
+        if not box:
+            continue
         
-        for pelicula_session in soup.select("div.sessions"):
-            # Extraer título
-            titulo_h2 = pelicula_session.select_one("h2")
-            if not titulo_h2:
+        # Procesar días y horarios
+        for dia_div in box.select("div.box_dia"):
+            span_dia = dia_div.select_one("span.dia")
+            if not span_dia:
                 continue
-            titulo = titulo_h2.get_text(strip=True)
-            
-            peli = {
-                "titulo": titulo,
-                "preventas": False,
-                "funciones": []
-            }
+                
+            dia_texto = " ".join(span_dia.get_text().split())   # "Viernes\n   11/07" → "Viernes 11/07"
             
-            # Buscar div.box
-            box = pelicula_session.select_one("div.box")
-            if not box:
+            # Buscar el siguiente box_projeccions hermano
+            projeccions = dia_div.find_next_sibling("div", class_="box_projeccions")
+            if not projeccions:
                 continue
             
-            # Procesar días y horarios
-            for dia_div in box.select("div.box_dia"):
-                span_dia = dia_div.select_one("span.dia")
-                if not span_dia:
-                    continue
-                    
-                dia_texto = span_dia.get_text().replace('\n', ' ').strip()
-                
-                # Buscar el siguiente box_projeccions hermano
-                projeccions = dia_div.find_next_sibling("div", class_="box_projeccions")
-                if not projeccions:
-                    continue
-                
-                horarios = []
-                for link in projeccions.select("a[data-href]"):
-                    hora_div = link.select_one("div.horari_pelicula")
-                    if hora_div:
-                        hora_texto = hora_div.get_text().strip().split('\n')[0]
-                        # Limpiar sufijos como ATMOS, DIGITAL, DOLBY, etc.
-                        hora_texto = re.sub(r'(ATMOS|DIGITAL|DOLBY|VIP|3D|4D)$', '', hora_texto).strip()
-                        url = urljoin(URL_ODEON, link.get("data-href", ""))
-                        horarios.append({"hora": hora_texto, "url": url})
-                
-                if horarios:
-                    peli["funciones"].append({
-                        "dia": dia_texto,
-                        "horarios": horarios
-                    })
+            horarios = []
+            for link in projeccions.select("a[data-href]"):
+                hora_div = link.select_one("div.horari_pelicula")
+                if hora_div:
+                    hora_texto = hora_div.get_text().strip().split('\n')[0]
+                    # Limpiar sufijos como ATMOS, DIGITAL, DOLBY, etc.
+                    hora_texto = quitar_formato(hora_texto)
+                    url = urljoin(url_base, link.get("data-href", ""))
+                    horarios.append({"hora": hora_texto, "url": url})
             
-            if peli["funciones"]:
-                resultado.append(peli)
-        
-        print(f"✅ {len(resultado)} películas encontradas en Odeón")
-        return resultado
+            if horarios:
+                peli["funciones"].append({
+                    "dia": dia_texto,
+                    "horarios": horarios
+                })
         
+        if peli["funciones"]:
+            resultado.append(peli)
+    
+    return tuple(pelicula_desde_dict(p) for p in resultado)
+
+# Condición de "página lista": hay sesiones y su número no cambia entre dos sondeos
+JS_PUBLICINE_LISTO = """() => {
+    const n = document.querySelectorAll('div.box_projeccions a[data-href]').length;
+    const anterior = window.__sesionesPublicine;
+    window.__sesionesPublicine = n;
+    return n > 0 && n === anterior;
+}"""
+
+async def _renderizar_publicine(url: str) -> str:
+    """Obtiene el HTML de Publicine renderizado con el pool de Playwright."""
+    from browser_pool import obtener_pool
+
+    async with obtener_pool().pagina() as page:
+        # Cargar la página sin esperar a imágenes ni recursos externos
+        print(f"Cargando {url} con Playwright...")
+        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+
+        # Esperar a que el listado de sesiones esté renderizado y estable
+        await page.wait_for_function(JS_PUBLICINE_LISTO, polling=250, timeout=10000)
+
+        # Obtener HTML ya renderizado
+        html = await page.content()
+        print("✅ HTML renderizado obtenido")
+    return html
+
+async def get_publicine_showtimes(url: str) -> Tuple[Pelicula, ...]:
+    """
+    Scraper ASÍNCRONO para cines de Publicine (p. ej. Odeón Sambil).
+    Primero intenta con el HTML estático; solo si no trae las sesiones
+    recurre a Playwright.
+    """
+    html = None
+    try:
+        html, modificado = await http_client.obtener_html_condicional(url)
+    except Exception as e:
+        print(f"⚠️ Publicine: fallo en la descarga estática ({e})")
+
+    if html is not None:
+        clave = (url, "estatico")
+        anterior, huella = _sin_cambios(clave, html, modificado, MARCADOR_PUBLICINE)
+        if anterior is not None:
+            ESTADISTICAS_PUBLICINE["estatico"] += 1
+            return anterior
+
+        soup = BeautifulSoup(html, "html.parser")
+        if publicine_html_completo(soup):
+            ESTADISTICAS_PUBLICINE["estatico"] += 1
+            resultado = _registrar_parseo(clave, huella, parsear_publicine(soup, url))
+            print(f"✅ {len(resultado)} películas encontradas en {url} (HTML estático)")
+            return resultado
+
+    try:
+        html = await _renderizar_publicine(url)
     except ImportError:
         print("❌ Playwright no está instalado")
-        return []
+        return ()
     except Exception as e:
         print(f"❌ Error con Playwright: {e}")
-        return []
-    
+        return ()
+    ESTADISTICAS_PUBLICINE["navegador"] += 1
+
+    clave = (url, "navegador")
+    anterior, huella = _sin_cambios(clave, html, True, MARCADOR_PUBLICINE)
+    if anterior is not None:
+        return anterior
+
+    resultado = _registrar_parseo(clave, huella, parsear_publicine(BeautifulSoup(html, "html.parser"), url))
+    print(f"✅ {len(resultado)} películas encontradas en {url} (HTML renderizado)")
+    return resultado
+
+# ── Scraping por cine ────────────────────────────────────────────────
+async def obtener_cartelera(cine) -> Tuple[Pelicula, ...]:
+    """Scrapea un cine del registro según su tipo de fuente."""
+    if cine.tipo == "filmaffinity":
+        return await get_filmaffinity_showtimes(cine.url)
+    if cine.tipo == "publicine":
+        return await get_publicine_showtimes(cine.url)
+    raise ValueError(f"Tipo de fuente desconocido: {cine.tipo}")
+
 # ── test rápido ──────────────────────────────────────────────────────
+# python scrapers.py                            → scrapea todos los cines
+# python scrapers.py publicine pagina.html      → parsea un HTML guardado
+# python scrapers.py filmaffinity pagina.html
 if __name__ == "__main__":
+    import sys
     from pprint import pprint
-    print("=== CINESA ===")
-    pprint(get_cinesa_showtimes()[:2], sort_dicts=False)
-    print("\n=== YELMO ===")
-    pprint(get_yelmo_showtimes()[:2], sort_dicts=False)
-    print("\n=== ODEON ===")
-    pprint(get_odeon_showtimes()[:2], sort_dicts=False)
-    
+
+    if len(sys.argv) == 3:
+        tipo, fichero = sys.argv[1], sys.argv[2]
+        with open(fichero, encoding="utf-8") as f:
+            html = f.read()
+        if tipo == "publicine":
+            soup = BeautifulSoup(html, "html.parser")
+            print(f"HTML completo (no necesita navegador): {publicine_html_completo(soup)}")
+            pprint(parsear_publicine(soup, "https://www.publicine.net/")[:2], sort_dicts=False)
+        else:
+            pprint(parsear_filmaffinity(html)[:2], sort_dicts=False)
+        sys.exit()
+
+    from cines import cargar_cines
+
+    async def scrapear_todos():
+        # Cada cine por separado, como la precarga del bot: uno que falla no para a los demás
+        for cine in cargar_cines().values():
+            print(f"\n=== {cine.id.upper()} ===")
+            try:
+                pprint((await obtener_cartelera(cine))[:2], sort_dicts=False)
+            except Exception as e:
+                print(f"❌ {cine.id}: {e}")
+
+    asyncio.run(scrapear_todos())
+    print(ESTADISTICAS_PUBLICINE)
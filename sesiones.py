@@ -0,0 +1,100 @@
+"""
+Estado por usuario que no viaja en los botones.
+La navegación va entera en el callback_data (ver callbacks.py); aquí solo
+queda el último cartel enviado a cada usuario, para borrarlo o no repetirlo.
+Las sesiones inactivas se descartan por LRU y por TTL.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+SESIONES_MAX = int(os.getenv("SESIONES_MAX", "10000"))
+SESIONES_TTL = float(os.getenv("SESIONES_TTL", str(6 * 3600)))  # segundos
+
+
+@dataclass(slots=True)
+class EstadoNavegacion:
+    imagen_info_id: Optional[int] = None
+    imagen_cartel: Optional[Tuple[str, str]] = None   # (poster_path, título) de imagen_info_id
+    ultimo_uso: float = field(default_factory=time.monotonic)
+
+
+class GestorSesiones:
+    """Sesiones por usuario con expulsión LRU (tamaño máximo) y TTL (inactividad)."""
+
+    def __init__(self, max_sesiones: int = SESIONES_MAX, ttl: float = SESIONES_TTL):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self._sesiones: "OrderedDict[int, EstadoNavegacion]" = OrderedDict()
+        self.expulsadas = 0
+
+    def __len__(self) -> int:
+        return len(self._sesiones)
+
+    def obtener(self, usuario: int) -> Optional[EstadoNavegacion]:
+        estado = self._sesiones.get(usuario)
+        if estado is None:
+            return None
+        ahora = time.monotonic()
+        if ahora - estado.ultimo_uso > self.ttl:
+            del self._sesiones[usuario]
+            self.expulsadas += 1
+            return None
+        estado.ultimo_uso = ahora
+        self._sesiones.move_to_end(usuario)
+        return estado
+
+    def iniciar(self, usuario: int) -> EstadoNavegacion:
+        """Crea (o reinicia) la sesión de un usuario."""
+        self._sesiones.pop(usuario, None)
+        estado = EstadoNavegacion()
+        self._sesiones[usuario] = estado
+        while len(self._sesiones) > self.max_sesiones:
+            self._sesiones.popitem(last=False)
+            self.expulsadas += 1
+        return estado
+
+    def exportar(self) -> List[dict]:
+        """Sesiones activas como dicts (inactividad en segundos) para guardarlas."""
+        ahora = time.monotonic()
+        return [
+            {"usuario": usuario, "imagen_info_id": e.imagen_info_id,
+             "imagen_cartel": list(e.imagen_cartel) if e.imagen_cartel else None,
+             "inactiva": ahora - e.ultimo_uso}
+            for usuario, e in self._sesiones.items()
+        ]
+
+    def restaurar(self, sesiones: List[dict], pausa: float = 0.0) -> int:
+        """Carga sesiones de exportar(); `pausa` (segundos sin servicio) cuenta como inactividad."""
+        ahora = time.monotonic()
+        restauradas = 0
+        # exportar() las da de la más antigua a la más reciente: se conserva el orden LRU
+        for datos in sesiones:
+            inactiva = datos["inactiva"] + pausa
+            if inactiva > self.ttl or datos["usuario"] in self._sesiones:
+                continue
+            self._sesiones[datos["usuario"]] = EstadoNavegacion(
+                datos["imagen_info_id"],
+                tuple(datos["imagen_cartel"]) if datos["imagen_cartel"] else None,
+                ahora - inactiva,
+            )
+            restauradas += 1
+        while len(self._sesiones) > self.max_sesiones:
+            self._sesiones.popitem(last=False)
+        return restauradas
+
+    def purgar(self) -> int:
+        """Elimina las sesiones caducadas (las más antiguas están al principio)."""
+        limite = time.monotonic() - self.ttl
+        eliminadas = 0
+        while self._sesiones:
+            usuario, estado = next(iter(self._sesiones.items()))
+            if estado.ultimo_uso >= limite:
+                break
+            del self._sesiones[usuario]
+            eliminadas += 1
+        self.expulsadas += eliminadas
+        return eliminadas
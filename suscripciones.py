@@ -0,0 +1,117 @@
+"""
+Suscripciones a avisos de novedades, por cine o por película.
+Se guardan en SQLite (sobreviven a reinicios y despliegues) y se mantienen en
+memoria indexadas en los dos sentidos: qué chats siguen un cine o una
+película (para repartir cada cambio) y qué sigue cada chat (para /avisos).
+"""
+
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+SUSCRIPCIONES_DB = os.getenv("SUSCRIPCIONES_DB", "suscripciones.db")
+SUSCRIPCIONES_MAX = int(os.getenv("SUSCRIPCIONES_MAX", "50"))   # por chat
+
+CINE = "cine"
+PELICULA = "pelicula"   # clave: título normalizado (titulos.normalizar_titulo), en cualquier cine
+
+
+class Suscripciones:
+    """Mapa persistente chat ↔ (tipo, clave) de los avisos de novedades."""
+
+    def __init__(self, ruta: str = SUSCRIPCIONES_DB, maximo: int = SUSCRIPCIONES_MAX):
+        self.ruta = ruta
+        self.maximo = maximo
+        self._db: Optional[sqlite3.Connection] = None
+        self._seguidores: Dict[Tuple[str, str], Set[int]] = {}     # (tipo, clave) → chats
+        self._por_chat: Dict[int, Dict[Tuple[str, str], str]] = {}  # chat → {(tipo, clave): nombre}
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Abre la base de datos (y carga los mapas en memoria) la primera vez."""
+        if self._db is None:
+            self._db = sqlite3.connect(self.ruta)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS suscripciones ("
+                " chat_id INTEGER NOT NULL,"
+                " tipo TEXT NOT NULL,"
+                " clave TEXT NOT NULL,"
+                " nombre TEXT NOT NULL,"
+                " creada REAL NOT NULL,"
+                " PRIMARY KEY (chat_id, tipo, clave))"
+            )
+            for chat, tipo, clave, nombre in self._db.execute(
+                    "SELECT chat_id, tipo, clave, nombre FROM suscripciones ORDER BY creada"):
+                self._anadir(chat, tipo, clave, nombre)
+        return self._db
+
+    def _anadir(self, chat: int, tipo: str, clave: str, nombre: str):
+        self._seguidores.setdefault((tipo, clave), set()).add(chat)
+        self._por_chat.setdefault(chat, {})[tipo, clave] = nombre
+
+    def _quitar(self, chat: int, tipo: str, clave: str):
+        chats = self._seguidores.get((tipo, clave))
+        if chats is not None:
+            chats.discard(chat)
+            if not chats:
+                del self._seguidores[tipo, clave]
+        del self._por_chat[chat][tipo, clave]
+        if not self._por_chat[chat]:
+            del self._por_chat[chat]
+
+    def __len__(self) -> int:
+        self._conexion()
+        return sum(len(chats) for chats in self._seguidores.values())
+
+    def chats(self) -> int:
+        self._conexion()
+        return len(self._por_chat)
+
+    def seguidores(self, tipo: str, clave: str) -> Set[int]:
+        self._conexion()
+        return self._seguidores.get((tipo, clave), set())
+
+    def de_chat(self, chat: int) -> List[Tuple[str, str, str]]:
+        """(tipo, clave, nombre) de lo que sigue un chat, en el orden en que se suscribió."""
+        self._conexion()
+        return [(tipo, clave, nombre) for (tipo, clave), nombre in self._por_chat.get(chat, {}).items()]
+
+    def alternar(self, chat: int, tipo: str, clave: str, nombre: str) -> Optional[bool]:
+        """
+        Suscribe o da de baja. Retorna True si queda suscrito, False si se dio
+        de baja y None si ya tenía el máximo de suscripciones.
+        """
+        db = self._conexion()
+        if (tipo, clave) in self._por_chat.get(chat, {}):
+            db.execute("DELETE FROM suscripciones WHERE chat_id = ? AND tipo = ? AND clave = ?",
+                       (chat, tipo, clave))
+            db.commit()
+            self._quitar(chat, tipo, clave)
+            return False
+
+        if len(self._por_chat.get(chat, {})) >= self.maximo:
+            return None
+        db.execute(
+            "INSERT OR REPLACE INTO suscripciones (chat_id, tipo, clave, nombre, creada) VALUES (?, ?, ?, ?, ?)",
+            (chat, tipo, clave, nombre, time.time()),
+        )
+        db.commit()
+        self._anadir(chat, tipo, clave, nombre)
+        return True
+
+    def borrar_chat(self, chat: int) -> int:
+        """Da de baja todo lo de un chat (lo pide él, o ha bloqueado al bot). Retorna cuántas había."""
+        db = self._conexion()
+        suscritas = list(self._por_chat.get(chat, {}))
+        if suscritas:
+            db.execute("DELETE FROM suscripciones WHERE chat_id = ?", (chat,))
+            db.commit()
+            for tipo, clave in suscritas:
+                self._quitar(chat, tipo, clave)
+        return len(suscritas)
+
+    def cerrar(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
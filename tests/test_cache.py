@@ -0,0 +1,44 @@
+"""
+CacheCarteleras: un refresco que devuelve la misma cartelera (304 o zona de
+sesiones sin cambios) no publica una versión nueva, así que los botones que
+llevan la versión en su callback_data siguen funcionando.
+"""
+
+import asyncio
+
+from cache import CacheCarteleras
+from modelos import crear_funcion, crear_horario, crear_pelicula
+
+CARTELERA = (
+    crear_pelicula("Dune", False, (crear_funcion("Viernes", (crear_horario("18:30", "https://x/1"),)),)),
+)
+
+
+def test_refrescos_sin_cambios_conservan_la_version():
+    cartelera = {"datos": CARTELERA}
+    publicados = []
+
+    async def cargar():
+        return cartelera["datos"]
+
+    async def refrescar_varias_veces():
+        cache = CacheCarteleras({"x": cargar})
+        cache.al_publicar(publicados.append)
+        for _ in range(4):
+            assert await cache.refrescar("x")
+        version = cache.actual("x").version
+
+        # Igual pero sin ser el mismo objeto (parseo repetido): tampoco cambia
+        cartelera["datos"] = (crear_pelicula("Dune", False, CARTELERA[0].funciones),)
+        assert await cache.refrescar("x")
+        assert cache.actual("x").version == version
+
+        cartelera["datos"] = CARTELERA + (crear_pelicula("Sonic 3", True, ()),)
+        assert await cache.refrescar("x")
+        return cache, version
+
+    cache, version = asyncio.run(refrescar_varias_veces())
+    assert cache.snapshot("x", version) is not None
+    assert cache.actual("x").version > version
+    assert len(publicados) == 2
+    assert cache.stats["sin_cambios"] == 4
@@ -0,0 +1,78 @@
+"""
+Publicine: HTML estático primero y Playwright solo como último recurso.
+Sin red: las páginas son fixtures guardadas (tests/fixtures) y la descarga y
+el navegador se sustituyen por funciones que las devuelven.
+"""
+
+import asyncio
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+import http_client
+import scrapers
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+URL = "https://www.publicine.net/odeon-sambil/"
+
+
+def leer(nombre: str) -> str:
+    with open(os.path.join(FIXTURES, nombre), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(autouse=True)
+def estado_limpio(monkeypatch):
+    monkeypatch.setattr(scrapers, "ESTADISTICAS_PUBLICINE", {"estatico": 0, "navegador": 0})
+    monkeypatch.setattr(scrapers, "_ultimos_parseos", {})
+
+
+def preparar(monkeypatch, estatico: str):
+    """La descarga devuelve `estatico`; el navegador devuelve la página renderizada y cuenta las llamadas."""
+    renderizados = []
+
+    async def descargar(url):
+        return leer(estatico), True
+
+    async def renderizar(url):
+        renderizados.append(url)
+        return leer("publicine_renderizado.html")
+
+    monkeypatch.setattr(http_client, "obtener_html_condicional", descargar)
+    monkeypatch.setattr(scrapers, "_renderizar_publicine", renderizar)
+    return renderizados
+
+
+def test_estatico_completo_no_renderiza(monkeypatch):
+    renderizados = preparar(monkeypatch, "publicine_estatico.html")
+
+    cartelera = asyncio.run(scrapers.get_publicine_showtimes(URL))
+
+    assert renderizados == []
+    assert scrapers.ESTADISTICAS_PUBLICINE == {"estatico": 1, "navegador": 0}
+    assert [p.titulo for p in cartelera] == ["Misión: Imposible - Sentencia final", "Elio (VOSE)"]
+    mision = cartelera[0]
+    assert [f.dia for f in mision.funciones] == ["Viernes 11/07", "Sábado 12/07"]
+    assert [h.hora for h in mision.funciones[0].horarios] == ["16:00", "19:15"]
+    assert mision.funciones[0].horarios[0].url == "https://www.publicine.net/compra/sesion/1001"
+
+
+def test_renderizado_da_la_misma_cartelera():
+    estatico = BeautifulSoup(leer("publicine_estatico.html"), "html.parser")
+    renderizado = BeautifulSoup(leer("publicine_renderizado.html"), "html.parser")
+
+    assert scrapers.publicine_html_completo(estatico)
+    assert scrapers.publicine_html_completo(renderizado)
+    assert scrapers.parsear_publicine(estatico, URL) == scrapers.parsear_publicine(renderizado, URL)
+
+
+def test_sin_sesiones_recurre_al_navegador(monkeypatch):
+    renderizados = preparar(monkeypatch, "publicine_sin_sesiones.html")
+
+    cartelera = asyncio.run(scrapers.get_publicine_showtimes(URL))
+
+    assert renderizados == [URL]
+    assert scrapers.ESTADISTICAS_PUBLICINE == {"estatico": 0, "navegador": 1}
+    estatico = scrapers.parsear_publicine(BeautifulSoup(leer("publicine_estatico.html"), "html.parser"), URL)
+    assert cartelera == estatico
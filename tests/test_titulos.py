@@ -0,0 +1,54 @@
+"""
+Índice título → id de TMDb y caché de TMDb: las variantes de versión y
+formato comparten id, pero el año entre paréntesis distingue películas con
+el mismo título.
+"""
+
+import pytest
+
+from modelos import crear_pelicula, crear_snapshot
+from titulos import IndiceTitulos, clave_tmdb, normalizar_titulo
+from tmdb_cache import NO_CACHEADO, CacheTMDb
+
+
+@pytest.fixture
+def indice(tmp_path):
+    indice = IndiceTitulos(str(tmp_path / "titulos.db"))
+    yield indice
+    indice.cerrar()
+
+
+def test_clave_tmdb_conserva_el_anio():
+    assert normalizar_titulo("Nosferatu (2024)") == normalizar_titulo("Nosferatu") == "nosferatu"
+    assert clave_tmdb("Nosferatu (2024)") == "nosferatu 2024"
+    assert clave_tmdb("Nosferatu (VOSE) ATMOS") == "nosferatu"
+
+
+def test_el_anio_separa_ids(indice):
+    indice.guardar("Nosferatu (2024)", 426063)
+    indice.guardar("Nosferatu", 653)
+
+    assert indice.resolver("Nosferatu (2024) VOSE") == 426063
+    assert indice.resolver("Nosferatu (VOSE)") == 653
+    # Un año distinto no se resuelve por parecido con otro
+    assert indice.resolver("Nosferatu (1979)") is None
+
+
+def test_variantes_sin_anio_comparten_id(indice):
+    indice.guardar("Sonic 3: La película", 939243)
+    assert indice.resolver("Sonic 3: La pelicula (VOSE)") == 939243
+
+
+def test_grupo_encuentra_lo_precargado(tmp_path):
+    # La precarga guarda cada versión por su título completo; el grupo se muestra sin año
+    snapshot = crear_snapshot("cine", 1, [crear_pelicula("Nosferatu (2024) VOSE", False, ())], 0.0)
+    grupo = snapshot.grupos[0]
+    assert grupo.titulo_base == "Nosferatu"
+
+    cache = CacheTMDb(str(tmp_path / "tmdb.db"))
+    cache.guardar("Nosferatu (2024) VOSE", "es-ES", {"id": 426063, "poster_path": "/n.jpg"})
+    try:
+        assert cache.obtener(snapshot.titulo_tmdb(grupo), "es-ES")["id"] == 426063
+        assert cache.obtener(grupo.titulo_base, "es-ES") is NO_CACHEADO
+    finally:
+        cache.cerrar()
@@ -0,0 +1,182 @@
+"""
+Normalización de títulos de películas.
+Un único sitio que decide qué es "la misma película": quita marcas de
+versión (VOSE, doblada...), formatos de sala (ATMOS, 3D, VIP...) y años
+entre paréntesis, y genera la clave sin tildes ni mayúsculas que usa la
+agrupación de versiones. La caché de TMDb y el índice título → id de TMDb
+usan esa misma clave con el año, si lo hay: "Nosferatu (2024)" y "Nosferatu"
+no tienen por qué ser la misma película.
+"""
+
+import difflib
+import re
+import sqlite3
+import unicodedata
+from typing import Dict, List, Optional
+
+# Formatos de sala que algunos cines pegan al título o a la hora
+FORMATOS = {"ATMOS", "DOLBY", "DIGITAL", "VIP", "2D", "3D", "4D", "4DX", "IMAX", "SCREENX", "ISENSE"}
+# Marcas de idioma / versión
+VERSIONES = {"VOSE", "VOS", "VO", "VOSC", "SUBTITULADA", "SUBTITULADO", "DOBLADA", "DOBLADO",
+             "CASTELLANO", "ESPANOL", "VERSION", "ORIGINAL", "PREESTRENO", "ESTRENO"}
+MARCAS = FORMATOS | VERSIONES
+# Las que también se quitan sueltas al final del título (sin paréntesis)
+MARCAS_FINALES = FORMATOS | {"VOSE", "VOS", "VO", "VOSC"}
+
+RE_PARENTESIS = re.compile(r"\s*[\(\[]([^\)\]]*)[\)\]]")
+RE_ANIO = re.compile(r"^(19|20)\d\d$")
+RE_SEPARADOR = re.compile(r"[\s,/+-]+")
+RE_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+RE_NUMERO = re.compile(r"^(\d+|[ivx]+)$")   # 2, 2049, ii, iv... (distinguen secuelas)
+RE_FORMATO_FINAL = re.compile(r"\s*(" + "|".join(sorted(FORMATOS, key=len, reverse=True)) + r")$")
+
+SIMILITUD_MINIMA = 0.9    # para reutilizar el id de TMDb de un título parecido
+COINCIDENCIA_MINIMA = 0.5  # para aceptar un resultado de búsqueda de TMDb
+
+
+def sin_tildes(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _marca(token: str) -> str:
+    return sin_tildes(token).upper().replace(".", "")
+
+
+def _solo_marcas(texto: str) -> bool:
+    tokens = [_marca(t) for t in RE_SEPARADOR.split(texto) if t]
+    return bool(tokens) and all(t in MARCAS or RE_ANIO.match(t) for t in tokens)
+
+
+def titulo_base(titulo: str) -> str:
+    """Título para mostrar sin versión ni formato: "Dune (VOSE) ATMOS" → "Dune"."""
+    # Paréntesis solo con marcas o año; "(500) días juntos" se conserva
+    titulo = RE_PARENTESIS.sub(lambda m: "" if _solo_marcas(m.group(1)) else m.group(0), titulo)
+    palabras = titulo.split()
+    while len(palabras) > 1 and (_marca(palabras[-1]) in MARCAS_FINALES or palabras[-1] in "-|·"):
+        palabras.pop()
+    return " ".join(palabras)
+
+
+def normalizar_titulo(titulo: str) -> str:
+    """Clave de comparación: título base sin tildes, en minúsculas y sin puntuación."""
+    texto = sin_tildes(titulo_base(titulo)).lower()
+    return " ".join(RE_NO_ALFANUMERICO.sub(" ", texto).split())
+
+
+def anio_titulo(titulo: str) -> Optional[int]:
+    """Año entre paréntesis si el cine lo indica: "Nosferatu (2024)" → 2024."""
+    for contenido in RE_PARENTESIS.findall(titulo):
+        for token in RE_SEPARADOR.split(contenido):
+            if RE_ANIO.match(token):
+                return int(token)
+    return None
+
+
+def clave_tmdb(titulo: str) -> str:
+    """Clave de búsqueda en TMDb: la normalizada más el año si se conoce ("nosferatu 2024")."""
+    clave = normalizar_titulo(titulo)
+    anio = anio_titulo(titulo)
+    return f"{clave} {anio}" if anio else clave
+
+
+def quitar_formato(texto: str) -> str:
+    """Quita un formato de sala pegado al final: "18:30ATMOS" → "18:30"."""
+    return RE_FORMATO_FINAL.sub("", texto).strip()
+
+
+def _numeros(clave: str) -> List[str]:
+    return [t for t in clave.split() if RE_NUMERO.match(t)]
+
+
+def similitud(a: str, b: str) -> float:
+    """Parecido entre dos claves normalizadas (0..1)."""
+    if a == b:
+        return 1.0
+    # "sonic 3" frente a "sonic 3 la pelicula"
+    if a.startswith(b + " ") or b.startswith(a + " "):
+        return 0.9
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def elegir_resultado(titulo: str, resultados: List[dict]) -> Optional[dict]:
+    """
+    El resultado de búsqueda de TMDb que mejor encaja con el título (no
+    simplemente el primero): parecido del título o del título original,
+    año si se conoce y, a igualdad, el orden de TMDb.
+    """
+    clave = normalizar_titulo(titulo)
+    anio = anio_titulo(titulo)
+    mejor, mejor_puntuacion = None, COINCIDENCIA_MINIMA
+    for posicion, resultado in enumerate(resultados[:10]):
+        puntuacion = max(similitud(clave, normalizar_titulo(resultado.get(campo) or ""))
+                         for campo in ("title", "original_title"))
+        if anio and (resultado.get("release_date") or "").startswith(str(anio)):
+            puntuacion += 0.2
+        puntuacion -= 0.01 * posicion
+        if puntuacion > mejor_puntuacion:
+            mejor, mejor_puntuacion = resultado, puntuacion
+    return mejor
+
+
+class IndiceTitulos:
+    """Índice persistente clave_tmdb → id de TMDb, con búsqueda aproximada."""
+
+    def __init__(self, ruta: str, similitud_minima: float = SIMILITUD_MINIMA):
+        self.ruta = ruta
+        self.similitud_minima = similitud_minima
+        self._db: Optional[sqlite3.Connection] = None
+        self._ids: Dict[str, int] = {}
+        self.stats = {"exactos": 0, "aproximados": 0, "desconocidos": 0}
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Abre la base de datos (y carga el índice en memoria) la primera vez."""
+        if self._db is None:
+            self._db = sqlite3.connect(self.ruta)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS titulos ("
+                " clave TEXT PRIMARY KEY,"
+                " tmdb_id INTEGER NOT NULL)"
+            )
+            self._ids = dict(self._db.execute("SELECT clave, tmdb_id FROM titulos"))
+        return self._db
+
+    def resolver(self, titulo: str) -> Optional[int]:
+        """Id de TMDb de un título (o de una variante casi idéntica ya resuelta)."""
+        self._conexion()
+        clave = clave_tmdb(titulo)
+        if clave in self._ids:
+            self.stats["exactos"] += 1
+            return self._ids[clave]
+
+        # "toy story 3" y "toy story 4" se parecen mucho pero no son la misma película
+        # (ni "nosferatu 2024" y "nosferatu": el año cuenta como número)
+        parecidos = [p for p in difflib.get_close_matches(clave, self._ids, n=3, cutoff=self.similitud_minima)
+                     if _numeros(p) == _numeros(clave)]
+        if parecidos:
+            # La variante queda registrada con su propia clave para la próxima vez
+            self.stats["aproximados"] += 1
+            self._guardar_clave(clave, self._ids[parecidos[0]])
+            return self._ids[clave]
+
+        self.stats["desconocidos"] += 1
+        return None
+
+    def guardar(self, titulo: str, tmdb_id: int):
+        self._guardar_clave(clave_tmdb(titulo), tmdb_id)
+
+    def _guardar_clave(self, clave: str, tmdb_id: int):
+        db = self._conexion()
+        db.execute("INSERT OR REPLACE INTO titulos (clave, tmdb_id) VALUES (?, ?)", (clave, tmdb_id))
+        db.commit()
+        self._ids[clave] = tmdb_id
+
+    def __len__(self) -> int:
+        self._conexion()
+        return len(self._ids)
+
+    def cerrar(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
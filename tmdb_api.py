@@ -1,12 +1,22 @@
 """
 Cliente para The Movie Database (TMDb) API.
 Obtiene información de películas: cartel, sinopsis, puntuación, etc.
+Asíncrono, sobre el pool HTTP compartido; las peticiones idénticas en curso
+se agrupan en una sola (single-flight).
 """
 
-import requests
+import asyncio
 import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+
+from http_client import obtener_cliente
+from metricas import percentiles_ms
+from tmdb_cache import NO_CACHEADO, TMDB_CACHE_DB, CacheTMDb
+from titulos import IndiceTitulos, anio_titulo, elegir_resultado, titulo_base
 
 # Cargar variables de entorno
 load_dotenv()
@@ -15,37 +25,128 @@ load_dotenv()
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
 TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+TMDB_MINIATURA_BASE_URL = "https://image.tmdb.org/t/p/w92"   # miniaturas de los resultados inline
+TMDB_IDIOMA = "es-ES"
+MUESTRAS_LATENCIA = 200   # últimas peticiones por endpoint para los percentiles
+
+# 🗃️ Caché persistente de búsquedas (aciertos y títulos no encontrados)
+cache_tmdb = CacheTMDb()
+# 🔑 Índice título normalizado → id de TMDb (cada película se busca una sola vez)
+indice_titulos = IndiceTitulos(TMDB_CACHE_DB)
+
+
+class ClienteTMDb:
+    """Peticiones a TMDb con agrupación de peticiones idénticas y latencias por endpoint."""
+
+    def __init__(self):
+        self._en_curso: Dict[Tuple, asyncio.Task] = {}
+        self._latencias: Dict[str, Deque[float]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _stats(self, endpoint: str) -> Dict[str, int]:
+        if endpoint not in self.stats:
+            self.stats[endpoint] = {"peticiones": 0, "agrupadas": 0, "errores": 0}
+            self._latencias[endpoint] = deque(maxlen=MUESTRAS_LATENCIA)
+        return self.stats[endpoint]
+
+    async def _get(self, endpoint: str, ruta: str, params: Dict[str, str]) -> dict:
+        """GET a la API; si ya hay una petición igual en curso, espera a esa."""
+        clave = (ruta, tuple(sorted(params.items())))
+        stats = self._stats(endpoint)
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.create_task(self._peticion(endpoint, ruta, params))
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+        else:
+            stats["agrupadas"] += 1
+        # shield: si un handler que espera se cancela, la petición compartida sigue
+        return await asyncio.shield(tarea)
+
+    async def _peticion(self, endpoint: str, ruta: str, params: Dict[str, str]) -> dict:
+        stats = self._stats(endpoint)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await obtener_cliente().get(
+                f"{TMDB_BASE_URL}{ruta}", params={"api_key": TMDB_API_KEY, **params}
+            )
+            respuesta.raise_for_status()
+            return respuesta.json()
+        except Exception:
+            stats["errores"] += 1
+            raise
+        finally:
+            stats["peticiones"] += 1
+            self._latencias[endpoint].append(time.perf_counter() - inicio)
+
+    async def buscar_remoto(self, titulo: str, idioma: str = TMDB_IDIOMA) -> Optional[Dict[Any, Any]]:
+        """
+        Resuelve un título sin pasar por la caché de metadatos (lanza excepción
+        si falla la red o la API). Si el índice ya conoce la película (o una
+        variante del título) se pide su ficha por id; si no, se busca y se
+        elige el resultado que mejor encaja.
+        """
+        tmdb_id = indice_titulos.resolver(titulo)
+        if tmdb_id is not None:
+            return await self._get("movie/{id}", f"/movie/{tmdb_id}", {"language": idioma})
+
+        params = {"query": titulo_base(titulo), "language": idioma}
+        anio = anio_titulo(titulo)
+        if anio:
+            params["year"] = str(anio)
+        data = await self._get("search/movie", "/search/movie", params)
+        resultado = elegir_resultado(titulo, data["results"])
+        if resultado is not None:
+            tmdb_id = resultado.get("id")
+            if tmdb_id is not None:
+                indice_titulos.guardar(titulo, tmdb_id)
+            else:
+                # Resultado sin id: se usa tal cual, pero no entra en el índice
+                print(f"⚠️ TMDb devolvió un resultado sin id para '{titulo}'")
+        return resultado
+
+    async def buscar(self, titulo: str, idioma: str = TMDB_IDIOMA) -> Optional[Dict[Any, Any]]:
+        """
+        Busca una película por título en TMDb (pasando antes por la caché).
+        Retorna la película que mejor encaja o None si no encuentra nada.
+        """
+        cacheado = cache_tmdb.obtener(titulo, idioma)
+        if cacheado is not NO_CACHEADO:
+            return cacheado
+
+        try:
+            resultado = await self.buscar_remoto(titulo, idioma)
+        except Exception as e:
+            # Los errores no se cachean: se reintentará en la próxima consulta
+            print(f"Error buscando película '{titulo}': {e}")
+            return None
+
+        cache_tmdb.guardar(titulo, idioma, resultado)
+        return resultado
+
+    def latencias(self) -> Dict[str, Dict[str, float]]:
+        """p50 / p95 / máximo (ms) de las últimas peticiones de cada endpoint."""
+        return {endpoint: percentiles_ms(muestras) for endpoint, muestras in self._latencias.items() if muestras}
+
+
+# 🌐 Cliente compartido por el bot y la precarga
+cliente_tmdb = ClienteTMDb()
+
+
+async def buscar_pelicula(titulo: str, idioma: str = TMDB_IDIOMA) -> Optional[Dict[Any, Any]]:
+    """Atajo a cliente_tmdb.buscar()."""
+    return await cliente_tmdb.buscar(titulo, idioma)
 
-def buscar_pelicula(titulo: str) -> Optional[Dict[Any, Any]]:
-    """
-    Busca una película por título en TMDb.
-    Retorna la primera coincidencia o None si no encuentra nada.
-    """
-    try:
-        # Limpiar título para búsqueda (quitar versiones)
-        titulo_limpio = titulo.split('(')[0].strip()
-        
-        url = f"{TMDB_BASE_URL}/search/movie"
-        params = {
-            "api_key": TMDB_API_KEY,
-            "query": titulo_limpio,
-            "language": "es-ES"
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        if data["results"]:
-            return data["results"][0]  # Primera coincidencia
-        return None
-        
-    except Exception as e:
-        print(f"Error buscando película '{titulo}': {e}")
-        return None
 
 def obtener_url_cartel(poster_path: str) -> str:
     """Convierte el poster_path en URL completa de imagen."""
     if poster_path:
         return f"{TMDB_IMAGE_BASE_URL}{poster_path}"
-    return ""
\ No newline at end of file
+    return ""
+
+
+def obtener_url_miniatura(poster_path: str) -> str:
+    """URL del cartel en tamaño miniatura (resultados inline)."""
+    if poster_path:
+        return f"{TMDB_MINIATURA_BASE_URL}{poster_path}"
+    return ""
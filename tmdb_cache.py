@@ -0,0 +1,142 @@
+"""
+Caché persistente de metadatos de TMDb.
+SQLite en disco (sobrevive a reinicios) con un LRU en memoria delante.
+Las búsquedas sin resultado también se guardan (caché negativa) con un TTL
+más corto, para no preguntar a TMDb una y otra vez por títulos que no conoce.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from titulos import clave_tmdb
+
+TMDB_CACHE_DB = os.getenv("TMDB_CACHE_DB", "tmdb_cache.db")
+TMDB_TTL_ACIERTO = float(os.getenv("TMDB_TTL_ACIERTO", str(30 * 86400)))  # segundos
+TMDB_TTL_FALLO = float(os.getenv("TMDB_TTL_FALLO", str(86400)))           # segundos
+TMDB_CACHE_MEMORIA = int(os.getenv("TMDB_CACHE_MEMORIA", "500"))          # entradas
+
+# Valor de obtener() cuando el título no está en caché (None = TMDb no lo conoce)
+NO_CACHEADO = object()
+
+
+class CacheTMDb:
+    """Resultados de búsqueda de TMDb por (título normalizado con año, idioma)."""
+
+    def __init__(self, ruta: str = TMDB_CACHE_DB, ttl_acierto: float = TMDB_TTL_ACIERTO,
+                 ttl_fallo: float = TMDB_TTL_FALLO, max_memoria: int = TMDB_CACHE_MEMORIA):
+        self.ruta = ruta
+        self.ttl_acierto = ttl_acierto
+        self.ttl_fallo = ttl_fallo
+        self.max_memoria = max_memoria
+        self._db: Optional[sqlite3.Connection] = None
+        self._memoria: "OrderedDict[Tuple[str, str], Tuple[Optional[dict], float]]" = OrderedDict()
+        self.stats = {"memoria": 0, "disco": 0, "negativos": 0, "fallos": 0}
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Abre la base de datos la primera vez que se usa."""
+        if self._db is None:
+            self._db = sqlite3.connect(self.ruta)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS busquedas ("
+                " titulo TEXT NOT NULL,"
+                " idioma TEXT NOT NULL,"
+                " datos TEXT,"            # JSON del resultado; NULL si TMDb no lo encontró
+                " guardado REAL NOT NULL,"
+                " PRIMARY KEY (titulo, idioma))"
+            )
+        return self._db
+
+    def _vigente(self, datos: Optional[dict], guardado: float) -> bool:
+        ttl = self.ttl_acierto if datos is not None else self.ttl_fallo
+        return time.time() - guardado < ttl
+
+    def _recordar(self, clave: Tuple[str, str], datos: Optional[dict], guardado: float):
+        self._memoria[clave] = (datos, guardado)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, titulo: str, idioma: str, contar: bool = True):
+        """
+        Retorna el resultado guardado (dict), None si TMDb no conoce el título,
+        o NO_CACHEADO si no hay entrada vigente. Con contar=False no afecta a
+        las estadísticas (consultas internas del bot).
+        """
+        clave = (clave_tmdb(titulo), idioma)
+        stats = self.stats if contar else dict.fromkeys(self.stats, 0)
+
+        entrada = self._memoria.get(clave)
+        if entrada is not None and self._vigente(*entrada):
+            self._memoria.move_to_end(clave)
+            stats["memoria"] += 1
+            if entrada[0] is None:
+                stats["negativos"] += 1
+            return entrada[0]
+
+        fila = self._conexion().execute(
+            "SELECT datos, guardado FROM busquedas WHERE titulo = ? AND idioma = ?", clave
+        ).fetchone()
+        if fila is not None:
+            datos = json.loads(fila[0]) if fila[0] is not None else None
+            if self._vigente(datos, fila[1]):
+                self._recordar(clave, datos, fila[1])
+                stats["disco"] += 1
+                if datos is None:
+                    stats["negativos"] += 1
+                return datos
+
+        self._memoria.pop(clave, None)
+        stats["fallos"] += 1
+        return NO_CACHEADO
+
+    def contiene(self, titulo: str, idioma: str) -> bool:
+        """Si hay entrada vigente (sin contar en las estadísticas)."""
+        clave = (clave_tmdb(titulo), idioma)
+        entrada = self._memoria.get(clave)
+        if entrada is not None and self._vigente(*entrada):
+            return True
+        fila = self._conexion().execute(
+            "SELECT datos IS NULL, guardado FROM busquedas WHERE titulo = ? AND idioma = ?", clave
+        ).fetchone()
+        if fila is None:
+            return False
+        ttl = self.ttl_fallo if fila[0] else self.ttl_acierto
+        return time.time() - fila[1] < ttl
+
+    def guardar(self, titulo: str, idioma: str, datos: Optional[dict]):
+        """Guarda un resultado (o None si TMDb no encontró nada)."""
+        clave = (clave_tmdb(titulo), idioma)
+        guardado = time.time()
+        db = self._conexion()
+        db.execute(
+            "INSERT OR REPLACE INTO busquedas (titulo, idioma, datos, guardado) VALUES (?, ?, ?, ?)",
+            (*clave, json.dumps(datos, ensure_ascii=False) if datos is not None else None, guardado),
+        )
+        db.commit()
+        self._recordar(clave, datos, guardado)
+
+    def purgar(self) -> int:
+        """Borra del disco las entradas caducadas."""
+        ahora = time.time()
+        db = self._conexion()
+        cursor = db.execute(
+            "DELETE FROM busquedas WHERE (datos IS NOT NULL AND guardado < ?) OR (datos IS NULL AND guardado < ?)",
+            (ahora - self.ttl_acierto, ahora - self.ttl_fallo),
+        )
+        db.commit()
+        return cursor.rowcount
+
+    def ratio_aciertos(self) -> float:
+        aciertos = self.stats["memoria"] + self.stats["disco"]
+        total = aciertos + self.stats["fallos"]
+        return aciertos / total if total else 0.0
+
+    def cerrar(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
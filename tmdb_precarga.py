@@ -0,0 +1,122 @@
+"""
+Precarga de metadatos de TMDb tras cada refresco de cartelera.
+Resuelve en bloque, con el cliente TMDb compartido, todos los títulos que
+aún no están en la caché: concurrencia limitada, un token bucket ajustado a
+la cuota de TMDb y reintentos con backoff ante 429/5xx. Así "Ver
+información" siempre encuentra la caché caliente.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Optional, Set
+
+import httpx
+
+from modelos import Snapshot
+from tmdb_api import TMDB_IDIOMA, cache_tmdb, cliente_tmdb
+from titulos import clave_tmdb
+
+TMDB_CONCURRENCIA = int(os.getenv("TMDB_CONCURRENCIA", "8"))
+TMDB_PETICIONES_POR_SEGUNDO = float(os.getenv("TMDB_PETICIONES_POR_SEGUNDO", "20"))
+TMDB_REINTENTOS = int(os.getenv("TMDB_REINTENTOS", "3"))
+TMDB_BACKOFF_BASE = 1.0   # segundos
+
+
+class TokenBucket:
+    """Limitador de tasa: `tasa` peticiones por segundo con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, tasa: float, capacidad: Optional[float] = None):
+        self.tasa = tasa
+        self.capacidad = capacidad if capacidad is not None else tasa
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def adquirir(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+
+def _reintentable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        codigo = error.response.status_code
+        return codigo == 429 or codigo >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _espera(error: Exception, intento: int) -> float:
+    """Retry-After si TMDb lo indica; si no, backoff exponencial con jitter."""
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+    return TMDB_BACKOFF_BASE * 2 ** intento * random.uniform(0.5, 1.5)
+
+
+class PrecargaTMDb:
+    """Cola de títulos pendientes que se resuelven en segundo plano contra TMDb."""
+
+    def __init__(self, concurrencia: int = TMDB_CONCURRENCIA,
+                 peticiones_por_segundo: float = TMDB_PETICIONES_POR_SEGUNDO,
+                 idioma: str = TMDB_IDIOMA):
+        self.idioma = idioma
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self._limitador = TokenBucket(peticiones_por_segundo)
+        self._pendientes: Set[str] = set()
+        self._tarea: Optional[asyncio.Task] = None
+        self.stats = {"resueltos": 0, "no_encontrados": 0, "errores": 0,
+                      "reintentos": 0, "ultima_duracion": None}
+
+    def al_publicar(self, snapshot: Snapshot):
+        """Suscriptor de CacheCarteleras: encola los títulos del snapshot nuevo."""
+        # Títulos completos: el año entre paréntesis, si lo hay, es parte de la búsqueda
+        self.encolar(pelicula.titulo for pelicula in snapshot.peliculas)
+
+    def encolar(self, titulos):
+        self._pendientes.update(titulos)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.get_running_loop().create_task(self._procesar())
+
+    async def _procesar(self):
+        # Los títulos que lleguen mientras se trabaja se recogen en la siguiente vuelta
+        while self._pendientes:
+            # Una sola consulta por película aunque llegue con varios títulos distintos
+            por_clave = {clave_tmdb(t): t for t in self._pendientes}
+            titulos = [t for t in por_clave.values() if not cache_tmdb.contiene(t, self.idioma)]
+            self._pendientes.clear()
+            if not titulos:
+                continue
+
+            inicio = time.perf_counter()
+            await asyncio.gather(*(self._resolver(t) for t in titulos))
+            self.stats["ultima_duracion"] = time.perf_counter() - inicio
+            print(f"🎞️ TMDb: {len(titulos)} títulos precargados en {self.stats['ultima_duracion']:.2f}s")
+
+    async def _resolver(self, titulo: str):
+        async with self._semaforo:
+            for intento in range(TMDB_REINTENTOS + 1):
+                await self._limitador.adquirir()
+                try:
+                    resultado = await cliente_tmdb.buscar_remoto(titulo, self.idioma)
+                except Exception as e:
+                    if intento < TMDB_REINTENTOS and _reintentable(e):
+                        self.stats["reintentos"] += 1
+                        await asyncio.sleep(_espera(e, intento))
+                        continue
+                    # Sin caché: se volverá a intentar en el próximo refresco o al consultarlo
+                    self.stats["errores"] += 1
+                    print(f"❌ Error precargando '{titulo}' de TMDb: {e}")
+                    return
+
+                cache_tmdb.guardar(titulo, self.idioma, resultado)
+                self.stats["resueltos" if resultado is not None else "no_encontrados"] += 1
+                return
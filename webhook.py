@@ -0,0 +1,132 @@
+"""
+Modo webhook: Telegram envía cada update por HTTP en lugar de que el bot
+los pida con long polling.
+Servidor ASGI (Starlette + uvicorn) en PORT con validación del secret token,
+endpoints de salud (/health) y disponibilidad (/ready), y un apagado
+ordenado que termina de procesar los updates ya recibidos.
+
+Prueba local (sin WEBHOOK_URL no se registra el webhook en Telegram):
+    BOT_MODO=webhook WEBHOOK_SECRET=secreto python bot.py
+    curl -X POST localhost:8000/telegram -H "Content-Type: application/json" \\
+         -H "X-Telegram-Bot-Api-Secret-Token: secreto" -d @update.json
+"""
+
+import asyncio
+import contextlib
+import hmac
+import os
+import secrets
+import signal
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+PORT = int(os.getenv("PORT", "8000"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")    # URL pública, p. ej. https://bot.up.railway.app
+WEBHOOK_RUTA = os.getenv("WEBHOOK_RUTA", "/telegram")
+# Si no se configura, se genera uno por arranque (se registra junto al webhook)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+CABECERA_SECRETO = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class _ServidorUvicorn(uvicorn.Server):
+    """uvicorn sin sus propios manejadores de señales: el apagado lo ordena ejecutar_webhook."""
+
+    @contextlib.contextmanager
+    def capture_signals(self):   # uvicorn >= 0.29
+        yield
+
+    def install_signal_handlers(self):   # uvicorn < 0.29
+        pass
+
+
+def crear_servidor(app: Application) -> Starlette:
+    """Aplicación ASGI que mete los updates recibidos en la cola del bot."""
+    estado = {"recibidos": 0, "rechazados": 0, "drenando": False}
+
+    async def recibir_update(request: Request) -> Response:
+        secreto = request.headers.get(CABECERA_SECRETO, "")
+        if not hmac.compare_digest(secreto, WEBHOOK_SECRET):
+            estado["rechazados"] += 1
+            return PlainTextResponse("Forbidden", status_code=403)
+        if estado["drenando"]:
+            # Telegram reintentará el update (lo recibirá la siguiente instancia)
+            return PlainTextResponse("Shutting down", status_code=503)
+
+        try:
+            update = Update.de_json(await request.json(), app.bot)
+        except Exception as e:
+            print(f"❌ Update no válido recibido por webhook: {e}")
+            return PlainTextResponse("Bad Request", status_code=400)
+
+        estado["recibidos"] += 1
+        await app.update_queue.put(update)
+        return Response(status_code=200)
+
+    async def salud(request: Request) -> Response:
+        return PlainTextResponse("ok")
+
+    async def disponible(request: Request) -> Response:
+        listo = app.running and not estado["drenando"]
+        return JSONResponse(
+            {"listo": listo, "pendientes": app.update_queue.qsize(),
+             "recibidos": estado["recibidos"], "rechazados": estado["rechazados"]},
+            status_code=200 if listo else 503,
+        )
+
+    servidor = Starlette(routes=[
+        Route(WEBHOOK_RUTA, recibir_update, methods=["POST"]),
+        Route("/health", salud, methods=["GET"]),
+        Route("/ready", disponible, methods=["GET"]),
+    ])
+    servidor.state.webhook = estado
+    return servidor
+
+
+async def ejecutar_webhook(app: Application):
+    """
+    Equivalente a app.run_polling() en modo webhook: arranca el bot, registra
+    el webhook (si hay WEBHOOK_URL) y sirve hasta recibir SIGINT/SIGTERM.
+    Al parar deja de aceptar updates y procesa los que ya estaban en cola.
+    """
+    asgi = crear_servidor(app)
+    servidor = _ServidorUvicorn(uvicorn.Config(asgi, host="0.0.0.0", port=PORT, log_level="warning"))
+
+    # SIGINT/SIGTERM solo cierran el servidor HTTP; el resto del apagado sigue abajo
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):   # Windows
+            loop.add_signal_handler(senal, setattr, servidor, "should_exit", True)
+
+    async with app:   # initialize() / shutdown()
+        if app.post_init:
+            await app.post_init(app)
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=f"{WEBHOOK_URL}{WEBHOOK_RUTA}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            print(f"🌐 Webhook registrado en {WEBHOOK_URL}{WEBHOOK_RUTA}")
+        else:
+            print("⚠️ WEBHOOK_URL no configurada: el webhook no se registra en Telegram")
+
+        await app.start()
+        print(f"🤖 Bot ejecutándose en modo webhook (puerto {PORT})... Esperando interacciones")
+        try:
+            # Al salir, uvicorn deja de aceptar conexiones y espera a las peticiones en curso
+            await servidor.serve()
+        finally:
+            asgi.state.webhook["drenando"] = True
+            print(f"⏳ Procesando {app.update_queue.qsize()} updates pendientes antes de apagar...")
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+
+    if app.post_shutdown:
+        await app.post_shutdown(app)